@@ -12,7 +12,7 @@ ROLE_RULES = """
 - update_result (maps to PUT /academic/results/{student_id})
 - create_faculty (maps to POST /academic/manage/faculty)
 - get_admin_analytics (maps to system-wide metrics)
-- get_admin_alerts (fetches all critical attendance alerts)
+- get_admin_alerts (fetches critical attendance alerts a page at a time; pass next_cursor back as cursor for more)
 - get_ia_admin_analytics (views system-wide Internal Assessment analytics)
 
 **RULES:**
@@ -9,7 +9,7 @@ ROLE_RULES = """
 - update_attendance (maps to POST /academic/manage/attendance)
 - update_marks (maps to POST /academic/manage/marks)
 - get_faculty_analytics (maps to subject performance analytics)
-- get_faculty_alerts (fetches active attendance alerts for assignments)
+- get_faculty_alerts (fetches active attendance alerts for assignments a page at a time; pass next_cursor back as cursor for more)
 - get_subject_ia_marks (views Internal Assessment marks)
 
 **RESTRICTED:**
@@ -12,7 +12,7 @@ ROLE_RULES = """
 - get_faculty_alerts (fetches personal class alerts)
 - get_subject_ia_marks (views personal assigned subjects IA marks)
 - get_hod_analytics (maps to department-wide analytics)
-- get_hod_alerts (fetches department-wide attendance alerts)
+- get_hod_alerts (fetches department-wide attendance alerts a page at a time; pass next_cursor back as cursor for more)
 
 **RESTRICTED:**
 - delete_student is strictly forbidden.
@@ -0,0 +1,98 @@
+# backend/agent/registry.py
+# Role-keyed LlmAgent instances, built once at startup and shared by every
+# request. An LlmAgent only holds configuration (model, instruction, tools);
+# conversation state lives in the run/session, so one instance per
+# (profile, role) can serve concurrent requests.
+#
+# Profiles:
+#   "ask"   /academic/ask-agent*: role prompt + the generic academic tools
+#   "chat"  /agent/chat: role prompt + that role's ALLOWED_TOOLS
+#           (registered by routers/agent_chat.py, which owns the tool map)
+
+import time
+from typing import Callable, Dict, List, Optional
+
+from google.adk.agents import LlmAgent
+
+from constants import AGENT_NAME, AGENT_MODEL, AGENT_DESCRIPTION
+from .prompt_loader import get_prompt_by_role
+from .tools import (
+    add_student, fetch_student_data, list_all_students, create_faculty,
+    list_all_faculty, add_subject, list_all_subjects, update_attendance,
+    get_student_attendance, update_marks, get_student_marks,
+    calculate_sgpa_cgpa, get_student_result, list_all_results
+)
+
+ROLES = ("student", "faculty", "hod", "admin")
+
+ASK_AGENT_TOOLS = [
+    add_student, fetch_student_data, list_all_students, create_faculty,
+    list_all_faculty, add_subject, list_all_subjects, update_attendance,
+    get_student_attendance, update_marks, get_student_marks,
+    calculate_sgpa_cgpa, get_student_result, list_all_results
+]
+
+
+class AgentRegistry:
+    def __init__(self):
+        self._profiles: Dict[str, dict] = {}
+        self._agents: Dict[tuple, LlmAgent] = {}
+        self.build_ms: Optional[float] = None
+
+    def register_profile(self, profile: str, tools_by_role: Dict[str, List[Callable]],
+                         name_template: str, description: Optional[str] = None) -> None:
+        """name_template is formatted with role=, e.g. "{role}_chat_agent"."""
+        self._profiles[profile] = {
+            "tools_by_role": tools_by_role,
+            "name_template": name_template,
+            "description": description,
+        }
+
+    def _build_one(self, profile: str, role: str) -> LlmAgent:
+        spec = self._profiles[profile]
+        kwargs = dict(
+            name=spec["name_template"].format(role=role),
+            model=AGENT_MODEL,
+            instruction=get_prompt_by_role(role),
+            tools=spec["tools_by_role"][role],
+        )
+        if spec["description"]:
+            kwargs["description"] = spec["description"]
+        return LlmAgent(**kwargs)
+
+    def build(self) -> int:
+        """Build every (profile, role) agent up front; called from the app lifespan."""
+        started = time.perf_counter()
+        agents = {
+            (profile, role): self._build_one(profile, role)
+            for profile, spec in self._profiles.items()
+            for role in spec["tools_by_role"]
+        }
+        self._agents = agents
+        self.build_ms = round((time.perf_counter() - started) * 1000, 2)
+        return len(agents)
+
+    def get(self, profile: str, role: str) -> LlmAgent:
+        """The shared agent for a role; raises ValueError for unknown profiles or roles."""
+        agent = self._agents.get((profile, role))
+        if agent is None:
+            spec = self._profiles.get(profile)
+            if spec is None or role not in spec["tools_by_role"]:
+                raise ValueError(f"No '{profile}' agent for role '{role}'")
+            # Not built yet (e.g. used outside the app lifespan): build once and keep it
+            agent = self._agents[(profile, role)] = self._build_one(profile, role)
+        return agent
+
+    def stats(self) -> dict:
+        return {
+            "agents": sorted(f"{p}:{r}" for p, r in self._agents),
+            "build_ms": self.build_ms,
+        }
+
+
+# Single shared instance
+agent_registry = AgentRegistry()
+agent_registry.register_profile(
+    "ask", {role: ASK_AGENT_TOOLS for role in ROLES},
+    name_template=AGENT_NAME + "_{role}", description=AGENT_DESCRIPTION,
+)
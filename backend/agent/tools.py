@@ -4,10 +4,14 @@ from typing import Dict, Optional, List
 from models.data_models import Student, Faculty, Subject, Attendance, Marks, Result
 from services.service import Service
 from repos.repo import Repo
+from agent_cache import agent_response_cache
 
 repo = Repo()
 service = Service(repo)
 
+# Rows per call for the list tools; everything returned lands in the model's context
+TOOL_PAGE_SIZE = 100
+
 
 # -------------------- STUDENT MANAGEMENT -------------------- #
 
@@ -18,6 +22,7 @@ async def add_student(
     user_id: Optional[str] = None,
 ) -> Dict:
     """Add a new student record to the system."""
+    agent_response_cache.note_write()
     try:
         s = Student(usn=usn, department=department, semester=semester, user_id=user_id)
         res = await service.register_student(s)
@@ -50,10 +55,24 @@ async def fetch_student_data(student_id: str) -> Dict:
         return {"success": False, "message": str(e)}
 
 
-async def list_all_students(department: Optional[str] = None) -> Dict:
-    """List all students, optionally filtered by department."""
-    students = await service.list_students(department)
-    return {"success": True, "data": [s.model_dump() for s in students]}
+async def list_all_students(
+    department: Optional[str] = None,
+    semester: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> Dict:
+    """
+    List students (id, usn, department, semester), optionally filtered by department
+    and semester, one page at a time. If next_cursor is returned, call again with
+    cursor=next_cursor for the next page.
+    """
+    try:
+        page = await service.list_students_page(
+            department=department, semester=semester, limit=TOOL_PAGE_SIZE,
+            cursor=cursor, fields=["id", "usn", "department", "department_id", "semester"],
+        )
+        return {"success": True, "data": page["items"], "next_cursor": page["next_cursor"]}
+    except Exception as e:
+        return {"success": False, "message": str(e)}
 
 
 # -------------------- FACULTY MANAGEMENT -------------------- #
@@ -65,6 +84,7 @@ async def create_faculty(
     user_id: Optional[str] = None,
 ) -> Dict:
     """Create a new faculty member with a code, name, and department."""
+    agent_response_cache.note_write()
     try:
         f = Faculty(faculty_code=faculty_code, name=name, department=department, department_id=department, user_id=user_id)
         res = await service.register_faculty(f)
@@ -87,6 +107,7 @@ async def add_subject(
     semester: int,
 ) -> Dict:
     """Add a new subject."""
+    agent_response_cache.note_write()
     try:
         subject_code = f"{department.upper()}{semester}{name[:3].upper()}"
         s = Subject(subject_name=name, subject_code=subject_code, department_id=department, semester=semester)
@@ -101,8 +122,8 @@ async def list_all_subjects(
     semester: Optional[int] = None,
 ) -> Dict:
     """List all subjects, optionally filtered by department and semester."""
-    subjects = await service.list_subjects(department, semester)
-    return {"success": True, "data": [s.model_dump() for s in subjects]}
+    page = await service.list_subjects_page(department_id=department, semester=semester, limit=None)
+    return {"success": True, "data": [s.model_dump() for s in page["items"]]}
 
 
 # -------------------- ATTENDANCE -------------------- #
@@ -113,6 +134,7 @@ async def update_attendance(
     attendance_percentage: float,
 ) -> Dict:
     """Update or create attendance for a student in a subject."""
+    agent_response_cache.note_write()
     try:
         existing = await service.get_attendance(student_id, subject_id)
         a = Attendance(
@@ -145,6 +167,7 @@ async def update_marks(
     external_marks: float,
 ) -> Dict:
     """Update or create marks for a student in a subject."""
+    agent_response_cache.note_write()
     try:
         existing = await service.get_marks(student_id, subject_id)
         m = Marks(
@@ -177,6 +200,7 @@ async def calculate_sgpa_cgpa(
     cgpa: float,
 ) -> Dict:
     """Enter or update SGPA/CGPA for a student."""
+    agent_response_cache.note_write()
     try:
         existing = await service.get_result(student_id)
         r = Result(student_id=student_id, sgpa=sgpa, cgpa=cgpa)
@@ -198,10 +222,24 @@ async def get_student_result(student_id: str) -> Dict:
     return {"success": True, "data": result.model_dump()}
 
 
-async def list_all_results() -> Dict:
-    """List all student results."""
-    results = await service.list_results()
-    return {"success": True, "data": [r.model_dump() for r in results]}
+async def list_all_results(
+    department: Optional[str] = None,
+    semester: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> Dict:
+    """
+    List student results (student_id, sgpa, cgpa), optionally filtered by the
+    student's department and semester, one page at a time. If next_cursor is
+    returned, call again with cursor=next_cursor for the next page.
+    """
+    try:
+        page = await service.list_results_page(
+            department=department, semester=semester, limit=TOOL_PAGE_SIZE,
+            cursor=cursor, fields=["id", "student_id", "sgpa", "cgpa"],
+        )
+        return {"success": True, "data": page["items"], "next_cursor": page["next_cursor"]}
+    except Exception as e:
+        return {"success": False, "message": str(e)}
 
 
 # -------------------- ANALYTICS & INTELLIGENCE -------------------- #
@@ -250,35 +288,63 @@ async def predict_student_risk(student_id: str) -> Dict:
 
 # -------------------- ALERTS & NOTIFICATIONS -------------------- #
 
-async def get_student_alerts(student_id: str) -> Dict:
-    """Get attendance alerts (critical < 75%) for a student."""
+async def get_student_alerts(student_id: str, cursor: Optional[str] = None) -> Dict:
+    """
+    Get attendance alerts (critical < 75%) for a student, one page at a time
+    with severity counts. If next_cursor is returned, call again with
+    cursor=next_cursor for the next page.
+    """
     try:
-        data = await service.get_alerts_student(student_id)
-        return {"success": True, "data": data}
+        page = await service.get_alerts_student(student_id, cursor=cursor)
+        return {
+            "success": True, "data": page["alerts"],
+            "counts": page["counts"], "next_cursor": page["next_cursor"],
+        }
     except Exception as e:
         return {"success": False, "message": str(e)}
 
-async def get_faculty_alerts(faculty_id: str) -> Dict:
-    """Get attendance alerts for students in subjects taught by the faculty."""
+async def get_faculty_alerts(faculty_id: str, cursor: Optional[str] = None) -> Dict:
+    """
+    Get attendance alerts for students in subjects taught by the faculty, one
+    page at a time with severity counts for all of them. If next_cursor is
+    returned, call again with cursor=next_cursor for the next page.
+    """
     try:
-        data = await service.get_alerts_faculty(faculty_id)
-        return {"success": True, "data": data}
+        page = await service.get_alerts_faculty(faculty_id, cursor=cursor)
+        return {
+            "success": True, "data": page["alerts"],
+            "counts": page["counts"], "next_cursor": page["next_cursor"],
+        }
     except Exception as e:
         return {"success": False, "message": str(e)}
 
-async def get_hod_alerts(dept_id: str) -> Dict:
-    """Get aggregate department-wide attendance alerts for the HOD."""
+async def get_hod_alerts(dept_id: str, cursor: Optional[str] = None) -> Dict:
+    """
+    Get aggregate department-wide attendance alerts for the HOD, one page at a
+    time with department-wide severity counts. If next_cursor is returned,
+    call again with cursor=next_cursor for the next page.
+    """
     try:
-        data = await service.get_alerts_hod(dept_id)
-        return {"success": True, "data": data}
+        page = await service.get_alerts_hod(dept_id, cursor=cursor)
+        return {
+            "success": True, "data": page["alerts"],
+            "counts": page["counts"], "next_cursor": page["next_cursor"],
+        }
     except Exception as e:
         return {"success": False, "message": str(e)}
 
-async def get_admin_alerts() -> Dict:
-    """Get system-wide critical attendance alerts for the Admin."""
+async def get_admin_alerts(cursor: Optional[str] = None) -> Dict:
+    """
+    Get system-wide critical attendance alerts for the Admin, one page at a
+    time with system-wide severity counts. If next_cursor is returned, call
+    again with cursor=next_cursor for the next page.
+    """
     try:
-        data = await service.get_alerts_admin()
-        return {"success": True, "data": data}
+        page = await service.get_alerts_admin(cursor=cursor)
+        return {
+            "success": True, "data": page["alerts"],
+            "counts": page["counts"], "next_cursor": page["next_cursor"],
+        }
     except Exception as e:
         return {"success": False, "message": str(e)}
 
@@ -0,0 +1,214 @@
+# backend/agent_cache.py
+# Response cache in front of the ask-agent / agent-chat endpoints.
+#
+# Entries are scoped to (profile, role, user): answers are never shared
+# between users. Within a scope a question hits on an exact match of its
+# normalized text, or on a near-duplicate whose sentence embedding (the
+# encoder QdrantService uses) is at least AGENT_CACHE_SIMILARITY cosine-close
+# and which names the same ids/numbers ("stu_101" never matches "stu_102").
+# Write-like questions ("mark attendance...", "add student...") skip the cache
+# up front, and callers skip file uploads. Whatever the wording, an answer is
+# only stored if no write ran during the call: write tools call note_write(),
+# which flags the lookup the current request made (a ContextVar, so it
+# reaches tools running in the agent's thread).
+#
+# Invalidation: Repo write paths call invalidate_students() after a student's
+# row, attendance, marks or results change. That drops the affected students'
+# entries and every faculty/HOD/admin entry, since those answers aggregate
+# over students. Faculty and department writes call invalidate_directory()
+# (faculty/HOD/admin entries); subject writes clear() everything, as students
+# list their subjects too. Entries are per worker, so the TTL bounds
+# staleness on other workers.
+
+import asyncio
+import os
+import re
+import time
+from contextvars import ContextVar
+from typing import Iterable, Optional
+
+import numpy as np
+
+AGENT_CACHE_TTL_SECONDS = float(os.getenv("AGENT_CACHE_TTL_SECONDS", 600))
+AGENT_CACHE_MAX_PER_SCOPE = int(os.getenv("AGENT_CACHE_MAX_PER_SCOPE", 50))
+AGENT_CACHE_SIMILARITY = float(os.getenv("AGENT_CACHE_SIMILARITY", 0.95))
+AGENT_CACHE_SEMANTIC = os.getenv("AGENT_CACHE_SEMANTIC", "1") == "1"
+
+_WRITE_LIKE = re.compile(
+    r"\b(add|create|update|mark|delete|remove|assign|register|insert|set|change|upload|enter|calculate|edit|modify)\b"
+)
+_NON_WORD = re.compile(r"[^\w\s%]")
+_SPACES = re.compile(r"\s+")
+_HAS_DIGIT = re.compile(r"\d")
+
+# The lookup made by the request running in this context; note_write() flags it
+_current_lookup: ContextVar = ContextVar("agent_cache_lookup", default=None)
+
+
+def normalize_query(query: str) -> str:
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", query.lower())).strip()
+
+
+def _literals(text: str) -> frozenset:
+    """Tokens with digits (ids, semesters, percentages) must match exactly for a semantic hit."""
+    return frozenset(t for t in text.split() if _HAS_DIGIT.search(t))
+
+
+class _Lookup:
+    """Result of a cache lookup; carries the normalized text and embedding for a later store()."""
+
+    __slots__ = ("scope", "student_id", "text", "vector", "response", "cacheable", "wrote")
+
+    def __init__(self, scope: tuple, student_id: Optional[str], text: str, cacheable: bool):
+        self.scope = scope
+        self.student_id = student_id
+        self.text = text
+        self.vector = None
+        self.response = None
+        self.cacheable = cacheable
+        self.wrote = False
+
+
+class AgentResponseCache:
+    def __init__(self, ttl: float = AGENT_CACHE_TTL_SECONDS, max_per_scope: int = AGENT_CACHE_MAX_PER_SCOPE,
+                 similarity: float = AGENT_CACHE_SIMILARITY, semantic: bool = AGENT_CACHE_SEMANTIC):
+        self.ttl = ttl
+        self.max_per_scope = max_per_scope
+        self.similarity = similarity
+        self.semantic = semantic
+        # scope -> {"student_id": ..., "entries": [(expires_at, text, vector, response)]}
+        self._scopes: dict = {}
+        self._encoder_failed = False
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.write_skips = 0
+        self.invalidations = 0
+
+    def _encoder(self):
+        if not self.semantic or self._encoder_failed:
+            return None
+        try:
+            from vector_store.qdrant_service import QdrantService
+            return QdrantService.get_encoder()
+        except Exception as e:
+            # Exact-match caching still works without the embedding model
+            print(f"Agent cache: semantic matching disabled ({e})")
+            self._encoder_failed = True
+            return None
+
+    def _embed_sync(self, text: str):
+        encoder = self._encoder()
+        if encoder is None:
+            return None
+        vector = np.asarray(encoder.encode(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _live_entries(self, scope: tuple) -> list:
+        bucket = self._scopes.get(scope)
+        if not bucket:
+            return []
+        now = time.monotonic()
+        bucket["entries"] = [e for e in bucket["entries"] if e[0] >= now]
+        if not bucket["entries"]:
+            del self._scopes[scope]
+            return []
+        return bucket["entries"]
+
+    async def lookup(self, profile: str, role: str, user_id: str, student_id: Optional[str], query: str) -> _Lookup:
+        text = normalize_query(query)
+        lookup = _Lookup((profile, role, user_id), student_id, text,
+                         cacheable=self.ttl > 0 and bool(text) and not _WRITE_LIKE.search(text))
+        _current_lookup.set(lookup)
+        if not lookup.cacheable:
+            self.skipped += 1
+            return lookup
+
+        entries = self._live_entries(lookup.scope)
+        for _, entry_text, _, response in entries:
+            if entry_text == text:
+                self.hits += 1
+                lookup.response = response
+                return lookup
+
+        # Embed off the event loop; the vector is kept for store() on a miss
+        lookup.vector = await asyncio.to_thread(self._embed_sync, text)
+        if lookup.vector is not None:
+            best, best_response = 0.0, None
+            literals = _literals(text)
+            for _, entry_text, vector, response in self._live_entries(lookup.scope):
+                if vector is not None and _literals(entry_text) == literals:
+                    score = float(np.dot(vector, lookup.vector))
+                    if score > best:
+                        best, best_response = score, response
+            if best >= self.similarity:
+                self.hits += 1
+                self.semantic_hits += 1
+                lookup.response = best_response
+                return lookup
+
+        self.misses += 1
+        return lookup
+
+    def note_write(self) -> None:
+        """A write ran during the current request: its answer must not be stored."""
+        lookup = _current_lookup.get()
+        if lookup is not None:
+            lookup.wrote = True
+
+    def store(self, lookup: _Lookup, response) -> None:
+        if not lookup.cacheable:
+            return
+        if lookup.wrote:
+            self.write_skips += 1
+            return
+        bucket = self._scopes.setdefault(lookup.scope, {"student_id": lookup.student_id, "entries": []})
+        entries = bucket["entries"]
+        if len(entries) >= self.max_per_scope:
+            entries.pop(0)  # oldest first
+        entries.append((time.monotonic() + self.ttl, lookup.text, lookup.vector, response))
+
+    def invalidate_students(self, student_ids: Iterable[str]) -> None:
+        """These students' rows, attendance, marks or results changed."""
+        self.note_write()
+        changed = set(student_ids)
+        if not changed:
+            return
+        for scope in list(self._scopes):
+            role = scope[1]
+            if role != "student" or self._scopes[scope]["student_id"] in changed:
+                self.invalidations += len(self._scopes.pop(scope)["entries"])
+
+    def invalidate_directory(self) -> None:
+        """The faculty or department directory changed; only staff answers list them."""
+        self.note_write()
+        for scope in list(self._scopes):
+            if scope[1] != "student":
+                self.invalidations += len(self._scopes.pop(scope)["entries"])
+
+    def clear(self) -> None:
+        self.note_write()
+        self.invalidations += sum(len(b["entries"]) for b in self._scopes.values())
+        self._scopes.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "scopes": len(self._scopes),
+            "entries": sum(len(b["entries"]) for b in self._scopes.values()),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "write_skips": self.write_skips,
+            "invalidations": self.invalidations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "semantic": self.semantic and not self._encoder_failed,
+            "ttl_seconds": self.ttl,
+        }
+
+
+# Single shared instance
+agent_response_cache = AgentResponseCache()
@@ -0,0 +1,80 @@
+# backend/auth_cache.py
+# In-process cache of resolved principals (user + effective role + linked
+# faculty/student ids) used by get_current_user.
+#
+# Entries are per worker: explicit invalidation only reaches the current
+# process, so the TTL bounds how long another worker may serve a stale role.
+
+import os
+import time
+from typing import Optional
+
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", 60))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", 10000))
+
+
+class PrincipalCache:
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_TTL_SECONDS, max_entries: int = PRINCIPAL_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: dict = {}  # user_id -> (expires_at, principal)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id: str) -> Optional[dict]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+        self.hits += 1
+        # Callers may mutate the dict they get back; never hand out the cached one
+        return dict(entry[1])
+
+    def put(self, user_id: str, principal: dict) -> None:
+        if self.ttl <= 0:
+            return
+        if len(self._entries) >= self.max_entries and user_id not in self._entries:
+            self._evict()
+        self._entries[user_id] = (time.monotonic() + self.ttl, dict(principal))
+
+    def invalidate(self, user_id: Optional[str]) -> None:
+        if user_id and self._entries.pop(user_id, None) is not None:
+            self.invalidations += 1
+
+    def invalidate_faculty(self, faculty_id: Optional[str]) -> None:
+        """Drop every principal linked to the given faculty row."""
+        if not faculty_id:
+            return
+        for user_id in [u for u, (_, p) in self._entries.items() if p.get("faculty_id") == faculty_id]:
+            self.invalidate(user_id)
+
+    def clear(self) -> None:
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        expired = [u for u, (exp, _) in self._entries.items() if exp < now]
+        for user_id in expired:
+            del self._entries[user_id]
+        if len(self._entries) >= self.max_entries:
+            # dicts keep insertion order, so the first key is the oldest entry
+            del self._entries[next(iter(self._entries))]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "ttl_seconds": self.ttl,
+        }
+
+
+# Single shared instance
+principal_cache = PrincipalCache()
@@ -1,6 +1,8 @@
 # backend/auth_security.py
 
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -17,6 +19,11 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 MAX_PASSWORD_BYTES = 72
 
+# bcrypt releases the GIL while hashing, so a small thread pool is enough to
+# keep password work off the event loop without paying process-pool pickling.
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", 4))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", 64))
+
 
 def _normalize_password(password: str) -> str:
     if password is None:
@@ -38,6 +45,69 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+class PasswordHasherBusy(Exception):
+    """Raised when the password executor already has PASSWORD_QUEUE_LIMIT jobs pending."""
+
+
+class PasswordHasher:
+    """Bounded executor for bcrypt hash/verify calls made from async handlers."""
+
+    def __init__(self, workers: int = PASSWORD_WORKERS, queue_limit: int = PASSWORD_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pwd")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.queue_limit:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_executor(), fn, *args)
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+        self.completed += 1
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "pending": self.pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+# Single shared instance
+password_hasher = PasswordHasher()
+
+
 def create_access_token(data: dict, expires_minutes: int = ACCESS_TOKEN_EXPIRE_MINUTES) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=expires_minutes)
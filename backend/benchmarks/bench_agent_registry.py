@@ -0,0 +1,56 @@
+# backend/benchmarks/bench_agent_registry.py
+# Per-request agent setup cost: building a fresh LlmAgent with the ask-agent
+# tool list inside the handler (the old behaviour) versus fetching the shared
+# agent from agent_registry. No model is called, so no API key is needed.
+#
+# Run from backend/:  python -m benchmarks.bench_agent_registry
+
+import statistics
+import time
+
+from google.adk.agents import LlmAgent
+
+from agent.prompt_loader import get_prompt_by_role
+from agent.registry import ASK_AGENT_TOOLS, ROLES, agent_registry
+from constants import AGENT_NAME, AGENT_MODEL, AGENT_DESCRIPTION
+
+REQUESTS = 2000
+
+
+def per_request(role: str) -> LlmAgent:
+    return LlmAgent(
+        name=f"{AGENT_NAME}_{role}",
+        model=AGENT_MODEL,
+        description=AGENT_DESCRIPTION,
+        instruction=get_prompt_by_role(role),
+        tools=list(ASK_AGENT_TOOLS),
+    )
+
+
+def shared(role: str) -> LlmAgent:
+    return agent_registry.get("ask", role)
+
+
+def _time(label: str, fn) -> None:
+    timings = []
+    for i in range(REQUESTS):
+        role = ROLES[i % len(ROLES)]
+        t0 = time.perf_counter()
+        fn(role)
+        timings.append((time.perf_counter() - t0) * 1_000_000)
+    timings.sort()
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f"{label:<12} mean {statistics.mean(timings):9.1f}us   p50 {statistics.median(timings):9.1f}us   p99 {p99:9.1f}us")
+
+
+def main():
+    t0 = time.perf_counter()
+    built = agent_registry.build()
+    print(f"startup build: {built} agents in {(time.perf_counter() - t0) * 1000:.1f}ms")
+    print(f"{REQUESTS} requests")
+    _time("per-request", per_request)
+    _time("registry", shared)
+
+
+if __name__ == "__main__":
+    main()
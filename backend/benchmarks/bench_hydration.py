@@ -0,0 +1,88 @@
+# backend/benchmarks/bench_hydration.py
+# Per-row cost of turning 10k students rows into a /academic/students
+# response, before and after:
+#   before: Student(**row) in Repo, then FastAPI's response_model path
+#           (dump -> validate List[Student] -> dump to JSON types -> json.dumps)
+#   after:  Student.model_construct(**row) (Repo.hydrate), rendered straight
+#           by ORJSONListResponse
+# Rows are plain dicts shaped like asyncpg Records, so no database is needed.
+#
+# Run from backend/:  python -m benchmarks.bench_hydration
+
+import json
+import statistics
+import time
+from typing import List
+
+from pydantic import TypeAdapter
+
+from models.data_models import Student
+from responses import ORJSONListResponse
+
+ROWS = 10_000
+RUNS = 7
+
+STUDENT_ROWS = [
+    {
+        "id": f"stu_{i:06d}",
+        "user_id": f"usr_{i:06d}" if i % 3 else None,
+        "usn": f"USN{i:06d}",
+        "department": f"Dept {i % 10 + 1}",
+        "department_id": f"dept_{i % 10 + 1}",
+        "semester": (i // 10) % 8 + 1,
+    }
+    for i in range(ROWS)
+]
+
+_response_adapter = TypeAdapter(List[Student])
+
+
+def hydrate_validated() -> list:
+    return [Student(**row) for row in STUDENT_ROWS]
+
+
+def hydrate_constructed() -> list:
+    return [Student.model_construct(**row) for row in STUDENT_ROWS]
+
+
+def render_response_model(models: list) -> bytes:
+    content = [m.model_dump() for m in models]
+    value = _response_adapter.validate_python(content)
+    return json.dumps(_response_adapter.dump_python(value, mode="json")).encode()
+
+
+def render_orjson(models: list) -> bytes:
+    return ORJSONListResponse(models).body
+
+
+def _per_row_us(fn, *args) -> float:
+    timings = []
+    for _ in range(RUNS):
+        t0 = time.perf_counter()
+        fn(*args)
+        timings.append((time.perf_counter() - t0) * 1_000_000 / ROWS)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    validated = hydrate_validated()
+    constructed = hydrate_constructed()
+    assert json.loads(render_orjson(constructed)) == json.loads(render_response_model(validated))
+
+    before_hydrate = _per_row_us(hydrate_validated)
+    after_hydrate = _per_row_us(hydrate_constructed)
+    before_render = _per_row_us(render_response_model, validated)
+    after_render = _per_row_us(render_orjson, constructed)
+
+    print(f"{ROWS} Student rows, median of {RUNS} runs, microseconds per row")
+    print(f"{'stage':<12}{'before':>10}{'after':>10}{'speedup':>10}")
+    for stage, before, after in (
+        ("hydrate", before_hydrate, after_hydrate),
+        ("render", before_render, after_render),
+        ("total", before_hydrate + before_render, after_hydrate + after_render),
+    ):
+        print(f"{stage:<12}{before:>10.2f}{after:>10.2f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
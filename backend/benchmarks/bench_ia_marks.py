@@ -0,0 +1,131 @@
+# backend/benchmarks/bench_ia_marks.py
+# 1k-row IA marks upload. Compares the old pipeline (get_student per row for
+# validation, then one upsert per row, each on its own pool connection) with
+# Service.validate_ia_marks + Service.upload_ia_marks (one membership query,
+# one unnest upsert).
+#
+# Everything is built in a throwaway schema and dropped afterwards.
+# Run from backend/:  python -m benchmarks.bench_ia_marks
+
+import asyncio
+import os
+import random
+import time
+
+import asyncpg
+from dotenv import load_dotenv
+
+from db import InstrumentedPool, PostgresDB
+from migrations import migrate
+from repos.repo import Repo
+from services.service import Service
+
+load_dotenv()
+
+SCHEMA = "bench_ia_marks"
+ROWS = 1000
+RUNS = 3
+POOL_SIZE = 10
+
+SEED_SQL = [
+    "INSERT INTO departments (id, name) VALUES ('dept_1', 'Dept 1')",
+    "INSERT INTO faculty (id, faculty_code, name, department, department_id) VALUES ('fac_1', 'F1', 'Faculty 1', 'Dept 1', 'dept_1')",
+    """
+    INSERT INTO subjects (id, subject_name, subject_code, department_id, semester)
+    VALUES ('sub_1', 'Subject 1', 'C1', 'dept_1', 3)
+    """,
+    f"""
+    INSERT INTO students (id, usn, department, department_id, semester)
+    SELECT 'stu_' || i, 'USN' || lpad(i::text, 6, '0'), 'Dept 1', 'dept_1', 3
+    FROM generate_series(1, {ROWS}) i
+    """,
+    "ANALYZE",
+]
+
+LEGACY_UPSERT_SQL = """
+INSERT INTO ia_marks (id, student_id, subject_id, faculty_id, marks_obtained, max_marks, created_at)
+VALUES ($1, $2, $3, $4, $5, $6, CURRENT_TIMESTAMP)
+ON CONFLICT (student_id, subject_id)
+DO UPDATE SET marks_obtained = $5, faculty_id = $4, max_marks = $6, created_at = CURRENT_TIMESTAMP
+"""
+
+
+def _connect_kwargs() -> dict:
+    return dict(
+        user=os.getenv("PG_USER", "postgres"),
+        password=os.getenv("PG_PASSWORD", "1234567890"),
+        database=os.getenv("PG_DB", "carpulse"),
+        host=os.getenv("PG_HOST", "localhost"),
+        port=int(os.getenv("PG_PORT", 5432)),
+    )
+
+
+async def legacy_upload(service: Service, subject, marks_list: list) -> None:
+    errors = []
+    for entry in marks_list:
+        student = await service.get_student(entry["student_id"])
+        if not student:
+            errors.append(entry["student_id"])
+        elif student.department_id != subject.department_id or student.semester != subject.semester:
+            errors.append(entry["student_id"])
+    assert not errors
+    for i, entry in enumerate(marks_list):
+        async with PostgresDB.pool.acquire() as conn:
+            await conn.execute(
+                LEGACY_UPSERT_SQL, f"ia_legacy_{i}", entry["student_id"], subject.id, "fac_1",
+                entry["marks_obtained"], 40,
+            )
+
+
+async def bulk_upload(service: Service, subject, marks_list: list) -> None:
+    assert not await service.validate_ia_marks(subject, marks_list, 40)
+    await service.upload_ia_marks("fac_1", subject.id, marks_list, 40)
+
+
+async def _time(label: str, fn) -> None:
+    timings = []
+    for _ in range(RUNS):
+        t0 = time.perf_counter()
+        await fn()
+        timings.append(time.perf_counter() - t0)
+    print(f"{label:<8} best {min(timings) * 1000:9.1f}ms   worst {max(timings) * 1000:9.1f}ms")
+
+
+async def main():
+    admin = await asyncpg.connect(**_connect_kwargs())
+    await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    await admin.execute(f"CREATE SCHEMA {SCHEMA}")
+    settings = {"search_path": SCHEMA}
+    try:
+        conn = await asyncpg.connect(**_connect_kwargs(), server_settings=settings)
+        await migrate(conn)
+        for stmt in SEED_SQL:
+            await conn.execute(stmt)
+
+        pool = await asyncpg.create_pool(**_connect_kwargs(), server_settings=settings,
+                                         min_size=POOL_SIZE, max_size=POOL_SIZE)
+        PostgresDB.pool = PostgresDB.analytics_pool = InstrumentedPool("bench", pool, 600)
+
+        service = Service(Repo())
+        subject = await service.get_subject("sub_1")
+        marks_list = [
+            {"student_id": f"stu_{i}", "marks_obtained": random.randint(0, 40)}
+            for i in range(1, ROWS + 1)
+        ]
+
+        print(f"{ROWS} rows, {RUNS} runs each")
+        await _time("per-row", lambda: legacy_upload(service, subject, marks_list))
+        await _time("bulk", lambda: bulk_upload(service, subject, marks_list))
+
+        stored = await conn.fetchval("SELECT COUNT(*) FROM ia_marks")
+        print(f"ia_marks rows after both runs: {stored}")
+
+        await pool.close()
+        await conn.close()
+    finally:
+        await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await admin.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+# backend/benchmarks/bench_login.py
+# Login throughput at 50 concurrent users: bcrypt verify inline on the event
+# loop (old behaviour) vs. offloaded to auth_security.password_hasher.
+#
+# Run from backend/:  python -m benchmarks.bench_login
+
+import asyncio
+import statistics
+import time
+
+from auth_security import hash_password, verify_password, password_hasher
+
+CONCURRENT_USERS = 50
+PASSWORD = "correct horse battery staple"
+
+
+async def _heartbeat(stop: asyncio.Event, lags: list):
+    """Measures how late a 10ms sleep wakes up — i.e. how blocked the loop is."""
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append((time.perf_counter() - t0 - 0.01) * 1000)
+
+
+async def _login_inline(pw_hash: str):
+    assert verify_password(PASSWORD, pw_hash)
+
+
+async def _login_offloaded(pw_hash: str):
+    assert await password_hasher.verify(PASSWORD, pw_hash)
+
+
+async def _run(label: str, login, pw_hash: str):
+    stop = asyncio.Event()
+    lags: list = []
+    hb = asyncio.create_task(_heartbeat(stop, lags))
+    t0 = time.perf_counter()
+    await asyncio.gather(*(login(pw_hash) for _ in range(CONCURRENT_USERS)))
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await hb
+    print(
+        f"{label:<10} {CONCURRENT_USERS / elapsed:8.1f} logins/s   "
+        f"total {elapsed:6.2f}s   loop lag p50 {statistics.median(lags or [0]):7.1f}ms "
+        f"max {max(lags or [0]):7.1f}ms"
+    )
+
+
+async def main():
+    pw_hash = hash_password(PASSWORD)
+    print(f"{CONCURRENT_USERS} concurrent logins, {password_hasher.workers} password workers")
+    await _run("inline", _login_inline, pw_hash)
+    await _run("offloaded", _login_offloaded, pw_hash)
+    password_hasher.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+# backend/benchmarks/bench_students_report.py
+# Students report on a synthetic institution: 10k students, ~2M attendance
+# records. Compares the old correlated-subquery report (per student re-joins
+# sessions and records) with Repo.get_all_students_report (one aggregation
+# over attendance_rollup).
+#
+# Everything is built in a throwaway schema and dropped afterwards.
+# Run from backend/:  python -m benchmarks.bench_students_report
+
+import asyncio
+import os
+import time
+
+import asyncpg
+from dotenv import load_dotenv
+
+from db import InstrumentedPool, PostgresDB
+from migrations import migrate
+from repos.repo import Repo
+
+load_dotenv()
+
+SCHEMA = "bench_students_report"
+RUNS = 3
+
+LEGACY_REPORT_SQL = """
+SELECT
+    s.id, s.usn, u.name, s.department, s.department_id, s.semester,
+    COALESCE(
+        (SELECT ROUND(
+            COUNT(ar.id) FILTER (WHERE ar.status = 'present') * 100.0
+            / NULLIF(MAX(COALESCE(sess.total_classes, sess.total_sessions, 40)), 0), 1)
+         FROM attendance_sessions sess
+         LEFT JOIN attendance_records ar ON ar.session_id = sess.id AND ar.student_id = s.id
+         WHERE sess.subject_id IN (
+             SELECT id FROM subjects WHERE department_id = s.department_id AND semester = s.semester
+         )
+        ), 0
+    ) AS avg_attendance
+FROM students s
+LEFT JOIN users u ON u.id = s.user_id
+ORDER BY s.department, s.semester, s.usn
+"""
+
+# 10 depts x 8 semesters x 6 subjects, 34 sessions each, 125 students per class
+SEED_SQL = [
+    "INSERT INTO departments (id, name) SELECT 'dept_' || d, 'Dept ' || d FROM generate_series(1, 10) d",
+    """
+    INSERT INTO students (id, usn, department, department_id, semester)
+    SELECT 'stu_' || i, 'USN' || lpad(i::text, 6, '0'), 'Dept ' || (i % 10 + 1), 'dept_' || (i % 10 + 1), (i / 10) % 8 + 1
+    FROM generate_series(0, 9999) i
+    """,
+    """
+    INSERT INTO subjects (id, subject_name, subject_code, department_id, semester)
+    SELECT 'sub_' || d || '_' || sem || '_' || k, 'Subject ' || k, 'C' || d || '_' || sem || '_' || k, 'dept_' || d, sem
+    FROM generate_series(1, 10) d, generate_series(1, 8) sem, generate_series(1, 6) k
+    """,
+    """
+    INSERT INTO attendance_sessions (id, subject_id, session_number, total_sessions, total_classes, date)
+    SELECT sub.id || '_s' || n, sub.id, n, 40, 40, CURRENT_DATE - n
+    FROM subjects sub, generate_series(1, 34) n
+    """,
+    """
+    INSERT INTO attendance_records (id, session_id, student_id, status)
+    SELECT sess.id || '_' || st.id, sess.id, st.id,
+           CASE WHEN random() < 0.8 THEN 'present' ELSE 'absent' END
+    FROM attendance_sessions sess
+    JOIN subjects sub ON sub.id = sess.subject_id
+    JOIN students st ON st.department_id = sub.department_id AND st.semester = sub.semester
+    """,
+    """
+    INSERT INTO attendance_rollup (student_id, subject_id, attended, sessions_held, total_classes)
+    SELECT ar.student_id, sess.subject_id,
+           COUNT(*) FILTER (WHERE ar.status = 'present'), COUNT(*),
+           MAX(COALESCE(sess.total_classes, sess.total_sessions, 40))
+    FROM attendance_records ar
+    JOIN attendance_sessions sess ON sess.id = ar.session_id
+    GROUP BY ar.student_id, sess.subject_id
+    """,
+    "ANALYZE",
+]
+
+
+def _connect_kwargs() -> dict:
+    return dict(
+        user=os.getenv("PG_USER", "postgres"),
+        password=os.getenv("PG_PASSWORD", "1234567890"),
+        database=os.getenv("PG_DB", "carpulse"),
+        host=os.getenv("PG_HOST", "localhost"),
+        port=int(os.getenv("PG_PORT", 5432)),
+    )
+
+
+async def _time(label: str, fn) -> list:
+    timings = []
+    rows = None
+    for _ in range(RUNS):
+        t0 = time.perf_counter()
+        rows = await fn()
+        timings.append(time.perf_counter() - t0)
+    print(f"{label:<12} best {min(timings):8.3f}s   worst {max(timings):8.3f}s   rows {len(rows)}")
+    return rows
+
+
+async def main():
+    admin = await asyncpg.connect(**_connect_kwargs())
+    await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    await admin.execute(f"CREATE SCHEMA {SCHEMA}")
+    settings = {"search_path": SCHEMA}
+    try:
+        conn = await asyncpg.connect(**_connect_kwargs(), server_settings=settings)
+        await migrate(conn)
+        t0 = time.perf_counter()
+        for stmt in SEED_SQL:
+            await conn.execute(stmt)
+        records = await conn.fetchval("SELECT COUNT(*) FROM attendance_records")
+        print(f"seeded {records} attendance records in {time.perf_counter() - t0:.1f}s")
+
+        pool = await asyncpg.create_pool(**_connect_kwargs(), server_settings=settings, min_size=1, max_size=2)
+        PostgresDB.pool = PostgresDB.analytics_pool = InstrumentedPool("bench", pool, 600)
+
+        legacy = await _time("correlated", lambda: conn.fetch(LEGACY_REPORT_SQL))
+        current = await _time("set-based", Repo().get_all_students_report)
+
+        mismatches = sum(
+            1 for a, b in zip(legacy, current) if float(a["avg_attendance"]) != float(b["avg_attendance"])
+        )
+        print(f"rows with differing avg_attendance: {mismatches}")
+
+        await pool.close()
+        await conn.close()
+    finally:
+        await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await admin.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
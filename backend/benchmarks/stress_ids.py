@@ -0,0 +1,126 @@
+# backend/benchmarks/stress_ids.py
+# Collision stress for id_gen: 100k attendance records inserted through
+# Repo.insert_attendance_records by 16 concurrent tasks (100 sessions x 1000
+# students, sessions handed out from a queue). Any duplicate primary key
+# aborts its transaction, so a clean run plus COUNT(DISTINCT id) = 100000
+# means no collision. Also checks the generator is strictly increasing when
+# hammered from 16 threads.
+#
+# Everything is built in a throwaway schema and dropped afterwards.
+# Run from backend/:  python -m benchmarks.stress_ids
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import asyncpg
+from dotenv import load_dotenv
+
+from db import InstrumentedPool, PostgresDB
+from id_gen import new_id, new_ids
+from migrations import migrate
+from repos.repo import Repo
+
+load_dotenv()
+
+SCHEMA = "stress_ids"
+TASKS = 16
+SESSIONS = 100
+STUDENTS = 1000
+THREAD_IDS = 50_000
+
+SEED_SQL = [
+    "INSERT INTO departments (id, name) VALUES ('dept_1', 'Dept 1')",
+    """
+    INSERT INTO subjects (id, subject_name, subject_code, department_id, semester)
+    VALUES ('sub_1', 'Subject 1', 'C1', 'dept_1', 1)
+    """,
+    f"""
+    INSERT INTO students (id, usn, department, department_id, semester)
+    SELECT 'stu_' || i, 'USN' || i, 'Dept 1', 'dept_1', 1 FROM generate_series(1, {STUDENTS}) i
+    """,
+    f"""
+    INSERT INTO attendance_sessions (id, subject_id, session_number, total_sessions, total_classes, date)
+    SELECT 'sess_' || n, 'sub_1', n, {SESSIONS}, {SESSIONS}, CURRENT_DATE FROM generate_series(1, {SESSIONS}) n
+    """,
+]
+
+
+def _connect_kwargs() -> dict:
+    return dict(
+        user=os.getenv("PG_USER", "postgres"),
+        password=os.getenv("PG_PASSWORD", "1234567890"),
+        database=os.getenv("PG_DB", "carpulse"),
+        host=os.getenv("PG_HOST", "localhost"),
+        port=int(os.getenv("PG_PORT", 5432)),
+    )
+
+
+def check_threads() -> None:
+    """Each thread's ids must be strictly increasing, and all ids distinct."""
+    def worker(_):
+        ids = [new_id("x_") for _ in range(THREAD_IDS)]
+        assert ids == sorted(ids) and len(set(ids)) == len(ids), "per-thread ids not monotonic"
+        return ids
+
+    with ThreadPoolExecutor(TASKS) as pool:
+        batches = list(pool.map(worker, range(TASKS)))
+    total = sum(len(b) for b in batches)
+    distinct = len({i for b in batches for i in b})
+    print(f"threads: {total} ids, {distinct} distinct")
+    assert total == distinct, "duplicate ids across threads"
+
+    ids = new_ids("x_", THREAD_IDS)
+    assert ids == sorted(ids), "batch ids not monotonic"
+
+
+async def main():
+    check_threads()
+
+    admin = await asyncpg.connect(**_connect_kwargs())
+    await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    await admin.execute(f"CREATE SCHEMA {SCHEMA}")
+    settings = {"search_path": SCHEMA}
+    try:
+        conn = await asyncpg.connect(**_connect_kwargs(), server_settings=settings)
+        await migrate(conn)
+        for stmt in SEED_SQL:
+            await conn.execute(stmt)
+
+        pool = await asyncpg.create_pool(**_connect_kwargs(), server_settings=settings,
+                                         min_size=TASKS, max_size=TASKS)
+        PostgresDB.pool = PostgresDB.analytics_pool = InstrumentedPool("stress", pool, 600)
+
+        repo = Repo()
+        student_ids = [f"stu_{i}" for i in range(1, STUDENTS + 1)]
+        statuses = ["present" if i % 5 else "absent" for i in range(STUDENTS)]
+        queue: asyncio.Queue = asyncio.Queue()
+        for n in range(1, SESSIONS + 1):
+            queue.put_nowait(f"sess_{n}")
+
+        async def task():
+            while not queue.empty():
+                session_id = queue.get_nowait()
+                await repo.insert_attendance_records(session_id, student_ids, statuses)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(task() for _ in range(TASKS)))
+        elapsed = time.perf_counter() - t0
+
+        total, distinct = await conn.fetchrow(
+            "SELECT COUNT(*), COUNT(DISTINCT id) FROM attendance_records"
+        )
+        print(f"database: {total} records, {distinct} distinct ids, {TASKS} tasks, {elapsed:.1f}s")
+        assert total == distinct == SESSIONS * STUDENTS, "id collision or lost insert"
+        print("no collisions")
+
+        await pool.close()
+        await conn.close()
+    finally:
+        await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await admin.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,24 +1,163 @@
+import asyncio
 import asyncpg
 import os
+import time
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
-class PostgresDB:
-    pool: asyncpg.Pool | None = None
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
 
-    @classmethod
-    async def connect(cls):
-        if cls.pool is not None:
-            return
 
-        cls.pool = await asyncpg.create_pool(
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+# Connection settings shared by both pools
+PG_MAX_INACTIVE_CONN_LIFETIME = _env_float("PG_MAX_INACTIVE_CONN_LIFETIME", 300)
+PG_STATEMENT_CACHE_SIZE = _env_int("PG_STATEMENT_CACHE_SIZE", 256)
+PG_ACQUIRE_TIMEOUT = _env_float("PG_ACQUIRE_TIMEOUT", 10)
+
+# OLTP pool: auth, CRUD, attendance writes — short queries, must never starve
+PG_POOL_MIN = _env_int("PG_POOL_MIN", 2)
+PG_POOL_MAX = _env_int("PG_POOL_MAX", 10)
+PG_COMMAND_TIMEOUT = _env_float("PG_COMMAND_TIMEOUT", 30)
+
+# Analytics pool: dashboards, alerts, reports — long scans are isolated here
+PG_ANALYTICS_POOL_MIN = _env_int("PG_ANALYTICS_POOL_MIN", 1)
+PG_ANALYTICS_POOL_MAX = _env_int("PG_ANALYTICS_POOL_MAX", 4)
+PG_ANALYTICS_COMMAND_TIMEOUT = _env_float("PG_ANALYTICS_COMMAND_TIMEOUT", 300)
+
+
+class PoolMetrics:
+    """Acquire-wait histogram and timeout counter for one pool."""
+
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self):
+        self.acquires = 0
+        self.timeouts = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.buckets = [0] * (len(self.BUCKETS_MS) + 1)  # last bucket is +Inf
+
+    def observe(self, wait_ms: float) -> None:
+        self.acquires += 1
+        self.wait_ms_total += wait_ms
+        self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+        for i, bound in enumerate(self.BUCKETS_MS):
+            if wait_ms <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def snapshot(self) -> dict:
+        labels = [f"le_{b}ms" for b in self.BUCKETS_MS] + ["le_inf"]
+        return {
+            "acquires": self.acquires,
+            "timeouts": self.timeouts,
+            "wait_ms_avg": round(self.wait_ms_total / self.acquires, 3) if self.acquires else 0.0,
+            "wait_ms_max": round(self.wait_ms_max, 3),
+            "wait_histogram": dict(zip(labels, self.buckets)),
+        }
+
+
+class InstrumentedPool:
+    """Thin wrapper over asyncpg.Pool whose acquire() applies a timeout and records wait time."""
+
+    def __init__(self, name: str, pool: asyncpg.Pool, acquire_timeout: float):
+        self.name = name
+        self.acquire_timeout = acquire_timeout
+        self.metrics = PoolMetrics()
+        self._pool = pool
+
+    @asynccontextmanager
+    async def acquire(self, timeout: float | None = None):
+        started = time.perf_counter()
+        try:
+            conn = await self._pool.acquire(timeout=timeout or self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        self.metrics.observe((time.perf_counter() - started) * 1000)
+        try:
+            yield conn
+        finally:
+            await self._pool.release(conn)
+
+    def stats(self) -> dict:
+        size = self._pool.get_size()
+        idle = self._pool.get_idle_size()
+        return {
+            "min_size": self._pool.get_min_size(),
+            "max_size": self._pool.get_max_size(),
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            **self.metrics.snapshot(),
+        }
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+
+class PostgresDB:
+    pool: InstrumentedPool | None = None
+    analytics_pool: InstrumentedPool | None = None
+
+    @staticmethod
+    def _connect_kwargs() -> dict:
+        return dict(
             user=os.getenv("PG_USER", "postgres"),
             password=os.getenv("PG_PASSWORD", "1234567890"),
             database=os.getenv("PG_DB", "carpulse"),
             host=os.getenv("PG_HOST", "localhost"),
             port=int(os.getenv("PG_PORT", 5432)),
-            min_size=1,
-            max_size=5
         )
+
+    @classmethod
+    async def _create_pool(cls, min_size: int, max_size: int, command_timeout: float) -> asyncpg.Pool:
+        return await asyncpg.create_pool(
+            **cls._connect_kwargs(),
+            min_size=min_size,
+            max_size=max_size,
+            max_inactive_connection_lifetime=PG_MAX_INACTIVE_CONN_LIFETIME,
+            statement_cache_size=PG_STATEMENT_CACHE_SIZE,
+            command_timeout=command_timeout,
+        )
+
+    @classmethod
+    async def connect(cls):
+        if cls.pool is not None:
+            return
+
+        cls.pool = InstrumentedPool(
+            "oltp",
+            await cls._create_pool(PG_POOL_MIN, PG_POOL_MAX, PG_COMMAND_TIMEOUT),
+            PG_ACQUIRE_TIMEOUT,
+        )
+        cls.analytics_pool = InstrumentedPool(
+            "analytics",
+            await cls._create_pool(PG_ANALYTICS_POOL_MIN, PG_ANALYTICS_POOL_MAX, PG_ANALYTICS_COMMAND_TIMEOUT),
+            PG_ACQUIRE_TIMEOUT,
+        )
+
+    @classmethod
+    async def connect_listener(cls) -> asyncpg.Connection:
+        """A standalone connection for LISTEN; held for the worker's lifetime, so kept out of the pools."""
+        return await asyncpg.connect(**cls._connect_kwargs())
+
+    @classmethod
+    async def close(cls):
+        for pool in (cls.pool, cls.analytics_pool):
+            if pool is not None:
+                await pool.close()
+        cls.pool = None
+        cls.analytics_pool = None
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {p.name: p.stats() for p in (cls.pool, cls.analytics_pool) if p is not None}
@@ -0,0 +1,102 @@
+# backend/id_gen.py
+# Time-ordered primary keys for every insert path.
+#
+# IDs are <prefix><48-bit unix ms><80-bit tail>. Within one process the tail
+# is incremented while the millisecond stays the same (and the timestamp is
+# never allowed to go backwards), so IDs are strictly increasing per process.
+# Each new millisecond draws a fresh random tail, which keeps workers apart:
+# two processes only collide if they pick overlapping 80-bit tails in the same
+# millisecond. Because the timestamp leads, new keys land at the right-hand
+# edge of the btree instead of scattering like random UUIDs.
+#
+# ID_FORMAT=ulid  (default) 26-char Crockford base32, e.g. stu_01J9Z3K4...
+# ID_FORMAT=uuid7 32-char hex in the UUIDv7 layout
+# Existing rows keep their old ids; both formats are plain TEXT.
+
+import os
+import secrets
+from abc import ABC, abstractmethod
+import threading
+import time
+from typing import List
+
+ID_FORMAT = os.getenv("ID_FORMAT", "ulid").lower()
+
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_TAIL_BITS = 80
+_TAIL_MAX = (1 << _TAIL_BITS) - 1
+
+
+class TimeOrderedIdGenerator(ABC):
+    """Monotonic (timestamp_ms, tail) source; subclasses choose the text encoding."""
+
+    def __init__(self):
+        self._lock = threading.Lock()  # agent tools run in worker threads
+        self._last_ms = 0
+        self._tail = 0
+
+    def _next(self) -> tuple:
+        with self._lock:
+            now = time.time_ns() // 1_000_000
+            if now > self._last_ms:
+                self._last_ms = now
+                # Leave headroom so a burst within one ms never overflows the tail
+                self._tail = secrets.randbits(_TAIL_BITS - 1)
+            else:
+                self._tail += 1
+                if self._tail > _TAIL_MAX:
+                    # Borrow the next millisecond rather than wrap
+                    self._last_ms += 1
+                    self._tail = secrets.randbits(_TAIL_BITS - 1)
+            return self._last_ms, self._tail
+
+    @abstractmethod
+    def encode(self, ms: int, tail: int) -> str:
+        """Text form of one (timestamp_ms, tail) pair, sortable in the same order."""
+
+    def new(self, prefix: str = "") -> str:
+        return prefix + self.encode(*self._next())
+
+    def batch(self, prefix: str, n: int) -> List[str]:
+        return [self.new(prefix) for _ in range(n)]
+
+
+class UlidGenerator(TimeOrderedIdGenerator):
+    def encode(self, ms: int, tail: int) -> str:
+        value = (ms << _TAIL_BITS) | tail
+        chars = []
+        for _ in range(26):
+            chars.append(_CROCKFORD[value & 31])
+            value >>= 5
+        return "".join(reversed(chars))
+
+
+class Uuid7Generator(TimeOrderedIdGenerator):
+    def encode(self, ms: int, tail: int) -> str:
+        # 48-bit ms | version 7 | 12 bits of tail | variant 10 | 62 bits of tail
+        rand_a = (tail >> 62) & 0xFFF
+        rand_b = tail & ((1 << 62) - 1)
+        value = (ms << 80) | (0x7 << 76) | (rand_a << 64) | (0b10 << 62) | rand_b
+        return f"{value:032x}"
+
+
+_GENERATORS = {"ulid": UlidGenerator, "uuid7": Uuid7Generator}
+
+if ID_FORMAT not in _GENERATORS:
+    raise RuntimeError(f"Unknown ID_FORMAT {ID_FORMAT!r}; expected one of {sorted(_GENERATORS)}")
+
+_generator: TimeOrderedIdGenerator = _GENERATORS[ID_FORMAT]()
+
+
+def set_id_generator(generator: TimeOrderedIdGenerator) -> None:
+    """Swap the process-wide generator (e.g. a deterministic one in scripts)."""
+    global _generator
+    _generator = generator
+
+
+def new_id(prefix: str = "") -> str:
+    return _generator.new(prefix)
+
+
+def new_ids(prefix: str, n: int) -> List[str]:
+    return _generator.batch(prefix, n)
@@ -0,0 +1,197 @@
+# backend/llm_gateway.py
+# Shared admission control for every Gemini call (ADK agents, planner,
+# AI assistant), so a burst of requests queues here instead of exhausting
+# the API quota and holding DB connections while it waits.
+#
+# Per model:
+#   - at most LLM_MAX_CONCURRENCY calls in flight
+#   - at most LLM_MAX_QUEUE callers waiting; more are rejected immediately
+#   - a caller waits at most LLM_QUEUE_TIMEOUT seconds for a slot, and the
+#     call itself is cut off after LLM_CALL_TIMEOUT seconds
+#   - each user may have LLM_MAX_PENDING_PER_USER calls queued or running,
+#     and freed slots go round-robin across users, so one user's burst
+#     cannot starve everyone else
+#
+# State is per worker process.
+
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from fastapi import HTTPException, status
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", 64))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 30))
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", 120))
+LLM_MAX_PENDING_PER_USER = int(os.getenv("LLM_MAX_PENDING_PER_USER", 3))
+
+T = TypeVar("T")
+
+
+class LlmGatewayBusy(Exception):
+    """Raised when a call is rejected (queue or per-user limit) or times out waiting for a slot."""
+
+
+class _Stat:
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def snapshot(self) -> dict:
+        return {
+            "avg_ms": round(self.total_ms / self.count, 1) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+class _ModelLane:
+    """Slots and the fair wait queue for one model."""
+
+    def __init__(self, concurrency: int, max_queue: int):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.active = 0
+        self.queued = 0
+        self.waiting: "OrderedDict[str, deque]" = OrderedDict()  # user_id -> futures, in turn order
+        self.pending_by_user: Dict[str, int] = {}
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait = _Stat()
+        self.latency = _Stat()
+
+    async def acquire(self, user_id: str, timeout: float) -> None:
+        if self.active < self.concurrency and not self.queued:
+            self.active += 1
+            return
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise LlmGatewayBusy("LLM queue is full")
+
+        fut = asyncio.get_running_loop().create_future()
+        self.waiting.setdefault(user_id, deque()).append(fut)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except BaseException as e:
+            if fut.done() and not fut.cancelled():
+                # The slot was handed over just as we gave up: pass it on
+                self.release()
+            else:
+                self._forget(user_id, fut)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts += 1
+                raise LlmGatewayBusy("Timed out waiting for an LLM slot")
+            raise
+
+    def _forget(self, user_id: str, fut) -> None:
+        q = self.waiting.get(user_id)
+        if q and fut in q:
+            q.remove(fut)
+            self.queued -= 1
+            if not q:
+                del self.waiting[user_id]
+
+    def release(self) -> None:
+        """Hand the slot to the next user in round-robin order, or free it."""
+        while self.waiting:
+            user_id, q = next(iter(self.waiting.items()))
+            fut = q.popleft()
+            self.queued -= 1
+            if q:
+                self.waiting.move_to_end(user_id)
+            else:
+                del self.waiting[user_id]
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.active -= 1
+
+    def snapshot(self) -> dict:
+        return {
+            "max_concurrency": self.concurrency,
+            "active": self.active,
+            "queue_depth": self.queued,
+            "waiting_users": len(self.waiting),
+            "calls": self.calls,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "wait": self.wait.snapshot(),
+            "latency": self.latency.snapshot(),
+        }
+
+
+class LlmGateway:
+    def __init__(self, concurrency: int = LLM_MAX_CONCURRENCY, max_queue: int = LLM_MAX_QUEUE,
+                 queue_timeout: float = LLM_QUEUE_TIMEOUT, call_timeout: float = LLM_CALL_TIMEOUT,
+                 max_pending_per_user: int = LLM_MAX_PENDING_PER_USER):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.call_timeout = call_timeout
+        self.max_pending_per_user = max_pending_per_user
+        self._lanes: Dict[str, _ModelLane] = {}
+
+    def _lane(self, model: str) -> _ModelLane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            lane = self._lanes[model] = _ModelLane(self.concurrency, self.max_queue)
+        return lane
+
+    async def run(self, model: str, user_id: Optional[str], call: Callable[[], Awaitable[T]]) -> T:
+        """Run `call()` (which makes one model request) once a slot for `model` is free."""
+        lane = self._lane(model)
+        user_id = user_id or "anonymous"
+        if lane.pending_by_user.get(user_id, 0) >= self.max_pending_per_user:
+            lane.rejected += 1
+            raise LlmGatewayBusy("Too many AI requests in progress for this user")
+
+        lane.pending_by_user[user_id] = lane.pending_by_user.get(user_id, 0) + 1
+        try:
+            started = time.perf_counter()
+            await lane.acquire(user_id, self.queue_timeout)
+            lane.wait.observe((time.perf_counter() - started) * 1000)
+            try:
+                lane.calls += 1
+                started = time.perf_counter()
+                return await asyncio.wait_for(call(), self.call_timeout)
+            except Exception:
+                lane.errors += 1
+                raise
+            finally:
+                lane.latency.observe((time.perf_counter() - started) * 1000)
+                lane.release()
+        finally:
+            lane.pending_by_user[user_id] -= 1
+            if not lane.pending_by_user[user_id]:
+                del lane.pending_by_user[user_id]
+
+    def stats(self) -> dict:
+        return {model: lane.snapshot() for model, lane in self._lanes.items()}
+
+
+# Single shared instance
+llm_gateway = LlmGateway()
+
+
+async def run_llm(model: str, user_id: Optional[str], call: Callable[[], Awaitable[T]]) -> T:
+    """llm_gateway.run for request handlers: a rejected or timed-out admission becomes a 503."""
+    try:
+        return await llm_gateway.run(model, user_id, call)
+    except LlmGatewayBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"AI service busy: {e}. Please retry shortly.",
+            headers={"Retry-After": "5"},
+        )
@@ -13,32 +13,57 @@ from repos.repo import Repo
 from routers import vehicle_service_logs, mechanics, file_upload, voice, agent_chat
 from routers.auth import router as auth_router
 from routers.intelligence import router as intelligence_router
+from routers.metrics import router as metrics_router
 from routers import student_planner
 from contextlib import asynccontextmanager
 from db import PostgresDB
+from migrations import ensure_schema
+from auth_security import password_hasher
+from agent.registry import agent_registry
+from notification_hub import notification_hub
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import json
 
 async def daily_planner_notifications():
-    async with PostgresDB.pool.acquire() as conn:
-        # Find students who have incomplete tasks for today (mocking today for simplicity)
-        # We would ideally match today's day with the plan's day, but for a simplified
-        # production-ready model, we just remind everyone who has active plans
-        plans = await conn.fetch("SELECT student_id FROM student_plans")
-        for p in plans:
-            sid = p["student_id"]
-            import uuid
-            nid = f"notif_{uuid.uuid4().hex}"
-            try:
-                await conn.execute(
-                    "INSERT INTO notifications (id, sender_id, receiver_id, message, type) VALUES ($1, $2, $3, $4, $5)",
-                    nid, "system", sid, "Remember to check your AI Student Planner and complete your daily goals!", "planner_reminder"
-                )
-            except Exception as e:
-                print(f"Failed to insert notification: {e}")
+    # The scheduler runs in every worker; the repo's advisory lock and job_runs
+    # guard make sure only one of them sends today's reminders
+    try:
+        sent = await service.send_planner_reminders()
+        if sent is not None:
+            print(f"Planner reminders sent to {sent} students")
+    except Exception as e:
+        print(f"Planner reminders failed: {e}")
+
+async def archive_old_notifications():
+    try:
+        archived = await service.archive_old_notifications()
+        if archived is not None:
+            print(f"Archived {archived} old notifications")
+    except Exception as e:
+        print(f"Notification retention failed: {e}")
+
+async def refresh_risk_snapshot():
+    try:
+        refreshed = await service.refresh_risk_snapshot()
+        if refreshed:
+            print(f"Risk snapshot refreshed for {refreshed} students")
+    except Exception as e:
+        print(f"Risk snapshot refresh failed: {e}")
+
+async def refresh_analytics_views():
+    try:
+        await service.refresh_analytics_views()
+    except Exception as e:
+        print(f"Analytics view refresh failed: {e}")
+
+RISK_REFRESH_MINUTES = int(os.getenv("RISK_REFRESH_MINUTES", 10))
+ANALYTICS_REFRESH_MINUTES = int(os.getenv("ANALYTICS_REFRESH_MINUTES", 5))
 
 scheduler = AsyncIOScheduler()
 scheduler.add_job(daily_planner_notifications, 'cron', hour=8, minute=0)
+scheduler.add_job(archive_old_notifications, 'cron', hour=3, minute=30)
+scheduler.add_job(refresh_risk_snapshot, 'interval', minutes=RISK_REFRESH_MINUTES, max_instances=1)
+scheduler.add_job(refresh_analytics_views, 'interval', minutes=ANALYTICS_REFRESH_MINUTES, max_instances=1)
 
 
 AGENT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -68,6 +93,8 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pagination/summary headers the dashboards read off list responses
+    expose_headers=["X-Next-Cursor", "X-Alerts-Critical", "X-Alerts-Warning", "X-Unread-Count"],
 )
 
 app.include_router(auth_router)
@@ -111,6 +138,12 @@ app.include_router(
 
 app.include_router(student_planner.router)
 
+app.include_router(
+    metrics_router,
+    prefix="/metrics",
+    tags=["Metrics"],
+)
+
 
 IMAGE_DIR = os.path.join(AGENT_DIR, "service_images")
 os.makedirs(IMAGE_DIR, exist_ok=True)
@@ -126,177 +159,17 @@ async def lifespan(app):
         scheduler.start()
 
     async with PostgresDB.pool.acquire() as conn:
-        await conn.execute("""
-        CREATE TABLE IF NOT EXISTS departments (
-            id TEXT PRIMARY KEY,
-            name TEXT
-        );
-        """)
-        
-        try:
-            await conn.execute("ALTER TABLE departments ADD COLUMN IF NOT EXISTS hod_faculty_id TEXT UNIQUE;")
-        except Exception:
-            pass
-
-        await conn.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id TEXT PRIMARY KEY,
-            name TEXT,
-            email TEXT UNIQUE,
-            password_hash TEXT,
-            role TEXT CHECK (role IN ('student','faculty','hod','admin'))
-        );
-        """)
-
-        await conn.execute("""
-        CREATE TABLE IF NOT EXISTS students (
-            id TEXT PRIMARY KEY,
-            user_id TEXT REFERENCES users(id),
-            usn TEXT,
-            department TEXT,
-            semester INTEGER
-        );
-        """)
-
-        await conn.execute("""
-        CREATE TABLE IF NOT EXISTS faculty (
-            id TEXT PRIMARY KEY,
-            user_id TEXT REFERENCES users(id),
-            faculty_code TEXT UNIQUE,
-            name TEXT,
-            department TEXT,
-            department_id TEXT
-        );
-        """)
-        
-        try:
-            await conn.execute("ALTER TABLE faculty ADD COLUMN IF NOT EXISTS faculty_code TEXT UNIQUE;")
-            await conn.execute("ALTER TABLE faculty ADD COLUMN IF NOT EXISTS name TEXT;")
-            await conn.execute("ALTER TABLE faculty ADD COLUMN IF NOT EXISTS department_id TEXT;")
-        except Exception:
-            pass
-
-        await conn.execute("""
-        CREATE TABLE IF NOT EXISTS subjects (
-            id TEXT PRIMARY KEY,
-            subject_name TEXT,
-            subject_code TEXT UNIQUE,
-            department_id TEXT
-        );
-        """)
-
-        await conn.execute("""
-        CREATE TABLE IF NOT EXISTS faculty_subjects (
-            id TEXT PRIMARY KEY,
-            faculty_id TEXT REFERENCES faculty(id),
-            subject_id TEXT REFERENCES subjects(id)
-        );
-        """)
-        
-        await conn.execute("""
-        CREATE TABLE IF NOT EXISTS student_queries (
-            id TEXT PRIMARY KEY,
-            student_id TEXT REFERENCES students(id),
-            subject_id TEXT REFERENCES subjects(id),
-            message TEXT,
-            status TEXT DEFAULT 'pending',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        """)
-        
-        try:
-            await conn.execute("ALTER TABLE subjects ADD COLUMN IF NOT EXISTS subject_name TEXT;")
-            await conn.execute("ALTER TABLE subjects ADD COLUMN IF NOT EXISTS subject_code TEXT UNIQUE;")
-            await conn.execute("ALTER TABLE subjects ADD COLUMN IF NOT EXISTS department_id TEXT;")
-            await conn.execute("ALTER TABLE subjects ADD COLUMN IF NOT EXISTS semester INTEGER;")
-        except Exception:
-            pass
-
-        await conn.execute("""
-        CREATE TABLE IF NOT EXISTS attendance_sessions (
-            id TEXT PRIMARY KEY,
-            subject_id TEXT REFERENCES subjects(id),
-            faculty_id TEXT REFERENCES faculty(id),
-            session_number INTEGER,
-            total_sessions INTEGER DEFAULT 40,
-            total_classes INTEGER,
-            date DATE
-        );
-        """)
-        
-        try:
-            await conn.execute("ALTER TABLE attendance_sessions ADD COLUMN IF NOT EXISTS total_classes INTEGER;")
-        except Exception:
-            pass
-
-        await conn.execute("""
-        CREATE TABLE IF NOT EXISTS attendance_records (
-            id TEXT PRIMARY KEY,
-            session_id TEXT REFERENCES attendance_sessions(id),
-            student_id TEXT REFERENCES students(id),
-            status TEXT CHECK (status IN ('present', 'absent'))
-        );
-        """)
-
-        await conn.execute("""
-        CREATE TABLE IF NOT EXISTS attendance (
-            id TEXT PRIMARY KEY,
-            student_id TEXT REFERENCES students(id),
-            subject_id TEXT REFERENCES subjects(id),
-            attendance_percentage REAL
-        );
-        """)
-
-        await conn.execute("""
-        CREATE TABLE IF NOT EXISTS marks (
-            id TEXT PRIMARY KEY,
-            student_id TEXT REFERENCES students(id),
-            subject_id TEXT REFERENCES subjects(id),
-            internal_marks REAL,
-            external_marks REAL
-        );
-        """)
-
-        await conn.execute("""
-        CREATE TABLE IF NOT EXISTS results (
-            id TEXT PRIMARY KEY,
-            student_id TEXT REFERENCES students(id),
-            sgpa REAL,
-            cgpa REAL
-        );
-        """)
-
-        await conn.execute("""
-        CREATE TABLE IF NOT EXISTS notifications (
-            id TEXT PRIMARY KEY,
-            sender_id TEXT,
-            receiver_id TEXT,
-            message TEXT,
-            type TEXT DEFAULT 'query',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        """)
-        
-        try:
-            await conn.execute("ALTER TABLE notifications ADD COLUMN IF NOT EXISTS read_status BOOLEAN DEFAULT FALSE;")
-        except Exception:
-            pass
-
-        await conn.execute("""
-        CREATE TABLE IF NOT EXISTS ia_marks (
-            id TEXT PRIMARY KEY,
-            student_id TEXT REFERENCES students(id),
-            subject_id TEXT REFERENCES subjects(id),
-            faculty_id TEXT REFERENCES faculty(id),
-            marks_obtained INTEGER NOT NULL,
-            max_marks INTEGER DEFAULT 40,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(student_id, subject_id)
-        );
-        """)
+        await ensure_schema(conn)
+
+    agent_registry.build()
+    await notification_hub.start()
 
     yield
 
+    await notification_hub.stop()
+    password_hasher.shutdown()
+    await PostgresDB.close()
+
 app.router.lifespan_context = lifespan
 # ----------------------------------------------------------
 
@@ -0,0 +1,433 @@
+# backend/migrations.py
+# Versioned schema migrations, recorded in the schema_version table.
+#
+# main.lifespan calls ensure_schema() on boot:
+#   MIGRATION_MODE=auto  (default) apply pending migrations, skip all DDL when current
+#   MIGRATION_MODE=check refuse to start if the schema is behind, never run DDL
+#   MIGRATION_MODE=off   do nothing (schema managed out of band)
+#
+# Or apply by hand:  python migrations.py
+#
+# Migrations are append-only: never edit a shipped entry, add a new version.
+
+import asyncio
+import os
+
+import asyncpg
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MIGRATION_MODE = os.getenv("MIGRATION_MODE", "auto").lower()
+
+# Arbitrary app-wide key for pg_advisory_lock, so only one worker migrates at a time
+SCHEMA_LOCK_KEY = 72_600_001
+
+
+MIGRATIONS = [
+    (1, "baseline schema", [
+        """
+        CREATE TABLE IF NOT EXISTS departments (
+            id TEXT PRIMARY KEY,
+            name TEXT
+        );
+        """,
+        "ALTER TABLE departments ADD COLUMN IF NOT EXISTS hod_faculty_id TEXT UNIQUE;",
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            name TEXT,
+            email TEXT UNIQUE,
+            password_hash TEXT,
+            role TEXT CHECK (role IN ('student','faculty','hod','admin'))
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS students (
+            id TEXT PRIMARY KEY,
+            user_id TEXT REFERENCES users(id),
+            usn TEXT,
+            department TEXT,
+            semester INTEGER
+        );
+        """,
+        "ALTER TABLE students ADD COLUMN IF NOT EXISTS department_id TEXT;",
+        """
+        CREATE TABLE IF NOT EXISTS faculty (
+            id TEXT PRIMARY KEY,
+            user_id TEXT REFERENCES users(id),
+            faculty_code TEXT UNIQUE,
+            name TEXT,
+            department TEXT,
+            department_id TEXT
+        );
+        """,
+        "ALTER TABLE faculty ADD COLUMN IF NOT EXISTS faculty_code TEXT UNIQUE;",
+        "ALTER TABLE faculty ADD COLUMN IF NOT EXISTS name TEXT;",
+        "ALTER TABLE faculty ADD COLUMN IF NOT EXISTS department_id TEXT;",
+        """
+        CREATE TABLE IF NOT EXISTS subjects (
+            id TEXT PRIMARY KEY,
+            subject_name TEXT,
+            subject_code TEXT UNIQUE,
+            department_id TEXT
+        );
+        """,
+        "ALTER TABLE subjects ADD COLUMN IF NOT EXISTS subject_name TEXT;",
+        "ALTER TABLE subjects ADD COLUMN IF NOT EXISTS subject_code TEXT UNIQUE;",
+        "ALTER TABLE subjects ADD COLUMN IF NOT EXISTS department_id TEXT;",
+        "ALTER TABLE subjects ADD COLUMN IF NOT EXISTS semester INTEGER;",
+        """
+        CREATE TABLE IF NOT EXISTS faculty_subjects (
+            id TEXT PRIMARY KEY,
+            faculty_id TEXT REFERENCES faculty(id),
+            subject_id TEXT REFERENCES subjects(id)
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS student_queries (
+            id TEXT PRIMARY KEY,
+            student_id TEXT REFERENCES students(id),
+            subject_id TEXT REFERENCES subjects(id),
+            message TEXT,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS attendance_sessions (
+            id TEXT PRIMARY KEY,
+            subject_id TEXT REFERENCES subjects(id),
+            faculty_id TEXT REFERENCES faculty(id),
+            session_number INTEGER,
+            total_sessions INTEGER DEFAULT 40,
+            total_classes INTEGER,
+            date DATE
+        );
+        """,
+        "ALTER TABLE attendance_sessions ADD COLUMN IF NOT EXISTS total_classes INTEGER;",
+        """
+        CREATE TABLE IF NOT EXISTS attendance_records (
+            id TEXT PRIMARY KEY,
+            session_id TEXT REFERENCES attendance_sessions(id),
+            student_id TEXT REFERENCES students(id),
+            status TEXT CHECK (status IN ('present', 'absent'))
+        );
+        """,
+        # One record per (session, student): drop legacy duplicates before the unique index
+        """
+        DELETE FROM attendance_records a
+        USING attendance_records b
+        WHERE a.session_id = b.session_id AND a.student_id = b.student_id AND a.id < b.id;
+        """,
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS attendance_records_session_student_key
+        ON attendance_records (session_id, student_id);
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS attendance_rollup (
+            student_id TEXT REFERENCES students(id),
+            subject_id TEXT REFERENCES subjects(id),
+            attended INTEGER NOT NULL DEFAULT 0,
+            sessions_held INTEGER NOT NULL DEFAULT 0,
+            total_classes INTEGER,
+            PRIMARY KEY (student_id, subject_id)
+        );
+        """,
+        """
+        INSERT INTO attendance_rollup (student_id, subject_id, attended, sessions_held, total_classes)
+        SELECT ar.student_id, sess.subject_id,
+               COUNT(*) FILTER (WHERE ar.status = 'present'),
+               COUNT(*),
+               MAX(COALESCE(sess.total_classes, sess.total_sessions, 40))
+        FROM attendance_records ar
+        JOIN attendance_sessions sess ON sess.id = ar.session_id
+        GROUP BY ar.student_id, sess.subject_id
+        ON CONFLICT DO NOTHING;
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS attendance (
+            id TEXT PRIMARY KEY,
+            student_id TEXT REFERENCES students(id),
+            subject_id TEXT REFERENCES subjects(id),
+            attendance_percentage REAL
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS marks (
+            id TEXT PRIMARY KEY,
+            student_id TEXT REFERENCES students(id),
+            subject_id TEXT REFERENCES subjects(id),
+            internal_marks REAL,
+            external_marks REAL
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS results (
+            id TEXT PRIMARY KEY,
+            student_id TEXT REFERENCES students(id),
+            sgpa REAL,
+            cgpa REAL
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS notifications (
+            id TEXT PRIMARY KEY,
+            sender_id TEXT,
+            receiver_id TEXT,
+            message TEXT,
+            type TEXT DEFAULT 'query',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        "ALTER TABLE notifications ADD COLUMN IF NOT EXISTS read_status BOOLEAN DEFAULT FALSE;",
+        """
+        CREATE TABLE IF NOT EXISTS ia_marks (
+            id TEXT PRIMARY KEY,
+            student_id TEXT REFERENCES students(id),
+            subject_id TEXT REFERENCES subjects(id),
+            faculty_id TEXT REFERENCES faculty(id),
+            marks_obtained INTEGER NOT NULL,
+            max_marks INTEGER DEFAULT 40,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(student_id, subject_id)
+        );
+        """,
+        # Planner tables (previously only created by run_db_update_planner.py)
+        """
+        CREATE TABLE IF NOT EXISTS student_plans (
+            id SERIAL PRIMARY KEY,
+            student_id TEXT NOT NULL,
+            plan_json JSONB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS student_progress (
+            id SERIAL PRIMARY KEY,
+            student_id TEXT NOT NULL,
+            day TEXT NOT NULL,
+            task TEXT NOT NULL,
+            completed BOOLEAN DEFAULT FALSE,
+            UNIQUE(student_id, day, task)
+        );
+        """,
+    ]),
+    (2, "secondary indexes for hot lookups", [
+        # attendance_records(session_id) is served by the (session_id, student_id) unique index
+        "CREATE INDEX IF NOT EXISTS attendance_records_student_idx ON attendance_records (student_id);",
+        "CREATE INDEX IF NOT EXISTS attendance_sessions_subject_idx ON attendance_sessions (subject_id, session_number);",
+        "CREATE INDEX IF NOT EXISTS attendance_sessions_faculty_idx ON attendance_sessions (faculty_id);",
+        "CREATE INDEX IF NOT EXISTS attendance_rollup_subject_idx ON attendance_rollup (subject_id);",
+        "CREATE INDEX IF NOT EXISTS students_user_idx ON students (user_id);",
+        "CREATE INDEX IF NOT EXISTS students_dept_semester_idx ON students (department_id, semester);",
+        "CREATE INDEX IF NOT EXISTS students_usn_idx ON students (usn);",
+        "CREATE INDEX IF NOT EXISTS faculty_user_idx ON faculty (user_id);",
+        "CREATE INDEX IF NOT EXISTS faculty_subjects_faculty_idx ON faculty_subjects (faculty_id, subject_id);",
+        "CREATE INDEX IF NOT EXISTS faculty_subjects_subject_idx ON faculty_subjects (subject_id);",
+        "CREATE INDEX IF NOT EXISTS subjects_dept_semester_idx ON subjects (department_id, semester);",
+        "CREATE INDEX IF NOT EXISTS marks_student_idx ON marks (student_id);",
+        "CREATE INDEX IF NOT EXISTS results_student_idx ON results (student_id);",
+        "CREATE INDEX IF NOT EXISTS notifications_receiver_created_idx ON notifications (receiver_id, created_at DESC);",
+        "CREATE INDEX IF NOT EXISTS student_plans_student_idx ON student_plans (student_id);",
+    ]),
+    (3, "student risk snapshot", [
+        """
+        CREATE TABLE IF NOT EXISTS student_risk_snapshot (
+            student_id TEXT PRIMARY KEY REFERENCES students(id) ON DELETE CASCADE,
+            department_id TEXT,
+            risk TEXT NOT NULL,
+            predicted_score DOUBLE PRECISION NOT NULL,
+            recommendation TEXT,
+            details JSONB,
+            computed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS student_risk_snapshot_dept_idx ON student_risk_snapshot (department_id, predicted_score);",
+        # Students whose attendance/marks/results changed since their snapshot was computed
+        """
+        CREATE TABLE IF NOT EXISTS student_risk_dirty (
+            student_id TEXT PRIMARY KEY,
+            marked_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        "INSERT INTO student_risk_dirty (student_id) SELECT id FROM students ON CONFLICT DO NOTHING;",
+    ]),
+    (4, "analytics materialized views", [
+        # Per (department, subject) attendance over attendance_rollup; one pct per student-subject pair
+        """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS analytics_dept_subject_mv AS
+        SELECT sub.department_id, sub.id AS subject_id, sub.subject_name,
+               COUNT(*) AS students,
+               ROUND(AVG(CASE WHEN ro.total_classes > 0
+                              THEN ro.attended * 100.0 / ro.total_classes ELSE 0 END), 1) AS avg_attendance,
+               CURRENT_TIMESTAMP AS refreshed_at
+        FROM attendance_rollup ro
+        JOIN subjects sub ON sub.id = ro.subject_id
+        WHERE ro.sessions_held > 0 AND sub.department_id IS NOT NULL
+        GROUP BY sub.department_id, sub.id, sub.subject_name;
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS analytics_dept_subject_mv_key ON analytics_dept_subject_mv (department_id, subject_id);",
+        # Department totals: low students are distinct across subjects, so they cannot be summed from the view above
+        """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS analytics_department_mv AS
+        SELECT sub.department_id,
+               COUNT(*) AS pairs,
+               ROUND(AVG(CASE WHEN ro.total_classes > 0
+                              THEN ro.attended * 100.0 / ro.total_classes ELSE 0 END), 1) AS avg_attendance,
+               COUNT(DISTINCT ro.student_id) FILTER (
+                   WHERE ro.total_classes IS NULL OR ro.total_classes <= 0
+                      OR ro.attended * 100.0 / ro.total_classes < 75
+               ) AS low_performing_students,
+               CURRENT_TIMESTAMP AS refreshed_at
+        FROM attendance_rollup ro
+        JOIN subjects sub ON sub.id = ro.subject_id
+        WHERE ro.sessions_held > 0 AND sub.department_id IS NOT NULL
+        GROUP BY sub.department_id;
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS analytics_department_mv_key ON analytics_department_mv (department_id);",
+        """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS analytics_institution_mv AS
+        SELECT 1 AS id,
+               COALESCE(SUM(attended), 0) AS present,
+               COALESCE(SUM(sessions_held), 0) AS total,
+               CURRENT_TIMESTAMP AS refreshed_at
+        FROM attendance_rollup;
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS analytics_institution_mv_key ON analytics_institution_mv (id);",
+    ]),
+    (5, "scheduled job history", [
+        """
+        CREATE TABLE IF NOT EXISTS job_runs (
+            id SERIAL PRIMARY KEY,
+            job_name TEXT NOT NULL,
+            run_date DATE NOT NULL,
+            status TEXT NOT NULL,
+            started_at TIMESTAMP NOT NULL,
+            duration_ms DOUBLE PRECISION,
+            rows_affected INTEGER,
+            error TEXT
+        );
+        """,
+        # A daily job succeeds at most once per day; failed runs may be retried
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS job_runs_daily_success_key
+            ON job_runs (job_name, run_date) WHERE status = 'succeeded';
+        """,
+        "CREATE INDEX IF NOT EXISTS job_runs_name_started_idx ON job_runs (job_name, started_at DESC);",
+    ]),
+    (6, "notification paging, unread counters and archive", [
+        # Keyset pages on (created_at, id) per receiver; supersedes notifications_receiver_created_idx
+        "CREATE INDEX IF NOT EXISTS notifications_receiver_keyset_idx ON notifications (receiver_id, created_at DESC, id DESC);",
+        "DROP INDEX IF EXISTS notifications_receiver_created_idx;",
+        "CREATE INDEX IF NOT EXISTS notifications_created_idx ON notifications (created_at);",
+        """
+        CREATE TABLE IF NOT EXISTS notification_unread_counts (
+            receiver_id TEXT PRIMARY KEY,
+            unread INTEGER NOT NULL DEFAULT 0
+        );
+        """,
+        """
+        INSERT INTO notification_unread_counts (receiver_id, unread)
+        SELECT receiver_id, COUNT(*) FROM notifications
+        WHERE receiver_id IS NOT NULL AND NOT COALESCE(read_status, FALSE)
+        GROUP BY receiver_id
+        ON CONFLICT (receiver_id) DO UPDATE SET unread = EXCLUDED.unread;
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS notifications_archive (
+            id TEXT PRIMARY KEY,
+            sender_id TEXT,
+            receiver_id TEXT,
+            message TEXT,
+            type TEXT,
+            created_at TIMESTAMP,
+            read_status BOOLEAN,
+            archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS notifications_archive_receiver_idx ON notifications_archive (receiver_id, created_at DESC);",
+    ]),
+    (7, "attendance rollup follows student and subject deletes", [
+        # Rollup rows are derived; emptied ones must not block deleting their student or subject
+        """
+        ALTER TABLE attendance_rollup
+            DROP CONSTRAINT IF EXISTS attendance_rollup_student_id_fkey,
+            ADD CONSTRAINT attendance_rollup_student_id_fkey
+                FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
+            DROP CONSTRAINT IF EXISTS attendance_rollup_subject_id_fkey,
+            ADD CONSTRAINT attendance_rollup_subject_id_fkey
+                FOREIGN KEY (subject_id) REFERENCES subjects(id) ON DELETE CASCADE;
+        """,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+async def current_version(conn) -> int:
+    if not await conn.fetchval("SELECT to_regclass('schema_version') IS NOT NULL"):
+        return 0
+    return await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+
+
+async def migrate(conn) -> list:
+    """Apply pending migrations, one transaction each, under the schema advisory lock."""
+    applied = []
+    await conn.execute("SELECT pg_advisory_lock($1)", SCHEMA_LOCK_KEY)
+    try:
+        await conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """)
+        # Re-read under the lock: another worker may have finished while we waited
+        done = await current_version(conn)
+        for version, name, statements in MIGRATIONS:
+            if version <= done:
+                continue
+            async with conn.transaction():
+                for stmt in statements:
+                    await conn.execute(stmt)
+                await conn.execute(
+                    "INSERT INTO schema_version (version, name) VALUES ($1, $2)", version, name
+                )
+            applied.append(version)
+            print(f"Applied migration {version}: {name}")
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", SCHEMA_LOCK_KEY)
+    return applied
+
+
+async def ensure_schema(conn, mode: str = MIGRATION_MODE) -> list:
+    if mode == "off":
+        return []
+    version = await current_version(conn)
+    if version >= LATEST_VERSION:
+        return []  # schema current: no DDL at all
+    if mode == "check":
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected {LATEST_VERSION}. Run `python migrations.py`."
+        )
+    return await migrate(conn)
+
+
+async def main():
+    conn = await asyncpg.connect(
+        user=os.getenv("PG_USER", "postgres"),
+        password=os.getenv("PG_PASSWORD", "1234567890"),
+        database=os.getenv("PG_DB", "carpulse"),
+        host=os.getenv("PG_HOST", "localhost"),
+        port=int(os.getenv("PG_PORT", 5432))
+    )
+    try:
+        applied = await migrate(conn)
+        print(f"Schema at version {LATEST_VERSION} ({len(applied)} migration(s) applied)")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
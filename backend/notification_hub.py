@@ -0,0 +1,168 @@
+# backend/notification_hub.py
+# Push delivery for notifications. Every INSERT into notifications is
+# followed (in the same transaction) by pg_notify(NOTIFY_CHANNEL, payload),
+# so the event goes out when the row commits, from whichever worker wrote it.
+#
+# Each worker holds one LISTEN connection and fans events out to its
+# connected clients by receiver_id. A client that disconnects (or falls
+# behind and is dropped) reconnects with the cursor of the last event it saw
+# and catches up with one keyset query; nothing polls.
+
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+from db import PostgresDB
+
+NOTIFY_CHANNEL = "notifications"
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", 100))
+NOTIFY_RECONNECT_SECONDS = float(os.getenv("NOTIFY_RECONNECT_SECONDS", 5))
+
+# pg_notify payloads are capped at 8000 bytes; longer messages are left out
+# and the client reads them through the catch-up query
+_MAX_PAYLOAD_BYTES = 7500
+
+
+def notification_payload(row: dict) -> str:
+    """JSON payload for pg_notify from a notifications row."""
+    event = {
+        "id": row["id"],
+        "sender_id": row.get("sender_id"),
+        "receiver_id": row["receiver_id"],
+        "message": row.get("message"),
+        "type": row.get("type"),
+        "created_at": row["created_at"].isoformat() if isinstance(row["created_at"], datetime) else row["created_at"],
+    }
+    payload = json.dumps(event, default=str)
+    if len(payload.encode()) > _MAX_PAYLOAD_BYTES:
+        event["message"] = None
+        event["truncated"] = True
+        payload = json.dumps(event, default=str)
+    return payload
+
+
+class Subscription:
+    """One connected client. `lagged` is set when it missed events and must reconnect to catch up."""
+
+    def __init__(self, receiver_ids: tuple):
+        self.receiver_ids = receiver_ids
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=NOTIFY_QUEUE_SIZE)
+        self.lagged = False
+
+
+class NotificationHub:
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._conn = None
+        self._task: Optional[asyncio.Task] = None
+        self._lost: Optional[asyncio.Event] = None
+        self.events = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.reconnects = 0
+
+    # ---- LISTEN connection ----
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen_forever(self) -> None:
+        while True:
+            try:
+                self._lost = asyncio.Event()
+                self._conn = await PostgresDB.connect_listener()
+                self._conn.add_termination_listener(lambda conn: self._lost.set())
+                await self._conn.add_listener(NOTIFY_CHANNEL, self._on_notify)
+                if self.reconnects:
+                    # Events may have been missed while the listener was down
+                    self._resync_all()
+                await self._lost.wait()
+            except asyncio.CancelledError:
+                await self._close_conn()
+                raise
+            except Exception as e:
+                print(f"Notification listener error: {e}")
+            await self._close_conn()
+            self.reconnects += 1
+            await asyncio.sleep(NOTIFY_RECONNECT_SECONDS)
+
+    async def _close_conn(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None and not conn.is_closed():
+            try:
+                await conn.close(timeout=2)
+            except Exception:
+                conn.terminate()
+
+    def _on_notify(self, conn, pid, channel, payload: str) -> None:
+        self.events += 1
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        for sub in self._subscribers.get(event.get("receiver_id"), ()):
+            self._offer(sub, event)
+
+    def _offer(self, sub: Subscription, event: dict) -> None:
+        if sub.lagged:
+            return
+        try:
+            sub.queue.put_nowait(event)
+            self.delivered += 1
+        except asyncio.QueueFull:
+            # Slow client: stop queueing; the stream ends and the client catches up on reconnect
+            sub.lagged = True
+            self.dropped += 1
+
+    def _resync_all(self) -> None:
+        for subs in self._subscribers.values():
+            for sub in subs:
+                sub.lagged = True
+                try:
+                    sub.queue.put_nowait(None)  # wake the stream so it ends now
+                except asyncio.QueueFull:
+                    pass
+
+    # ---- clients ----
+
+    def subscribe(self, *receiver_ids: str) -> Subscription:
+        """One client listening for any of receiver_ids (e.g. its user id and its student id)."""
+        sub = Subscription(receiver_ids)
+        for receiver_id in receiver_ids:
+            self._subscribers.setdefault(receiver_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        for receiver_id in sub.receiver_ids:
+            subs = self._subscribers.get(receiver_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[receiver_id]
+
+    def stats(self) -> dict:
+        return {
+            "listening": self._conn is not None and not self._conn.is_closed(),
+            "receivers": len(self._subscribers),
+            "clients": len({sub for subs in self._subscribers.values() for sub in subs}),
+            "events": self.events,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "reconnects": self.reconnects,
+        }
+
+
+# Single shared instance
+notification_hub = NotificationHub()
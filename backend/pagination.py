@@ -0,0 +1,56 @@
+# backend/pagination.py
+# Opaque keyset cursors. A cursor is the sort key of the last row on a page,
+# JSON-encoded and base64url'd; the next page asks for rows strictly after it.
+# List endpoints keep returning plain JSON arrays and hand the next cursor
+# back in the X-Next-Cursor header (empty when there is no further page).
+
+import base64
+import json
+import os
+from typing import Iterable, List, Optional
+
+from fastapi import HTTPException
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Directory lists (students, faculty, subjects, results)
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", 500))
+MAX_LIST_PAGE_SIZE = int(os.getenv("MAX_LIST_PAGE_SIZE", 5000))
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[List]:
+    """The sort key in a cursor, or None for the first page. Malformed cursors are a 400."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[List[str]]:
+    """
+    `fields=usn,semester` -> the columns to select, always including id (the
+    keyset). None/empty selects every column. Unknown names are a 400, which
+    also keeps anything but known column names out of the SQL.
+    """
+    if not fields:
+        return None
+    allowed = list(allowed)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(allowed)}",
+        )
+    return ["id"] + [f for f in dict.fromkeys(requested) if f != "id"]
@@ -1,75 +1,462 @@
+import json
 import time
-from datetime import date as date_type
-from typing import Optional, List
+from contextlib import asynccontextmanager, nullcontext
+from datetime import date as date_type, datetime, timezone
+from decimal import Decimal
+from typing import AsyncIterator, Optional, List
 
 from models.data_models import Student, Faculty, Subject, Attendance, Marks, Result, Department
 from db import PostgresDB
+from auth_cache import principal_cache
+from agent_cache import agent_response_cache
+from id_gen import new_id, new_ids
+from notification_hub import NOTIFY_CHANNEL, notification_payload
 
 
 def row_to_dict(row):
     return dict(row)
 
+
+def hydrate(model, row):
+    """
+    Model instance from a row of our own schema without re-validating it:
+    column types already match the model fields, and model_construct is
+    several times cheaper than Model(**row) per row on large lists.
+    """
+    return model.model_construct(**row_to_dict(row))
+
+
+# pg_try_advisory_lock keys so only one worker runs each refresh at a time
+RISK_REFRESH_LOCK_KEY = 72_600_002
+ANALYTICS_REFRESH_LOCK_KEY = 72_600_003
+PLANNER_REMINDER_LOCK_KEY = 72_600_004
+NOTIFICATION_RETENTION_LOCK_KEY = 72_600_005
+
+PLANNER_REMINDER_JOB = "planner_reminders"
+NOTIFICATION_RETENTION_JOB = "notification_retention"
+PLANNER_REMINDER_MESSAGE = "Remember to check your AI Student Planner and complete your daily goals!"
+
+# Students whose plan has an incomplete task for today ($1), one reminder each.
+# A plan's "Day N" is counted from the day it was (re)generated, wrapping weekly.
+PLANNER_REMINDER_DUE_SQL = """
+SELECT DISTINCT p.student_id
+FROM student_plans p
+JOIN student_progress sp
+  ON sp.student_id = p.student_id
+ AND sp.day = 'Day ' || ((($1::date - p.created_at::date) % 7) + 1)
+ AND NOT sp.completed
+ORDER BY p.student_id
+"""
+
+# Insert the reminders ($1 ids from new_ids, $2 receivers) in one statement,
+# bumping the unread counters and notifying the hub as the rows commit.
+PLANNER_REMINDER_SQL = """
+WITH inserted AS (
+    INSERT INTO notifications (id, sender_id, receiver_id, message, type)
+    SELECT t.id, 'system', t.receiver_id, $3, 'planner_reminder'
+    FROM unnest($1::text[], $2::text[]) AS t(id, receiver_id)
+    RETURNING id, sender_id, receiver_id, message, type, created_at
+),
+counted AS (
+    INSERT INTO notification_unread_counts (receiver_id, unread)
+    SELECT receiver_id, COUNT(*) FROM inserted GROUP BY receiver_id
+    ON CONFLICT (receiver_id) DO UPDATE SET unread = notification_unread_counts.unread + EXCLUDED.unread
+),
+notified AS (
+    SELECT pg_notify($4, json_build_object(
+        'id', id, 'sender_id', sender_id, 'receiver_id', receiver_id,
+        'message', message, 'type', type, 'created_at', created_at
+    )::text)
+    FROM inserted
+)
+SELECT COUNT(*) FROM notified
+"""
+
+# Per-receiver unread counters (migration 6). Every write that creates, reads
+# or removes an unread notification adjusts them in the same statement or transaction.
+INCREMENT_UNREAD_SQL = """
+INSERT INTO notification_unread_counts (receiver_id, unread) VALUES ($1, 1)
+ON CONFLICT (receiver_id) DO UPDATE SET unread = notification_unread_counts.unread + 1
+"""
+
+# Mark the receivers' ($1) unread notifications read: the ids in $2, or all of them
+# when $2 is NULL. The NOT read_status predicate is rechecked under the row lock,
+# so concurrent calls cannot decrement the counter twice for one row.
+MARK_NOTIFICATIONS_READ_SQL = """
+WITH marked AS (
+    UPDATE notifications SET read_status = TRUE
+    WHERE receiver_id = ANY($1::text[])
+      AND NOT COALESCE(read_status, FALSE)
+      AND ($2::text[] IS NULL OR id = ANY($2::text[]))
+    RETURNING receiver_id
+),
+counted AS (
+    UPDATE notification_unread_counts c
+    SET unread = GREATEST(c.unread - m.n, 0)
+    FROM (SELECT receiver_id, COUNT(*) AS n FROM marked GROUP BY receiver_id) m
+    WHERE c.receiver_id = m.receiver_id
+)
+SELECT COUNT(*) FROM marked
+"""
+
+# Move up to $2 notifications created before $1 into notifications_archive
+ARCHIVE_NOTIFICATIONS_SQL = """
+WITH moved AS (
+    DELETE FROM notifications
+    WHERE id IN (
+        SELECT id FROM notifications
+        WHERE created_at < $1
+        ORDER BY created_at
+        LIMIT $2
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, sender_id, receiver_id, message, type, created_at, read_status
+),
+archived AS (
+    INSERT INTO notifications_archive (id, sender_id, receiver_id, message, type, created_at, read_status)
+    SELECT id, sender_id, receiver_id, message, type, created_at, read_status FROM moved
+    ON CONFLICT (id) DO NOTHING
+),
+counted AS (
+    UPDATE notification_unread_counts c
+    SET unread = GREATEST(c.unread - m.n, 0)
+    FROM (SELECT receiver_id, COUNT(*) AS n FROM moved
+          WHERE NOT COALESCE(read_status, FALSE) GROUP BY receiver_id) m
+    WHERE c.receiver_id = m.receiver_id
+)
+SELECT COUNT(*) FROM moved
+"""
+
+# Materialized views behind the HOD/admin dashboards (migration 4)
+ANALYTICS_VIEWS = ("analytics_dept_subject_mv", "analytics_department_mv", "analytics_institution_mv")
+
+
+def _freshness(refreshed_at) -> dict:
+    """refreshed_at / staleness_seconds for a dashboard read off the analytics views (timestamptz)."""
+    if refreshed_at is None:
+        return {"refreshed_at": None, "staleness_seconds": None}
+    return {
+        "refreshed_at": refreshed_at.isoformat(),
+        "staleness_seconds": round((datetime.now(timezone.utc) - refreshed_at).total_seconds(), 1),
+    }
+
+
+async def _list_page(table: str, model, filters: list, limit: Optional[int],
+                     after: Optional[str], fields: Optional[List[str]]) -> dict:
+    """
+    One keyset page (ORDER BY id) of a directory table.
+    filters: (expression, value) pairs, each expression with a {0} placeholder for
+    its parameter; pairs whose value is None are skipped. fields (already validated
+    column names) returns plain dicts of just those columns instead of models.
+    limit=None reads everything (internal callers).
+    """
+    args, where = [], []
+    for expression, value in filters:
+        if value is not None:
+            args.append(value)
+            where.append(expression.format(f"${len(args)}"))
+    if after is not None:
+        args.append(after)
+        where.append(f"id > ${len(args)}")
+    q = f"SELECT {', '.join(fields or model.model_fields)} FROM {table}"
+    if where:
+        q += " WHERE " + " AND ".join(where)
+    q += " ORDER BY id"
+    if limit is not None:
+        args.append(limit + 1)
+        q += f" LIMIT ${len(args)}"
+    async with PostgresDB.pool.acquire() as conn:
+        rows = await conn.fetch(q, *args)
+    next_after = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_after = rows[-1]["id"]
+    if fields:
+        return {"rows": [row_to_dict(r) for r in rows], "next_after": next_after}
+    return {"rows": [hydrate(model, r) for r in rows], "next_after": next_after}
+
+
+# Per-subject attendance for one student ($1), read from attendance_rollup.
+# Subjects of the student's dept+semester that have sessions but no record for
+# the student yet still show up with attended=0.
+STUDENT_SUBJECT_ATTENDANCE_SQL = """
+SELECT sub.id AS subject_id, sub.subject_name,
+       COALESCE(ro.attended, 0) AS attended,
+       COALESCE(ro.total_classes,
+                (SELECT MAX(COALESCE(total_classes, total_sessions, 40))
+                 FROM attendance_sessions WHERE subject_id = sub.id)) AS total,
+       COALESCE(ro.sessions_held, 0) AS sessions_held
+FROM students st
+JOIN subjects sub ON sub.department_id = st.department_id AND sub.semester = st.semester
+LEFT JOIN attendance_rollup ro ON ro.student_id = st.id AND ro.subject_id = sub.id
+WHERE st.id = $1
+  AND (ro.student_id IS NOT NULL
+       OR EXISTS (SELECT 1 FROM attendance_sessions WHERE subject_id = sub.id))
+ORDER BY sub.subject_name
+"""
+
+
+STUDENTS_REPORT_SQL = """
+WITH per_student AS (
+    SELECT ro.student_id,
+           SUM(ro.attended)      AS attended,
+           MAX(ro.total_classes) AS total
+    FROM attendance_rollup ro
+    JOIN students st ON st.id = ro.student_id
+    JOIN subjects sub ON sub.id = ro.subject_id
+     AND sub.department_id = st.department_id
+     AND sub.semester = st.semester
+    GROUP BY ro.student_id
+)
+SELECT
+    s.id, s.usn, u.name, s.department, s.department_id, s.semester,
+    COALESCE(ROUND(ps.attended * 100.0 / NULLIF(ps.total, 0), 1), 0) AS avg_attendance
+FROM students s
+LEFT JOIN users u ON u.id = s.user_id
+LEFT JOIN per_student ps ON ps.student_id = s.id
+ORDER BY s.department, s.semester, s.usn
+"""
+
+FACULTY_REPORT_SQL = """
+SELECT f.id, f.faculty_code, f.name, f.department, f.department_id, u.email
+FROM faculty f
+LEFT JOIN users u ON u.id = f.user_id
+ORDER BY f.department, f.name
+"""
+
+
+# Risk-scoring features for every student matching the filters ($1 department_id,
+# $2 student ids; NULL means no filter). Attendance averages per-subject
+# percentages over the student's current dept+semester subjects exactly like
+# STUDENT_SUBJECT_ATTENDANCE_SQL; marks are (internal + external) / 150.
+PREDICTION_FEATURES_SQL = """
+WITH target AS (
+    SELECT s.id, s.usn, u.name, s.department_id, s.semester
+    FROM students s
+    LEFT JOIN users u ON u.id = s.user_id
+    WHERE ($1::text IS NULL OR s.department_id = $1)
+      AND ($2::text[] IS NULL OR s.id = ANY($2::text[]))
+),
+subject_totals AS (
+    SELECT subject_id, MAX(COALESCE(total_classes, total_sessions, 40)) AS total
+    FROM attendance_sessions
+    GROUP BY subject_id
+),
+att AS (
+    SELECT t.id AS student_id,
+           AVG(COALESCE(ro.attended, 0) * 100.0 / COALESCE(ro.total_classes, st.total))
+               FILTER (WHERE COALESCE(ro.total_classes, st.total) > 0) AS avg_attendance
+    FROM target t
+    JOIN subjects sub ON sub.department_id = t.department_id AND sub.semester = t.semester
+    LEFT JOIN attendance_rollup ro ON ro.student_id = t.id AND ro.subject_id = sub.id
+    LEFT JOIN subject_totals st ON st.subject_id = sub.id
+    WHERE ro.student_id IS NOT NULL OR st.subject_id IS NOT NULL
+    GROUP BY t.id
+),
+mk AS (
+    SELECT m.student_id,
+           AVG((COALESCE(m.internal_marks, 0) + COALESCE(m.external_marks, 0)) / 150.0 * 100) AS avg_marks_pct
+    FROM marks m
+    JOIN target t ON t.id = m.student_id
+    GROUP BY m.student_id
+),
+sess AS (
+    SELECT ro.student_id, SUM(ro.sessions_held) AS sessions
+    FROM attendance_rollup ro
+    JOIN target t ON t.id = ro.student_id
+    GROUP BY ro.student_id
+)
+SELECT t.id AS student_id, t.usn, t.name, t.department_id, t.semester,
+       COALESCE(att.avg_attendance, 0)::float8 AS avg_attendance,
+       COALESCE(mk.avg_marks_pct, 0)::float8   AS avg_marks_pct,
+       COALESCE(res.cgpa, 0)::float8           AS cgpa,
+       COALESCE(sess.sessions, 0)::int         AS sessions_attended
+FROM target t
+LEFT JOIN att  ON att.student_id = t.id
+LEFT JOIN mk   ON mk.student_id = t.id
+LEFT JOIN sess ON sess.student_id = t.id
+LEFT JOIN LATERAL (
+    SELECT cgpa FROM results WHERE student_id = t.id ORDER BY id DESC LIMIT 1
+) res ON TRUE
+"""
+
+
+ALERT_CRITICAL_PCT = 75
+ALERT_WARNING_PCT = 85
+
+# Attendance per (student, subject), restricted by scope: $1 student_id,
+# $2 faculty_id (subjects they teach), $3 department_id; NULL = no filter.
+# A student's own alerts cover every subject with sessions in their current
+# dept+semester (unmarked ones count as 0 attended). Other scopes cover only
+# pairs with attendance records, whatever semester the student is in now.
+# Pairs at or above the warning threshold ($4) are dropped in SQL.
+_ATTENDANCE_ALERT_CTE = """
+WITH subject_totals AS (
+    SELECT subject_id, MAX(COALESCE(total_classes, total_sessions, 40)) AS total
+    FROM attendance_sessions
+    GROUP BY subject_id
+),
+pairs AS (
+    SELECT st.id AS student_id, st.user_id, sub.id AS subject_id, sub.subject_name, tot.total,
+           ro.attended, ro.total_classes
+    FROM students st
+    JOIN subjects sub ON sub.department_id = st.department_id AND sub.semester = st.semester
+    JOIN subject_totals tot ON tot.subject_id = sub.id
+    LEFT JOIN attendance_rollup ro ON ro.student_id = st.id AND ro.subject_id = sub.id
+    WHERE $1::text IS NOT NULL AND st.id = $1
+      AND ($2::text IS NULL OR sub.id IN (SELECT subject_id FROM faculty_subjects WHERE faculty_id = $2))
+      AND ($3::text IS NULL OR sub.department_id = $3)
+    UNION ALL
+    SELECT st.id, st.user_id, sub.id, sub.subject_name, tot.total,
+           ro.attended, ro.total_classes
+    FROM attendance_rollup ro
+    JOIN students st ON st.id = ro.student_id
+    JOIN subjects sub ON sub.id = ro.subject_id
+    JOIN subject_totals tot ON tot.subject_id = sub.id
+    WHERE $1::text IS NULL AND ro.sessions_held > 0
+      AND ($2::text IS NULL OR sub.id IN (SELECT subject_id FROM faculty_subjects WHERE faculty_id = $2))
+      AND ($3::text IS NULL OR sub.department_id = $3)
+),
+scored AS (
+    SELECT p.student_id, u.name AS student_name, p.subject_id, p.subject_name,
+           COALESCE(p.attended, 0) AS attended,
+           COALESCE(p.total_classes, p.total) AS total,
+           CASE WHEN COALESCE(p.total_classes, p.total) > 0
+                THEN COALESCE(p.attended, 0) * 100.0 / COALESCE(p.total_classes, p.total)
+                ELSE 100.0 END AS pct
+    FROM pairs p
+    LEFT JOIN users u ON u.id = p.user_id
+)
+"""
+
+# Keyset page: rows strictly after ($5 pct, $6 subject_id, $7 student_id), $8 rows
+ATTENDANCE_ALERTS_SQL = _ATTENDANCE_ALERT_CTE + """
+SELECT * FROM scored
+WHERE pct < $4::int
+  AND ($5::numeric IS NULL OR (pct, subject_id, student_id) > ($5::numeric, $6::text, $7::text))
+ORDER BY pct, subject_id, student_id
+LIMIT $8
+"""
+
+# Severity totals for the whole scope; $5 is the critical threshold
+ATTENDANCE_ALERT_COUNTS_SQL = _ATTENDANCE_ALERT_CTE + """
+SELECT CASE WHEN pct < $5::int THEN 'critical' ELSE 'warning' END AS severity, COUNT(*) AS count
+FROM scored
+WHERE pct < $4::int
+GROUP BY 1
+"""
+
+
+async def mark_risk_dirty(conn, student_ids: List[str]):
+    """Queue students for the next risk snapshot refresh (call inside the write's transaction).
+
+    clock_timestamp() rather than CURRENT_TIMESTAMP: the refresh job only clears
+    entries it has seen, so a re-mark must always move marked_at forward.
+    """
+    if not student_ids:
+        return
+    await conn.execute("""
+    INSERT INTO student_risk_dirty (student_id, marked_at)
+    SELECT DISTINCT unnest($1::text[]), clock_timestamp()
+    ON CONFLICT (student_id) DO UPDATE SET marked_at = EXCLUDED.marked_at
+    """, student_ids)
+
+
+async def apply_attendance_rollup(conn, session_id: str, student_ids: List[str],
+                                  attended_deltas: List[int], session_deltas: List[int]):
+    """Add per-student deltas for one session's subject to attendance_rollup (caller owns the transaction)."""
+    q = """
+    INSERT INTO attendance_rollup (student_id, subject_id, attended, sessions_held, total_classes)
+    SELECT d.student_id, sess.subject_id, d.attended, d.sessions,
+           COALESCE(sess.total_classes, sess.total_sessions, 40)
+    FROM unnest($2::text[], $3::int[], $4::int[]) AS d(student_id, attended, sessions)
+    JOIN attendance_sessions sess ON sess.id = $1
+    ON CONFLICT (student_id, subject_id) DO UPDATE SET
+        attended      = attendance_rollup.attended + EXCLUDED.attended,
+        sessions_held = attendance_rollup.sessions_held + EXCLUDED.sessions_held,
+        total_classes = GREATEST(attendance_rollup.total_classes, EXCLUDED.total_classes)
+    """
+    await conn.execute(q, session_id, student_ids, attended_deltas, session_deltas)
+
 class Repo:
 
     # -------------------- DEPARTMENTS -------------------- #
 
     async def insert_department(self, d: Department) -> Department:
-        d.id = d.id or "dept_" + str(int(time.time() * 1000))
+        d.id = d.id or new_id("dept_")
         q = "INSERT INTO departments (id, name) VALUES ($1, $2)"
         async with PostgresDB.pool.acquire() as conn:
             await conn.execute(q, d.id, d.name)
+        agent_response_cache.invalidate_directory()
         return d
 
     async def get_department(self, dept_id: str) -> Optional[Department]:
         async with PostgresDB.pool.acquire() as conn:
             row = await conn.fetchrow("SELECT * FROM departments WHERE id=$1", dept_id)
-        return Department(**row_to_dict(row)) if row else None
+        return hydrate(Department, row) if row else None
 
     async def list_departments(self) -> List[Department]:
         async with PostgresDB.pool.acquire() as conn:
             rows = await conn.fetch("SELECT * FROM departments")
-        return [Department(**row_to_dict(r)) for r in rows]
+        return [hydrate(Department, r) for r in rows]
 
     async def assign_hod_to_department(self, department_id: str, faculty_id: str) -> bool:
-        q = "UPDATE departments SET hod_faculty_id=$1 WHERE id=$2"
+        # The row lock makes the old HOD read and the swap one step, so the
+        # outgoing HOD's cached principal is always invalidated too
+        q = """
+        UPDATE departments d SET hod_faculty_id=$1
+        FROM (SELECT hod_faculty_id FROM departments WHERE id=$2 FOR UPDATE) old
+        WHERE d.id=$2
+        RETURNING old.hod_faculty_id
+        """
         async with PostgresDB.pool.acquire() as conn:
-            r = await conn.execute(q, faculty_id, department_id)
-        return r.endswith("1")
+            async with conn.transaction():
+                row = await conn.fetchrow(q, faculty_id, department_id)
+        principal_cache.invalidate_faculty(faculty_id)
+        if row is not None and row["hod_faculty_id"] != faculty_id:
+            principal_cache.invalidate_faculty(row["hod_faculty_id"])
+        agent_response_cache.invalidate_directory()
+        return row is not None
 
     async def get_department_by_hod(self, faculty_id: str) -> Optional[Department]:
         async with PostgresDB.pool.acquire() as conn:
             row = await conn.fetchrow("SELECT * FROM departments WHERE hod_faculty_id=$1", faculty_id)
-        return Department(**row_to_dict(row)) if row else None
+        return hydrate(Department, row) if row else None
 
     # -------------------- STUDENTS -------------------- #
 
     async def insert_student(self, s: Student) -> Student:
-        s.id = s.id or "stu_" + str(int(time.time() * 1000))
+        s.id = s.id or new_id("stu_")
         q = """
         INSERT INTO students (id, user_id, usn, department, department_id, semester)
         VALUES ($1, $2, $3, $4, $5, $6)
         """
         async with PostgresDB.pool.acquire() as conn:
-            await conn.execute(q, s.id, s.user_id, s.usn, s.department, s.department_id, s.semester)
+            async with conn.transaction():
+                await conn.execute(q, s.id, s.user_id, s.usn, s.department, s.department_id, s.semester)
+                await mark_risk_dirty(conn, [s.id])
+        agent_response_cache.invalidate_students([s.id])
         return s
 
     async def get_student(self, student_id: str) -> Optional[Student]:
         async with PostgresDB.pool.acquire() as conn:
             row = await conn.fetchrow("SELECT * FROM students WHERE id=$1", student_id)
-        return Student(**row_to_dict(row)) if row else None
+        return hydrate(Student, row) if row else None
 
     async def get_student_by_user_id(self, user_id: str) -> Optional[Student]:
         async with PostgresDB.pool.acquire() as conn:
             row = await conn.fetchrow("SELECT * FROM students WHERE user_id=$1", user_id)
-        return Student(**row_to_dict(row)) if row else None
+        return hydrate(Student, row) if row else None
 
     async def list_students(self, department: Optional[str] = None) -> List[Student]:
-        async with PostgresDB.pool.acquire() as conn:
-            if department:
-                rows = await conn.fetch("SELECT * FROM students WHERE department=$1", department)
-            else:
-                rows = await conn.fetch("SELECT * FROM students")
-        return [Student(**row_to_dict(r)) for r in rows]
+        return (await self.list_students_page(department=department or None))["rows"]
+
+    async def list_students_page(self, department: Optional[str] = None, department_id: Optional[str] = None,
+                                 semester: Optional[int] = None, limit: Optional[int] = None,
+                                 after: Optional[str] = None, fields: Optional[List[str]] = None) -> dict:
+        filters = [("department = {0}", department), ("department_id = {0}", department_id),
+                   ("semester = {0}", semester)]
+        return await _list_page("students", Student, filters, limit, after, fields)
 
     async def list_students_by_dept_id(self, department_id: str, semester: Optional[int] = None) -> List[Student]:
         async with PostgresDB.pool.acquire() as conn:
@@ -83,7 +470,16 @@ class Repo:
                     "SELECT * FROM students WHERE department_id=$1",
                     department_id
                 )
-        return [Student(**row_to_dict(r)) for r in rows]
+        return [hydrate(Student, r) for r in rows]
+
+    async def list_student_ids_by_dept_id(self, department_id: str, semester: int) -> List[str]:
+        """Only the ids of a class — used by the attendance write path."""
+        async with PostgresDB.pool.acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT id FROM students WHERE department_id=$1 AND semester=$2",
+                department_id, semester
+            )
+        return [r["id"] for r in rows]
 
     async def get_students_with_names_for_session(self, department_id: str, semester: int) -> List[dict]:
         """Returns students with their name from users table for attendance marking."""
@@ -101,63 +497,71 @@ class Repo:
     async def delete_student(self, student_id: str) -> int:
         async with PostgresDB.pool.acquire() as conn:
             r = await conn.execute("DELETE FROM students WHERE id=$1", student_id)
+        agent_response_cache.invalidate_students([student_id])
         return int(r.split()[-1])
 
     async def get_student_by_usn(self, usn: str) -> Optional[Student]:
         async with PostgresDB.pool.acquire() as conn:
             row = await conn.fetchrow("SELECT * FROM students WHERE usn=$1", usn)
-        return Student(**row_to_dict(row)) if row else None
+        return hydrate(Student, row) if row else None
 
     async def link_user_to_student(self, usn: str, user_id: str) -> bool:
         async with PostgresDB.pool.acquire() as conn:
             r = await conn.execute("UPDATE students SET user_id=$1 WHERE usn=$2", user_id, usn)
+        principal_cache.invalidate(user_id)
+        agent_response_cache.invalidate_directory()
         return r.endswith("1")
 
     # -------------------- FACULTY -------------------- #
 
     async def insert_faculty(self, f: Faculty) -> Faculty:
-        f.id = f.id or "fac_" + str(int(time.time() * 1000))
+        f.id = f.id or new_id("fac_")
         q = """
         INSERT INTO faculty (id, user_id, faculty_code, name, department, department_id)
         VALUES ($1, $2, $3, $4, $5, $6)
         """
         async with PostgresDB.pool.acquire() as conn:
             await conn.execute(q, f.id, f.user_id, f.faculty_code, f.name, f.department, f.department_id)
+        agent_response_cache.invalidate_directory()
         return f
 
     async def get_faculty_by_code(self, faculty_code: str) -> Optional[Faculty]:
         async with PostgresDB.pool.acquire() as conn:
             row = await conn.fetchrow("SELECT * FROM faculty WHERE faculty_code=$1", faculty_code)
-        return Faculty(**row_to_dict(row)) if row else None
+        return hydrate(Faculty, row) if row else None
 
     async def link_user_to_faculty(self, faculty_code: str, user_id: str) -> bool:
         async with PostgresDB.pool.acquire() as conn:
             r = await conn.execute("UPDATE faculty SET user_id=$1 WHERE faculty_code=$2", user_id, faculty_code)
+        principal_cache.invalidate(user_id)
+        agent_response_cache.invalidate_directory()
         return r.endswith("1")
 
     async def update_faculty_department(self, faculty_id: str, department_id: str) -> bool:
         q = "UPDATE faculty SET department_id=$1 WHERE id=$2"
         async with PostgresDB.pool.acquire() as conn:
             r = await conn.execute(q, department_id, faculty_id)
+        agent_response_cache.invalidate_directory()
         return r.endswith("1")
 
     async def get_faculty(self, faculty_id: str) -> Optional[Faculty]:
         async with PostgresDB.pool.acquire() as conn:
             row = await conn.fetchrow("SELECT * FROM faculty WHERE id=$1", faculty_id)
-        return Faculty(**row_to_dict(row)) if row else None
+        return hydrate(Faculty, row) if row else None
 
     async def get_faculty_by_user_id(self, user_id: str) -> Optional[Faculty]:
         async with PostgresDB.pool.acquire() as conn:
             row = await conn.fetchrow("SELECT * FROM faculty WHERE user_id=$1", user_id)
-        return Faculty(**row_to_dict(row)) if row else None
+        return hydrate(Faculty, row) if row else None
 
     async def list_faculty(self, department_id: Optional[str] = None) -> List[Faculty]:
-        async with PostgresDB.pool.acquire() as conn:
-            if department_id:
-                rows = await conn.fetch("SELECT * FROM faculty WHERE department_id=$1 OR department=$1", department_id)
-            else:
-                rows = await conn.fetch("SELECT * FROM faculty")
-        return [Faculty(**row_to_dict(r)) for r in rows]
+        return (await self.list_faculty_page(department_id=department_id or None))["rows"]
+
+    async def list_faculty_page(self, department_id: Optional[str] = None, limit: Optional[int] = None,
+                                after: Optional[str] = None, fields: Optional[List[str]] = None) -> dict:
+        # Older faculty rows only carry the department name, so match either column
+        filters = [("(department_id = {0} OR department = {0})", department_id)]
+        return await _list_page("faculty", Faculty, filters, limit, after, fields)
 
     async def get_user_by_email(self, email: str) -> Optional[dict]:
         async with PostgresDB.pool.acquire() as conn:
@@ -172,50 +576,79 @@ class Repo:
     async def delete_faculty_safe(self, faculty_id: str, user_id: str):
         """Cascade delete all faculty data then remove faculty and user rows."""
         async with PostgresDB.pool.acquire() as conn:
-            # 1. Remove subject assignments
-            await conn.execute("DELETE FROM faculty_subjects WHERE faculty_id=$1", faculty_id)
-            # 2. Remove attendance records for sessions this faculty ran
-            await conn.execute(
-                "DELETE FROM attendance_records WHERE session_id IN "
-                "(SELECT id FROM attendance_sessions WHERE faculty_id=$1)",
-                faculty_id
-            )
-            # 3. Remove attendance sessions
-            await conn.execute("DELETE FROM attendance_sessions WHERE faculty_id=$1", faculty_id)
-            # 4. Remove faculty row
-            await conn.execute("DELETE FROM faculty WHERE id=$1", faculty_id)
-            # 5. Remove user row
-            await conn.execute("DELETE FROM users WHERE id=$1", user_id)
+            async with conn.transaction():
+                # 1. Remove subject assignments
+                await conn.execute("DELETE FROM faculty_subjects WHERE faculty_id=$1", faculty_id)
+                # 2. Take this faculty's sessions back out of the attendance rollup
+                await conn.execute("""
+                    UPDATE attendance_rollup ro
+                    SET attended = ro.attended - g.attended,
+                        sessions_held = ro.sessions_held - g.sessions
+                    FROM (
+                        SELECT ar.student_id, sess.subject_id,
+                               COUNT(*) FILTER (WHERE ar.status = 'present') AS attended,
+                               COUNT(*) AS sessions
+                        FROM attendance_records ar
+                        JOIN attendance_sessions sess ON sess.id = ar.session_id
+                        WHERE sess.faculty_id = $1
+                        GROUP BY ar.student_id, sess.subject_id
+                    ) g
+                    WHERE ro.student_id = g.student_id AND ro.subject_id = g.subject_id
+                """, faculty_id)
+                affected = await conn.fetch(
+                    "SELECT DISTINCT ar.student_id FROM attendance_records ar "
+                    "JOIN attendance_sessions sess ON sess.id = ar.session_id WHERE sess.faculty_id=$1",
+                    faculty_id
+                )
+                await mark_risk_dirty(conn, [r["student_id"] for r in affected])
+                # 3. Remove attendance records for sessions this faculty ran
+                await conn.execute(
+                    "DELETE FROM attendance_records WHERE session_id IN "
+                    "(SELECT id FROM attendance_sessions WHERE faculty_id=$1)",
+                    faculty_id
+                )
+                # 4. Remove attendance sessions
+                await conn.execute("DELETE FROM attendance_sessions WHERE faculty_id=$1", faculty_id)
+                # 5. Remove faculty row
+                await conn.execute("DELETE FROM faculty WHERE id=$1", faculty_id)
+                # 6. Remove user row
+                await conn.execute("DELETE FROM users WHERE id=$1", user_id)
+        principal_cache.invalidate(user_id)
+        principal_cache.invalidate_faculty(faculty_id)
+        agent_response_cache.invalidate_directory()
+        agent_response_cache.invalidate_students(r["student_id"] for r in affected)
 
     # -------------------- SUBJECTS -------------------- #
 
     async def insert_subject(self, s: Subject) -> Subject:
-        s.id = s.id or "sub_" + str(int(time.time() * 1000))
+        s.id = s.id or new_id("sub_")
         q = """
         INSERT INTO subjects (id, subject_name, subject_code, department_id, semester)
         VALUES ($1, $2, $3, $4, $5)
         """
         async with PostgresDB.pool.acquire() as conn:
             await conn.execute(q, s.id, s.subject_name, s.subject_code, s.department_id, s.semester)
+        agent_response_cache.clear()
         return s
 
     async def get_subject(self, subject_id: str) -> Optional[Subject]:
         async with PostgresDB.pool.acquire() as conn:
             row = await conn.fetchrow("SELECT * FROM subjects WHERE id=$1", subject_id)
-        return Subject(**row_to_dict(row)) if row else None
+        return hydrate(Subject, row) if row else None
 
     async def get_subject_by_code(self, subject_code: str) -> Optional[Subject]:
         async with PostgresDB.pool.acquire() as conn:
             row = await conn.fetchrow("SELECT * FROM subjects WHERE subject_code=$1", subject_code)
-        return Subject(**row_to_dict(row)) if row else None
+        return hydrate(Subject, row) if row else None
 
     async def list_subjects(self, department_id: Optional[str] = None) -> List[Subject]:
-        async with PostgresDB.pool.acquire() as conn:
-            if department_id:
-                rows = await conn.fetch("SELECT * FROM subjects WHERE department_id=$1", department_id)
-            else:
-                rows = await conn.fetch("SELECT * FROM subjects")
-        return [Subject(**row_to_dict(r)) for r in rows]
+        return (await self.list_subjects_page(department_id=department_id or None))["rows"]
+
+    async def list_subjects_page(self, department_id: Optional[str] = None, semester: Optional[int] = None,
+                                 limit: Optional[int] = None, after: Optional[str] = None,
+                                 fields: Optional[List[str]] = None) -> dict:
+        filters = [("department_id = {0}", department_id), ("semester = {0}", semester)]
+        return await _list_page("subjects", Subject, filters, limit, after, fields)
 
     async def update_subject(self, subject_id: str, subject_name: str, subject_code: str, semester: int) -> bool:
         q = """
@@ -223,6 +656,7 @@ class Repo:
         """
         async with PostgresDB.pool.acquire() as conn:
             r = await conn.execute(q, subject_name, subject_code, semester, subject_id)
+        agent_response_cache.clear()
         return r.endswith("1")
 
     async def delete_subject(self, subject_id: str) -> bool:
@@ -230,16 +664,18 @@ class Repo:
             # delete assignment mappings first
             await conn.execute("DELETE FROM faculty_subjects WHERE subject_id=$1", subject_id)
             r = await conn.execute("DELETE FROM subjects WHERE id=$1", subject_id)
+        agent_response_cache.clear()
         return r.endswith("1")
 
     async def insert_faculty_subject(self, faculty_id: str, subject_id: str) -> str:
-        fs_id = "fs_" + str(int(time.time() * 1000))
+        fs_id = new_id("fs_")
         q = """
         INSERT INTO faculty_subjects (id, faculty_id, subject_id)
         VALUES ($1, $2, $3)
         """
         async with PostgresDB.pool.acquire() as conn:
             await conn.execute(q, fs_id, faculty_id, subject_id)
+        agent_response_cache.invalidate_directory()
         return fs_id
 
     async def get_faculty_subjects(self, faculty_id: str) -> List[Subject]:
@@ -250,12 +686,12 @@ class Repo:
         """
         async with PostgresDB.pool.acquire() as conn:
             rows = await conn.fetch(q, faculty_id)
-        return [Subject(**row_to_dict(r)) for r in rows]
+        return [hydrate(Subject, r) for r in rows]
 
     # -------------------- ATTENDANCE (SESSION BASED) -------------------- #
 
     async def insert_attendance_session(self, subject_id: str, faculty_id: str, session_number: int, total_classes: int, date: str) -> str:
-        s_id = "sess_" + str(int(time.time() * 1000))
+        s_id = new_id("sess_")
         # asyncpg needs a real datetime.date object, not a string
         parsed_date = date_type.fromisoformat(date) if isinstance(date, str) else date
         q = """
@@ -282,23 +718,77 @@ class Repo:
         return row["count"] if row else 0
 
     async def insert_attendance_records(self, session_id: str, student_ids: List[str], statuses: List[str]):
+        """Write a whole session's records with one INSERT ... SELECT unnest(...) statement."""
+        record_ids = new_ids("rec_", len(student_ids))
+        q = """
+        INSERT INTO attendance_records (id, session_id, student_id, status)
+        SELECT r.id, $1, r.student_id, r.status
+        FROM unnest($2::text[], $3::text[], $4::text[]) AS r(id, student_id, status)
+        """
         async with PostgresDB.pool.acquire() as conn:
-            data = [("rec_" + str(int(time.time()*10000) + i), session_id, student_ids[i], statuses[i]) for i in range(len(student_ids))]
-            await conn.executemany("""
-                INSERT INTO attendance_records (id, session_id, student_id, status)
-                VALUES ($1, $2, $3, $4)
-            """, data)
+            async with conn.transaction():
+                await conn.execute(q, session_id, record_ids, student_ids, statuses)
+                await apply_attendance_rollup(
+                    conn, session_id, student_ids,
+                    [1 if st == "present" else 0 for st in statuses],
+                    [1] * len(student_ids),
+                )
+                await mark_risk_dirty(conn, student_ids)
+        agent_response_cache.invalidate_students(student_ids)
 
-    async def update_attendance_records(self, session_id: str, student_ids: List[str], statuses: List[str]):
+    async def update_attendance_records(self, session_id: str, student_ids: List[str], statuses: List[str]) -> int:
+        """
+        Diff the session against the submitted class list and write only what changed:
+        flipped/new rows are upserted on (session_id, student_id), students no longer in
+        the class are removed. Runs in one transaction and returns the changed row count.
+        """
+        upsert_q = """
+        INSERT INTO attendance_records (id, session_id, student_id, status)
+        SELECT r.id, $1, r.student_id, r.status
+        FROM unnest($2::text[], $3::text[], $4::text[]) AS r(id, student_id, status)
+        ON CONFLICT (session_id, student_id) DO UPDATE SET status = EXCLUDED.status
+        """
         async with PostgresDB.pool.acquire() as conn:
-            # Delete old records
-            await conn.execute("DELETE FROM attendance_records WHERE session_id=$1", session_id)
-            # Insert new
-            data = [("rec_" + str(int(time.time()*10000) + i), session_id, student_ids[i], statuses[i]) for i in range(len(student_ids))]
-            await conn.executemany("""
-                INSERT INTO attendance_records (id, session_id, student_id, status)
-                VALUES ($1, $2, $3, $4)
-            """, data)
+            async with conn.transaction():
+                rows = await conn.fetch(
+                    "SELECT student_id, status FROM attendance_records WHERE session_id=$1 FOR UPDATE",
+                    session_id
+                )
+                current = {r["student_id"]: r["status"] for r in rows}
+                incoming = dict(zip(student_ids, statuses))
+
+                changed = [(sid, st) for sid, st in incoming.items() if current.get(sid) != st]
+                removed = [sid for sid in current if sid not in incoming]
+
+                if changed:
+                    await conn.execute(
+                        upsert_q, session_id,
+                        new_ids("rec_", len(changed)),
+                        [sid for sid, _ in changed],
+                        [st for _, st in changed],
+                    )
+                if removed:
+                    await conn.execute(
+                        "DELETE FROM attendance_records WHERE session_id=$1 AND student_id = ANY($2::text[])",
+                        session_id, removed
+                    )
+
+                # Rollup deltas: flips move one 'attended', new/removed rows also move 'sessions_held'
+                delta_ids, delta_att, delta_sess = [], [], []
+                for sid, st in changed:
+                    old_present = 1 if current.get(sid) == "present" else 0
+                    delta_ids.append(sid)
+                    delta_att.append((1 if st == "present" else 0) - old_present)
+                    delta_sess.append(0 if sid in current else 1)
+                for sid in removed:
+                    delta_ids.append(sid)
+                    delta_att.append(-1 if current[sid] == "present" else 0)
+                    delta_sess.append(-1)
+                if delta_ids:
+                    await apply_attendance_rollup(conn, session_id, delta_ids, delta_att, delta_sess)
+                    await mark_risk_dirty(conn, delta_ids)
+        agent_response_cache.invalidate_students(delta_ids)
+        return len(changed) + len(removed)
 
     async def get_attendance_records(self, session_id: str) -> List[dict]:
         async with PostgresDB.pool.acquire() as conn:
@@ -368,19 +858,6 @@ class Repo:
         LEFT JOIN users u ON s.user_id = u.id
         WHERE s.id = $1
         """
-        # Per-subject attendance summary
-        att_q = """
-        SELECT sub.id AS subject_id, sub.subject_name,
-               COUNT(ar.id) FILTER (WHERE ar.status='present') AS attended,
-               MAX(COALESCE(sess.total_classes, sess.total_sessions, 40)) AS total_sessions
-        FROM subjects sub
-        JOIN attendance_sessions sess ON sub.id = sess.subject_id
-        LEFT JOIN attendance_records ar ON ar.session_id = sess.id AND ar.student_id = $1
-        WHERE sub.department_id = (SELECT department_id FROM students WHERE id=$1)
-          AND sub.semester      = (SELECT semester      FROM students WHERE id=$1)
-        GROUP BY sub.id, sub.subject_name
-        ORDER BY sub.subject_name
-        """
         # Marks
         marks_q = """
         SELECT subject_id, internal_marks, external_marks
@@ -388,7 +865,7 @@ class Repo:
         """
         async with PostgresDB.pool.acquire() as conn:
             basic_row = await conn.fetchrow(basic_q, student_id)
-            att_rows  = await conn.fetch(att_q, student_id)
+            att_rows  = await conn.fetch(STUDENT_SUBJECT_ATTENDANCE_SQL, student_id)
             marks_rows = await conn.fetch(marks_q, student_id)
 
         if not basic_row:
@@ -398,7 +875,7 @@ class Repo:
         subjects = []
         for r in att_rows:
             d = row_to_dict(r)
-            total = d["total_sessions"] or 0
+            total = d["total"] or 0
             attended = d["attended"] or 0
             pct = round(attended / total * 100, 1) if total > 0 else 0
             m = marks_map.get(d["subject_id"], {})
@@ -427,13 +904,14 @@ class Repo:
     # -------------------- LEGACY ATTENDANCE -------------------- #
 
     async def insert_attendance(self, a: Attendance) -> Attendance:
-        a.id = a.id or "att_" + str(int(time.time() * 1000))
+        a.id = a.id or new_id("att_")
         q = """
         INSERT INTO attendance (id, student_id, subject_id, attendance_percentage)
         VALUES ($1, $2, $3, $4)
         """
         async with PostgresDB.pool.acquire() as conn:
             await conn.execute(q, a.id, a.student_id, a.subject_id, a.attendance_percentage)
+        agent_response_cache.invalidate_students([a.student_id])
         return a
 
     async def update_attendance(self, a: Attendance) -> bool:
@@ -443,6 +921,7 @@ class Repo:
         """
         async with PostgresDB.pool.acquire() as conn:
             r = await conn.execute(q, a.attendance_percentage, a.student_id, a.subject_id)
+        agent_response_cache.invalidate_students([a.student_id])
         return r.endswith("1")
 
     async def get_attendance(self, student_id: str, subject_id: Optional[str] = None) -> List[Attendance]:
@@ -456,18 +935,21 @@ class Repo:
                 rows = await conn.fetch(
                     "SELECT * FROM attendance WHERE student_id=$1", student_id
                 )
-        return [Attendance(**row_to_dict(r)) for r in rows]
+        return [hydrate(Attendance, r) for r in rows]
 
     # -------------------- MARKS -------------------- #
 
     async def insert_marks(self, m: Marks) -> Marks:
-        m.id = m.id or "mrk_" + str(int(time.time() * 1000))
+        m.id = m.id or new_id("mrk_")
         q = """
         INSERT INTO marks (id, student_id, subject_id, internal_marks, external_marks)
         VALUES ($1, $2, $3, $4, $5)
         """
         async with PostgresDB.pool.acquire() as conn:
-            await conn.execute(q, m.id, m.student_id, m.subject_id, m.internal_marks, m.external_marks)
+            async with conn.transaction():
+                await conn.execute(q, m.id, m.student_id, m.subject_id, m.internal_marks, m.external_marks)
+                await mark_risk_dirty(conn, [m.student_id])
+        agent_response_cache.invalidate_students([m.student_id])
         return m
 
     async def update_marks(self, m: Marks) -> bool:
@@ -476,7 +958,10 @@ class Repo:
         WHERE student_id=$3 AND subject_id=$4
         """
         async with PostgresDB.pool.acquire() as conn:
-            r = await conn.execute(q, m.internal_marks, m.external_marks, m.student_id, m.subject_id)
+            async with conn.transaction():
+                r = await conn.execute(q, m.internal_marks, m.external_marks, m.student_id, m.subject_id)
+                await mark_risk_dirty(conn, [m.student_id])
+        agent_response_cache.invalidate_students([m.student_id])
         return r.endswith("1")
 
     async def get_marks(self, student_id: str, subject_id: Optional[str] = None) -> List[Marks]:
@@ -490,18 +975,21 @@ class Repo:
                 rows = await conn.fetch(
                     "SELECT * FROM marks WHERE student_id=$1", student_id
                 )
-        return [Marks(**row_to_dict(r)) for r in rows]
+        return [hydrate(Marks, r) for r in rows]
 
     # -------------------- RESULTS -------------------- #
 
     async def insert_result(self, r: Result) -> Result:
-        r.id = r.id or "res_" + str(int(time.time() * 1000))
+        r.id = r.id or new_id("res_")
         q = """
         INSERT INTO results (id, student_id, sgpa, cgpa)
         VALUES ($1, $2, $3, $4)
         """
         async with PostgresDB.pool.acquire() as conn:
-            await conn.execute(q, r.id, r.student_id, r.sgpa, r.cgpa)
+            async with conn.transaction():
+                await conn.execute(q, r.id, r.student_id, r.sgpa, r.cgpa)
+                await mark_risk_dirty(conn, [r.student_id])
+        agent_response_cache.invalidate_students([r.student_id])
         return r
 
     async def update_result(self, r: Result) -> bool:
@@ -510,18 +998,30 @@ class Repo:
         WHERE student_id=$3
         """
         async with PostgresDB.pool.acquire() as conn:
-            status = await conn.execute(q, r.sgpa, r.cgpa, r.student_id)
+            async with conn.transaction():
+                status = await conn.execute(q, r.sgpa, r.cgpa, r.student_id)
+                await mark_risk_dirty(conn, [r.student_id])
+        agent_response_cache.invalidate_students([r.student_id])
         return status.endswith("1")
 
     async def get_result(self, student_id: str) -> Optional[Result]:
         async with PostgresDB.pool.acquire() as conn:
             row = await conn.fetchrow("SELECT * FROM results WHERE student_id=$1", student_id)
-        return Result(**row_to_dict(row)) if row else None
+        return hydrate(Result, row) if row else None
 
     async def list_results(self) -> List[Result]:
-        async with PostgresDB.pool.acquire() as conn:
-            rows = await conn.fetch("SELECT * FROM results")
-        return [Result(**row_to_dict(r)) for r in rows]
+        return (await self.list_results_page())["rows"]
+
+    async def list_results_page(self, department: Optional[str] = None, department_id: Optional[str] = None,
+                                semester: Optional[int] = None, limit: Optional[int] = None,
+                                after: Optional[str] = None, fields: Optional[List[str]] = None) -> dict:
+        """Results filtered by their student's current department (name or id) / semester."""
+        filters = [
+            ("student_id IN (SELECT id FROM students WHERE department = {0})", department),
+            ("student_id IN (SELECT id FROM students WHERE department_id = {0})", department_id),
+            ("student_id IN (SELECT id FROM students WHERE semester = {0})", semester),
+        ]
+        return await _list_page("results", Result, filters, limit, after, fields)
 
     # -------------------- USERS (auth via PG) -------------------- #
 
@@ -544,10 +1044,25 @@ class Repo:
             row = await conn.fetchrow("SELECT * FROM users WHERE id=$1", user_id)
         return row_to_dict(row) if row else None
 
+    async def get_principal(self, user_id: str) -> Optional[dict]:
+        """User row plus linked faculty/student ids and HOD department, in one round trip."""
+        q = """
+        SELECT u.id, u.name, u.email, u.role,
+               f.id AS faculty_id, st.id AS student_id, d.id AS hod_department_id
+        FROM users u
+        LEFT JOIN LATERAL (SELECT id FROM faculty WHERE user_id = u.id LIMIT 1) f ON TRUE
+        LEFT JOIN LATERAL (SELECT id FROM departments WHERE hod_faculty_id = f.id LIMIT 1) d ON TRUE
+        LEFT JOIN LATERAL (SELECT id FROM students WHERE user_id = u.id LIMIT 1) st ON TRUE
+        WHERE u.id = $1
+        """
+        async with PostgresDB.pool.acquire() as conn:
+            row = await conn.fetchrow(q, user_id)
+        return row_to_dict(row) if row else None
+
     # -------------------- STUDENT QUERIES -------------------- #
 
     async def insert_student_query(self, student_id: str, subject_id: str, message: str) -> str:
-        q_id = "q_" + str(int(time.time() * 1000))
+        q_id = new_id("q_")
         q = """
         INSERT INTO student_queries (id, student_id, subject_id, message)
         VALUES ($1, $2, $3, $4)
@@ -558,17 +1073,35 @@ class Repo:
 
     # -------------------- IA MARKS -------------------- #
 
-    async def upsert_ia_mark(self, mark_id: str, student_id: str, subject_id: str,
-                              faculty_id: str, marks_obtained: int, max_marks: int = 40):
-        """Insert or update a single IA mark. Uses ON CONFLICT on (student_id, subject_id)."""
+    async def get_students_class_membership(self, student_ids: List[str]) -> dict:
+        """student_id -> (department_id, semester) for every id that exists, in one query."""
+        q = "SELECT id, department_id, semester FROM students WHERE id = ANY($1::text[])"
+        async with PostgresDB.pool.acquire() as conn:
+            rows = await conn.fetch(q, student_ids)
+        return {r["id"]: (r["department_id"], r["semester"]) for r in rows}
+
+    async def upsert_ia_marks(self, subject_id: str, faculty_id: str, student_ids: List[str],
+                              marks: List[int], max_marks: int = 40) -> int:
+        """Upsert a whole subject's IA marks with one INSERT ... SELECT unnest(...) ON CONFLICT.
+
+        student_ids must be unique: one statement cannot update the same row twice.
+        """
+        mark_ids = new_ids("ia_", len(student_ids))
         q = """
         INSERT INTO ia_marks (id, student_id, subject_id, faculty_id, marks_obtained, max_marks, created_at)
-        VALUES ($1, $2, $3, $4, $5, $6, CURRENT_TIMESTAMP)
-        ON CONFLICT (student_id, subject_id)
-        DO UPDATE SET marks_obtained = $5, faculty_id = $4, max_marks = $6, created_at = CURRENT_TIMESTAMP
+        SELECT m.id, m.student_id, $1, $2, m.marks_obtained, $6, CURRENT_TIMESTAMP
+        FROM unnest($3::text[], $4::text[], $5::int[]) AS m(id, student_id, marks_obtained)
+        ON CONFLICT (student_id, subject_id) DO UPDATE SET
+            marks_obtained = EXCLUDED.marks_obtained,
+            faculty_id     = EXCLUDED.faculty_id,
+            max_marks      = EXCLUDED.max_marks,
+            created_at     = CURRENT_TIMESTAMP
         """
         async with PostgresDB.pool.acquire() as conn:
-            await conn.execute(q, mark_id, student_id, subject_id, faculty_id, marks_obtained, max_marks)
+            async with conn.transaction():
+                status = await conn.execute(q, subject_id, faculty_id, mark_ids, student_ids, marks, max_marks)
+        agent_response_cache.invalidate_students(student_ids)
+        return int(status.split()[-1])
 
     async def get_ia_marks_by_subject(self, subject_id: str) -> list:
         """Get all IA marks for a subject with student names."""
@@ -631,7 +1164,7 @@ class Repo:
         ORDER BY avg_marks DESC
         """
         q_overall = "SELECT AVG(marks_obtained) as overall_avg FROM ia_marks"
-        async with PostgresDB.pool.acquire() as conn:
+        async with PostgresDB.analytics_pool.acquire() as conn:
             rows = await conn.fetch(q)
             overall = await conn.fetchrow(q_overall)
         subjects = [row_to_dict(r) for r in rows]
@@ -651,21 +1184,9 @@ class Repo:
     # -------------------- ANALYTICS -------------------- #
 
     async def get_analytics_student(self, student_id: str) -> dict:
-        """Attendance % per subject computed from session records."""
-        q = """
-        SELECT
-            sub.subject_name,
-            COUNT(ar.id) FILTER (WHERE ar.status = 'present') AS attended,
-            MAX(COALESCE(sess.total_classes, sess.total_sessions, 40)) AS total
-        FROM subjects sub
-        JOIN attendance_sessions sess ON sub.id = sess.subject_id
-        LEFT JOIN attendance_records ar ON ar.session_id = sess.id AND ar.student_id = $1
-        WHERE sub.department_id = (SELECT department_id FROM students WHERE id = $1)
-          AND sub.semester     = (SELECT semester      FROM students WHERE id = $1)
-        GROUP BY sub.id, sub.subject_name
-        """
+        """Attendance % per subject, read from the attendance rollup."""
         async with PostgresDB.pool.acquire() as conn:
-            rows = await conn.fetch(q, student_id)
+            rows = await conn.fetch(STUDENT_SUBJECT_ATTENDANCE_SQL, student_id)
         subjects = []
         total_attended = 0
         total_classes  = 0
@@ -709,7 +1230,7 @@ class Repo:
         WHERE fs.faculty_id = $1 AND ar.student_id IS NOT NULL
         GROUP BY sub.subject_name, ar.student_id
         """
-        async with PostgresDB.pool.acquire() as conn:
+        async with PostgresDB.analytics_pool.acquire() as conn:
             rows2 = await conn.fetch(q2, faculty_id)
 
         subj_map: dict = {}
@@ -732,213 +1253,249 @@ class Repo:
         return {"subjects": subjects}
 
     async def get_analytics_hod(self, dept_id: str) -> dict:
-        """Dept-wide avg attendance, total low-performing students, top subjects by avg."""
-        q = """
-        SELECT
-            sub.subject_name,
-            ar.student_id,
-            COUNT(ar.id) FILTER (WHERE ar.status = 'present') AS attended,
-            MAX(COALESCE(sess.total_classes, sess.total_sessions, 40)) AS total
-        FROM subjects sub
-        JOIN attendance_sessions sess ON sess.subject_id = sub.id
-        LEFT JOIN attendance_records ar ON ar.session_id = sess.id
-        WHERE sub.department_id = $1 AND ar.student_id IS NOT NULL
-        GROUP BY sub.subject_name, ar.student_id
-        """
-        async with PostgresDB.pool.acquire() as conn:
-            rows = await conn.fetch(q, dept_id)
-
-        subj_map: dict = {}
-        total_sum = 0
-        total_cnt = 0
-        low_set: set = set()
-        for r in rows:
-            name = r["subject_name"]
-            t    = r["total"] or 0
-            att  = r["attended"] or 0
-            pct  = att / t * 100 if t > 0 else 0
-            if name not in subj_map:
-                subj_map[name] = {"avg_sum": 0, "count": 0}
-            subj_map[name]["avg_sum"] += pct
-            subj_map[name]["count"]   += 1
-            total_sum += pct
-            total_cnt += 1
-            if pct < 75:
-                low_set.add(r["student_id"])
-
-        dept_avg = round(total_sum / total_cnt, 1) if total_cnt > 0 else 0.0
-        top_subjects = sorted(
-            [{"subject": n, "avg_attendance": round(d["avg_sum"] / d["count"], 1)}
-             for n, d in subj_map.items() if d["count"] > 0],
-            key=lambda x: x["avg_attendance"], reverse=True
-        )[:5]
+        """Dept-wide avg attendance, total low-performing students, top subjects by avg (from the analytics views)."""
+        async with PostgresDB.analytics_pool.acquire() as conn:
+            dept = await conn.fetchrow(
+                "SELECT avg_attendance, low_performing_students, refreshed_at "
+                "FROM analytics_department_mv WHERE department_id = $1",
+                dept_id
+            )
+            subjects = await conn.fetch("""
+                SELECT subject_name, avg_attendance
+                FROM analytics_dept_subject_mv
+                WHERE department_id = $1
+                ORDER BY avg_attendance DESC
+                LIMIT 5
+            """, dept_id)
+            refreshed_at = dept["refreshed_at"] if dept else await conn.fetchval(
+                "SELECT refreshed_at FROM analytics_institution_mv"
+            )
         return {
-            "department_avg": dept_avg,
-            "low_performing_students": len(low_set),
-            "top_subjects": top_subjects,
+            "department_avg": float(dept["avg_attendance"]) if dept else 0.0,
+            "low_performing_students": dept["low_performing_students"] if dept else 0,
+            "top_subjects": [
+                {"subject": r["subject_name"], "avg_attendance": float(r["avg_attendance"])} for r in subjects
+            ],
+            **_freshness(refreshed_at),
         }
 
     async def get_analytics_admin(self) -> dict:
-        """System-wide: total students, total faculty, overall attendance avg."""
-        async with PostgresDB.pool.acquire() as conn:
-            total_students = (await conn.fetchrow("SELECT COUNT(*) FROM students"))["count"]
-            total_faculty  = (await conn.fetchrow("SELECT COUNT(*) FROM faculty"))["count"]
-            row = await conn.fetchrow("""
-                SELECT
-                    COUNT(ar.id) FILTER (WHERE ar.status = 'present') AS present,
-                    COUNT(ar.id) AS total
-                FROM attendance_records ar
-            """)
-        present = row["present"] or 0
-        total   = row["total"]   or 0
+        """System-wide: total students, total faculty, overall attendance avg (from the analytics views)."""
+        async with PostgresDB.analytics_pool.acquire() as conn:
+            total_students = await conn.fetchval("SELECT COUNT(*) FROM students")
+            total_faculty  = await conn.fetchval("SELECT COUNT(*) FROM faculty")
+            row = await conn.fetchrow("SELECT present, total, refreshed_at FROM analytics_institution_mv")
+        present = row["present"] if row else 0
+        total   = row["total"] if row else 0
         overall = round(present / total * 100, 1) if total > 0 else 0.0
         return {
             "total_students": total_students,
             "total_faculty":  total_faculty,
             "overall_attendance": overall,
+            **_freshness(row["refreshed_at"] if row else None),
         }
 
+    async def refresh_analytics_views(self) -> bool:
+        """REFRESH ... CONCURRENTLY every analytics view; False if another worker is already refreshing."""
+        async with PostgresDB.analytics_pool.acquire() as conn:
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", ANALYTICS_REFRESH_LOCK_KEY):
+                return False
+            try:
+                for view in ANALYTICS_VIEWS:
+                    await conn.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}")
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", ANALYTICS_REFRESH_LOCK_KEY)
+        return True
+
     # -------------------- ALERTS -------------------- #
 
-    async def get_attendance_alerts_student(self, student_id: str) -> List[dict]:
-        q = """
-        SELECT
-            sub.subject_name,
-            COUNT(ar.id) FILTER (WHERE ar.status = 'present') AS attended,
-            MAX(COALESCE(sess.total_classes, sess.total_sessions, 40)) AS total
-        FROM subjects sub
-        JOIN attendance_sessions sess ON sub.id = sess.subject_id
-        LEFT JOIN attendance_records ar ON ar.session_id = sess.id AND ar.student_id = $1
-        WHERE sub.department_id = (SELECT department_id FROM students WHERE id = $1)
-          AND sub.semester     = (SELECT semester      FROM students WHERE id = $1)
-        GROUP BY sub.id, sub.subject_name
+    async def get_attendance_alerts(self, student_id: Optional[str] = None, faculty_id: Optional[str] = None,
+                                    department_id: Optional[str] = None, limit: int = 100,
+                                    after: Optional[list] = None) -> dict:
         """
-        async with PostgresDB.pool.acquire() as conn:
-            rows = await conn.fetch(q, student_id)
-        alerts = []
+        One page of below-threshold (student, subject) pairs in the given scope, lowest
+        attendance first, plus severity counts for the whole scope.
+        `after` is the (pct, subject_id, student_id) key of the previous page's last row.
+        """
+        scope = (student_id, faculty_id, department_id, ALERT_WARNING_PCT)
+        after_pct, after_subject, after_student = after or (None, None, None)
+        if after_pct is not None:
+            after_pct = Decimal(after_pct)
+        async with PostgresDB.analytics_pool.acquire() as conn:
+            count_rows = await conn.fetch(ATTENDANCE_ALERT_COUNTS_SQL, *scope, ALERT_CRITICAL_PCT)
+            rows = []
+            if limit > 0:
+                rows = await conn.fetch(
+                    ATTENDANCE_ALERTS_SQL, *scope,
+                    after_pct, after_subject, after_student, limit + 1,
+                )
+        counts = {"critical": 0, "warning": 0}
+        counts.update({r["severity"]: r["count"] for r in count_rows})
+        rows = [row_to_dict(r) for r in rows]
+        next_after = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_after = [str(last["pct"]), last["subject_id"], last["student_id"]]
         for r in rows:
-            t   = r["total"] or 0
-            att = r["attended"] or 0
-            pct = att / t * 100 if t > 0 else 100.0
-            if pct < 75:
-                alerts.append({"type": "critical", "message": f"Attendance critically low ({pct:.1f}%) in {r['subject_name']}"})
-            elif pct < 85:
-                alerts.append({"type": "warning", "message": f"Attendance below 85% ({pct:.1f}%) in {r['subject_name']}"})
-        return alerts
+            r["severity"] = "critical" if r["pct"] < ALERT_CRITICAL_PCT else "warning"
+        return {"rows": rows, "counts": counts, "next_after": next_after}
+
+    # -------------------- NOTIFICATIONS -------------------- #
 
-    async def get_attendance_alerts_faculty(self, faculty_id: str) -> List[dict]:
+    async def insert_notification(self, sender_id: str, receiver_id: str, message: str, notif_type: str = "query") -> str:
+        """Insert and pg_notify in one transaction, so listeners hear about it once it commits."""
+        n_id = new_id("notif_")
         q = """
-        SELECT
-            sub.subject_name,
-            ar.student_id,
-            u.name AS student_name,
-            COUNT(ar.id) FILTER (WHERE ar.status = 'present') AS attended,
-            MAX(COALESCE(sess.total_classes, sess.total_sessions, 40)) AS total
-        FROM faculty_subjects fs
-        JOIN subjects sub ON sub.id = fs.subject_id
-        JOIN attendance_sessions sess ON sess.subject_id = sub.id
-        LEFT JOIN attendance_records ar ON ar.session_id = sess.id
-        LEFT JOIN students st ON st.id = ar.student_id
-        LEFT JOIN users u ON u.id = st.user_id
-        WHERE fs.faculty_id = $1 AND ar.student_id IS NOT NULL
-        GROUP BY sub.subject_name, ar.student_id, u.name
+        INSERT INTO notifications (id, sender_id, receiver_id, message, type)
+        VALUES ($1, $2, $3, $4, $5)
+        RETURNING created_at
         """
         async with PostgresDB.pool.acquire() as conn:
-            rows = await conn.fetch(q, faculty_id)
-        alerts = []
-        for r in rows:
-            t   = r["total"] or 0
-            att = r["attended"] or 0
-            pct = att / t * 100 if t > 0 else 100.0
-            name = r["student_name"] or r["student_id"]
-            if pct < 75:
-                alerts.append({"type": "critical", "message": f"{name} is critically low ({pct:.1f}%) in {r['subject_name']}"})
-            elif pct < 85:
-                alerts.append({"type": "warning",  "message": f"{name} is below 85% ({pct:.1f}%) in {r['subject_name']}"})
-        return alerts
+            async with conn.transaction():
+                created_at = await conn.fetchval(q, n_id, sender_id, receiver_id, message, notif_type)
+                payload = notification_payload({
+                    "id": n_id, "sender_id": sender_id, "receiver_id": receiver_id,
+                    "message": message, "type": notif_type, "created_at": created_at,
+                })
+                await conn.execute(INCREMENT_UNREAD_SQL, receiver_id)
+                await conn.execute("SELECT pg_notify($1, $2)", NOTIFY_CHANNEL, payload)
+        return n_id
 
-    async def get_attendance_alerts_hod(self, dept_id: str) -> List[dict]:
+    async def get_notifications_after(self, receiver_ids: List[str], after: Optional[tuple], limit: int) -> List[dict]:
+        """Catch-up for a push client: notifications after (created_at, id), oldest first."""
         q = """
-        SELECT
-            sub.subject_name,
-            ar.student_id,
-            u.name AS student_name,
-            COUNT(ar.id) FILTER (WHERE ar.status = 'present') AS attended,
-            MAX(COALESCE(sess.total_classes, sess.total_sessions, 40)) AS total
-        FROM subjects sub
-        JOIN attendance_sessions sess ON sess.subject_id = sub.id
-        LEFT JOIN attendance_records ar ON ar.session_id = sess.id
-        LEFT JOIN students st ON st.id = ar.student_id
-        LEFT JOIN users u ON u.id = st.user_id
-        WHERE sub.department_id = $1 AND ar.student_id IS NOT NULL
-        GROUP BY sub.subject_name, ar.student_id, u.name
+        SELECT id, sender_id, receiver_id, message, type, created_at
+        FROM notifications
+        WHERE receiver_id = ANY($1::text[])
+          AND ($2::timestamp IS NULL OR (created_at, id) > ($2::timestamp, $3::text))
+        ORDER BY created_at, id
+        LIMIT $4
         """
+        after_ts, after_id = after if after else (None, None)
         async with PostgresDB.pool.acquire() as conn:
-            rows = await conn.fetch(q, dept_id)
-        alerts = []
-        for r in rows:
-            t   = r["total"] or 0
-            att = r["attended"] or 0
-            pct = att / t * 100 if t > 0 else 100.0
-            name = r["student_name"] or r["student_id"]
-            if pct < 75:
-                alerts.append({"type": "critical", "message": f"{name} critically low ({pct:.1f}%) in {r['subject_name']}"})
-            elif pct < 85:
-                alerts.append({"type": "warning",  "message": f"{name} below 85% ({pct:.1f}%) in {r['subject_name']}"})
-        return alerts
+            rows = await conn.fetch(q, receiver_ids, after_ts, after_id, limit)
+        return [row_to_dict(r) for r in rows]
 
-    async def get_attendance_alerts_admin(self) -> List[dict]:
+    async def get_notifications(self, receiver_ids: List[str], limit: int = 50,
+                                after: Optional[tuple] = None) -> dict:
+        """
+        Newest-first page of the receivers' notifications, keyset on (created_at, id).
+        Returns rows and next_after, the sort key of the last row when there is another page.
+        """
         q = """
-        SELECT
-            sub.subject_name,
-            ar.student_id,
-            u.name AS student_name,
-            COUNT(ar.id) FILTER (WHERE ar.status = 'present') AS attended,
-            MAX(COALESCE(sess.total_classes, sess.total_sessions, 40)) AS total
-        FROM subjects sub
-        JOIN attendance_sessions sess ON sess.subject_id = sub.id
-        LEFT JOIN attendance_records ar ON ar.session_id = sess.id
-        LEFT JOIN students st ON st.id = ar.student_id
-        LEFT JOIN users u ON u.id = st.user_id
-        WHERE ar.student_id IS NOT NULL
-        GROUP BY sub.subject_name, ar.student_id, u.name
+        SELECT id, sender_id, receiver_id, message, type, read_status, created_at
+        FROM notifications
+        WHERE receiver_id = ANY($1::text[])
+          AND ($2::timestamp IS NULL OR (created_at, id) < ($2::timestamp, $3::text))
+        ORDER BY created_at DESC, id DESC
+        LIMIT $4
         """
+        after_ts, after_id = after if after else (None, None)
         async with PostgresDB.pool.acquire() as conn:
-            rows = await conn.fetch(q)
-        alerts = []
-        for r in rows:
-            t   = r["total"] or 0
-            att = r["attended"] or 0
-            pct = att / t * 100 if t > 0 else 100.0
-            name = r["student_name"] or r["student_id"]
-            if pct < 75:
-                alerts.append({"type": "critical", "message": f"{name} critically low ({pct:.1f}%) in {r['subject_name']}"})
-            elif pct < 85:
-                alerts.append({"type": "warning",  "message": f"{name} below 85% ({pct:.1f}%) in {r['subject_name']}"})
-        return alerts
+            rows = await conn.fetch(q, receiver_ids, after_ts, after_id, limit + 1)
+        rows = [row_to_dict(r) for r in rows]
+        next_after = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_after = (rows[-1]["created_at"], rows[-1]["id"])
+        return {"rows": rows, "next_after": next_after}
 
-    # -------------------- NOTIFICATIONS -------------------- #
+    async def get_unread_count(self, receiver_ids: List[str]) -> int:
+        q = "SELECT COALESCE(SUM(unread), 0) FROM notification_unread_counts WHERE receiver_id = ANY($1::text[])"
+        async with PostgresDB.pool.acquire() as conn:
+            return await conn.fetchval(q, receiver_ids)
 
-    async def insert_notification(self, sender_id: str, receiver_id: str, message: str, notif_type: str = "query") -> str:
-        n_id = "notif_" + str(int(time.time() * 1000))
-        q = """
-        INSERT INTO notifications (id, sender_id, receiver_id, message, type)
-        VALUES ($1, $2, $3, $4, $5)
+    async def mark_notifications_read(self, receiver_ids: List[str], ids: Optional[List[str]] = None) -> int:
+        """Mark the given (or, with ids=None, all) unread notifications of the receivers read; returns how many."""
+        async with PostgresDB.pool.acquire() as conn:
+            return await conn.fetchval(MARK_NOTIFICATIONS_READ_SQL, receiver_ids, ids)
+
+    async def _run_daily_job(self, job_name: str, lock_key: int, run_date: date_type,
+                             work, atomic: bool = True) -> Optional[int]:
+        """
+        Run work(conn) -> rows affected at most once per run_date across all workers, recorded in job_runs.
+        With atomic=True the work and its success record commit together; otherwise the work
+        manages its own transactions (e.g. batches). Returns None when another worker holds
+        the lock or the job already succeeded for run_date.
         """
         async with PostgresDB.pool.acquire() as conn:
-            await conn.execute(q, n_id, sender_id, receiver_id, message, notif_type)
-        return n_id
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", lock_key):
+                return None
+            try:
+                done = await conn.fetchval(
+                    "SELECT 1 FROM job_runs WHERE job_name = $1 AND run_date = $2 AND status = 'succeeded'",
+                    job_name, run_date
+                )
+                if done:
+                    return None
+                started_at = datetime.now()
+                started = time.perf_counter()
+                record = """
+                INSERT INTO job_runs (job_name, run_date, status, started_at, duration_ms, rows_affected, error)
+                VALUES ($1, $2, $3, $4, $5, $6, $7)
+                """
+                try:
+                    async with conn.transaction() if atomic else nullcontext():
+                        rows = await work(conn)
+                        await conn.execute(
+                            record, job_name, run_date, "succeeded", started_at,
+                            (time.perf_counter() - started) * 1000, rows, None
+                        )
+                except Exception as e:
+                    await conn.execute(
+                        record, job_name, run_date, "failed", started_at,
+                        (time.perf_counter() - started) * 1000, 0, str(e)
+                    )
+                    raise
+                return rows
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", lock_key)
+
+    async def send_planner_reminders(self, run_date: date_type) -> Optional[int]:
+        """
+        Today's planner reminders in one unnest INSERT with time-ordered ids, recorded
+        in job_runs. Returns how many were sent, or None when another worker holds
+        the lock or the job already succeeded for run_date.
+        """
+        async def work(conn) -> int:
+            due = [r["student_id"] for r in await conn.fetch(PLANNER_REMINDER_DUE_SQL, run_date)]
+            if not due:
+                return 0
+            return await conn.fetchval(
+                PLANNER_REMINDER_SQL, new_ids("notif_", len(due)), due, PLANNER_REMINDER_MESSAGE, NOTIFY_CHANNEL
+            )
 
-    async def get_notifications(self, receiver_id: str) -> List[dict]:
+        return await self._run_daily_job(PLANNER_REMINDER_JOB, PLANNER_REMINDER_LOCK_KEY, run_date, work)
+
+    async def archive_notifications(self, run_date: date_type, older_than: datetime, batch_size: int) -> Optional[int]:
+        """
+        Move notifications created before older_than into notifications_archive,
+        batch_size rows per statement (each its own short transaction). Returns how
+        many were moved, or None if the job already ran today / is running elsewhere.
+        """
+        async def work(conn) -> int:
+            moved = 0
+            while True:
+                n = await conn.fetchval(ARCHIVE_NOTIFICATIONS_SQL, older_than, batch_size)
+                moved += n
+                if n < batch_size:
+                    return moved
+
+        return await self._run_daily_job(
+            NOTIFICATION_RETENTION_JOB, NOTIFICATION_RETENTION_LOCK_KEY, run_date, work, atomic=False
+        )
+
+    async def get_job_runs(self, job_name: str, limit: int = 30) -> List[dict]:
         q = """
-        SELECT id, sender_id, receiver_id, message, type, created_at
-        FROM notifications
-        WHERE receiver_id = $1
-        ORDER BY created_at DESC
-        LIMIT 50
+        SELECT job_name, run_date, status, started_at, duration_ms, rows_affected, error
+        FROM job_runs
+        WHERE job_name = $1
+        ORDER BY started_at DESC
+        LIMIT $2
         """
         async with PostgresDB.pool.acquire() as conn:
-            rows = await conn.fetch(q, receiver_id)
+            rows = await conn.fetch(q, job_name, limit)
         return [row_to_dict(r) for r in rows]
 
     async def get_faculty_for_subject(self, subject_id: str) -> Optional[str]:
@@ -956,94 +1513,126 @@ class Repo:
     # -------------------- REPORT DATA -------------------- #
 
     async def get_all_students_report(self) -> List[dict]:
-        q = """
-        SELECT
-            s.id, s.usn, u.name, s.department, s.department_id, s.semester,
-            COALESCE(
-                (SELECT ROUND(
-                    COUNT(ar.id) FILTER (WHERE ar.status = 'present') * 100.0
-                    / NULLIF(MAX(COALESCE(sess.total_classes, sess.total_sessions, 40)), 0), 1)
-                 FROM attendance_sessions sess
-                 LEFT JOIN attendance_records ar ON ar.session_id = sess.id AND ar.student_id = s.id
-                 WHERE sess.subject_id IN (
-                     SELECT id FROM subjects WHERE department_id = s.department_id AND semester = s.semester
-                 )
-                ), 0
-            ) AS avg_attendance
-        FROM students s
-        LEFT JOIN users u ON u.id = s.user_id
-        ORDER BY s.department, s.semester, s.usn
         """
-        async with PostgresDB.pool.acquire() as conn:
-            rows = await conn.fetch(q)
+        Every student with their attendance %, aggregated in a single pass over
+        attendance_rollup (restricted to the student's current dept+semester subjects)
+        instead of a correlated subquery per student.
+        """
+        async with PostgresDB.analytics_pool.acquire() as conn:
+            rows = await conn.fetch(STUDENTS_REPORT_SQL)
         return [row_to_dict(r) for r in rows]
 
     async def get_all_faculty_report(self) -> List[dict]:
-        q = """
-        SELECT f.id, f.faculty_code, f.name, f.department, f.department_id, u.email
-        FROM faculty f
-        LEFT JOIN users u ON u.id = f.user_id
-        ORDER BY f.department, f.name
-        """
-        async with PostgresDB.pool.acquire() as conn:
-            rows = await conn.fetch(q)
+        async with PostgresDB.analytics_pool.acquire() as conn:
+            rows = await conn.fetch(FACULTY_REPORT_SQL)
         return [row_to_dict(r) for r in rows]
 
+    async def _iter_report(self, q: str, batch_size: int) -> AsyncIterator[List[dict]]:
+        """Yield report rows in batches from a server-side cursor; the connection is held until exhausted or closed."""
+        async with PostgresDB.analytics_pool.acquire() as conn:
+            async with conn.transaction():
+                cursor = await conn.cursor(q)
+                while True:
+                    rows = await cursor.fetch(batch_size)
+                    if not rows:
+                        break
+                    yield [row_to_dict(r) for r in rows]
+
+    def iter_all_students_report(self, batch_size: int = 1000) -> AsyncIterator[List[dict]]:
+        return self._iter_report(STUDENTS_REPORT_SQL, batch_size)
+
+    def iter_all_faculty_report(self, batch_size: int = 1000) -> AsyncIterator[List[dict]]:
+        return self._iter_report(FACULTY_REPORT_SQL, batch_size)
+
     # -------------------- AI PREDICTION (heuristic) -------------------- #
 
-    async def get_student_prediction_data(self, student_id: str) -> dict:
-        """Fetch raw data needed for heuristic risk scoring."""
-        # Attendance % across subjects
-        att_q = """
-        SELECT
-            COUNT(ar.id) FILTER (WHERE ar.status = 'present') AS attended,
-            MAX(COALESCE(sess.total_classes, sess.total_sessions, 40)) AS total
-        FROM subjects sub
-        JOIN attendance_sessions sess ON sub.id = sess.subject_id
-        LEFT JOIN attendance_records ar ON ar.session_id = sess.id AND ar.student_id = $1
-        WHERE sub.department_id = (SELECT department_id FROM students WHERE id = $1)
-          AND sub.semester     = (SELECT semester      FROM students WHERE id = $1)
-        GROUP BY sub.id
+    async def get_prediction_features(self, department_id: Optional[str] = None,
+                                      student_ids: Optional[List[str]] = None) -> List[dict]:
+        """Raw risk-scoring features for a department or a list of students, in one query."""
+        # Batch runs over a whole department belong on the analytics pool
+        pool = PostgresDB.pool if student_ids is not None else PostgresDB.analytics_pool
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(PREDICTION_FEATURES_SQL, department_id, student_ids)
+        return [row_to_dict(r) for r in rows]
+
+    # -------------------- RISK SNAPSHOT -------------------- #
+
+    @asynccontextmanager
+    async def risk_refresh_lock(self):
+        """Yields True if this worker holds the refresh lock, False if another worker does."""
+        async with PostgresDB.analytics_pool.acquire() as conn:
+            acquired = await conn.fetchval("SELECT pg_try_advisory_lock($1)", RISK_REFRESH_LOCK_KEY)
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    await conn.execute("SELECT pg_advisory_unlock($1)", RISK_REFRESH_LOCK_KEY)
+
+    async def claim_risk_dirty(self, limit: int) -> List[dict]:
+        """Oldest queued students, with the marked_at each was seen at."""
+        q = "SELECT student_id, marked_at FROM student_risk_dirty ORDER BY marked_at LIMIT $1"
+        async with PostgresDB.pool.acquire() as conn:
+            rows = await conn.fetch(q, limit)
+        return [row_to_dict(r) for r in rows]
+
+    async def save_risk_snapshot(self, predictions: List[dict], claimed: List[dict]) -> dict:
         """
-        # Marks
-        marks_q = "SELECT internal_marks, external_marks FROM marks WHERE student_id = $1"
-        # Result
-        result_q = "SELECT sgpa, cgpa FROM results WHERE student_id = $1"
-        # Session count for consistency
-        sess_q = """
-        SELECT COUNT(DISTINCT sess.id) AS sessions
-        FROM attendance_sessions sess
-        JOIN attendance_records ar ON ar.session_id = sess.id
-        WHERE ar.student_id = $1
+        Upsert scored students into student_risk_snapshot and clear the claimed queue
+        entries, unless a write re-marked them after they were claimed.
+        Returns student_id -> computed_at.
+        """
+        upsert_q = """
+        INSERT INTO student_risk_snapshot
+            (student_id, department_id, risk, predicted_score, recommendation, details, computed_at)
+        SELECT p.student_id, st.department_id, p.risk, p.predicted_score, p.recommendation,
+               p.details::jsonb, CURRENT_TIMESTAMP
+        FROM unnest($1::text[], $2::text[], $3::float8[], $4::text[], $5::text[])
+             AS p(student_id, risk, predicted_score, recommendation, details)
+        JOIN students st ON st.id = p.student_id
+        ON CONFLICT (student_id) DO UPDATE SET
+            department_id   = EXCLUDED.department_id,
+            risk            = EXCLUDED.risk,
+            predicted_score = EXCLUDED.predicted_score,
+            recommendation  = EXCLUDED.recommendation,
+            details         = EXCLUDED.details,
+            computed_at     = EXCLUDED.computed_at
+        RETURNING student_id, computed_at
+        """
+        clear_q = """
+        DELETE FROM student_risk_dirty d
+        USING unnest($1::text[], $2::timestamp[]) AS c(student_id, marked_at)
+        WHERE d.student_id = c.student_id AND d.marked_at <= c.marked_at
         """
         async with PostgresDB.pool.acquire() as conn:
-            att_rows   = await conn.fetch(att_q, student_id)
-            marks_rows = await conn.fetch(marks_q, student_id)
-            result_row = await conn.fetchrow(result_q, student_id)
-            sess_row   = await conn.fetchrow(sess_q, student_id)
-
-        # Attendance average
-        atts = []
-        for r in att_rows:
-            t = r["total"] or 0
-            a = r["attended"] or 0
-            if t > 0:
-                atts.append(a / t * 100)
-        avg_att = sum(atts) / len(atts) if atts else 0.0
-
-        # Marks average (internal on 50, external on 100 → normalise to %)
-        marks_pcts = []
-        for r in marks_rows:
-            total_marks = (r["internal_marks"] or 0) + (r["external_marks"] or 0)
-            marks_pcts.append(total_marks / 150 * 100)
-        avg_marks = sum(marks_pcts) / len(marks_pcts) if marks_pcts else 0.0
-
-        cgpa = float(result_row["cgpa"]) if result_row else 0.0
-        sessions = int(sess_row["sessions"]) if sess_row else 0
-
-        return {
-            "avg_attendance": round(avg_att, 1),
-            "avg_marks_pct":  round(avg_marks, 1),
-            "cgpa":           cgpa,
-            "sessions_attended": sessions,
-        }
+            async with conn.transaction():
+                rows = await conn.fetch(
+                    upsert_q,
+                    [p["student_id"] for p in predictions],
+                    [p["risk"] for p in predictions],
+                    [p["predicted_score"] for p in predictions],
+                    [p["recommendation"] for p in predictions],
+                    [json.dumps(p["details"]) for p in predictions],
+                )
+                if claimed:
+                    await conn.execute(
+                        clear_q,
+                        [c["student_id"] for c in claimed],
+                        [c["marked_at"] for c in claimed],
+                    )
+        return {r["student_id"]: r["computed_at"] for r in rows}
+
+    async def get_risk_snapshot(self, student_id: str) -> Optional[dict]:
+        """Snapshot row plus `stale`: true while a newer change is queued for the student."""
+        q = """
+        SELECT rs.risk, rs.predicted_score, rs.recommendation, rs.details, rs.computed_at,
+               EXISTS (SELECT 1 FROM student_risk_dirty d WHERE d.student_id = rs.student_id) AS stale
+        FROM student_risk_snapshot rs
+        WHERE rs.student_id = $1
+        """
+        async with PostgresDB.pool.acquire() as conn:
+            row = await conn.fetchrow(q, student_id)
+        if not row:
+            return None
+        d = row_to_dict(row)
+        d["details"] = json.loads(d["details"]) if d["details"] else {}
+        return d
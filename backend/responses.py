@@ -0,0 +1,33 @@
+# backend/responses.py
+# orjson-rendered responses for list endpoints. Returning the Response
+# directly skips FastAPI's response_model validation and jsonable_encoder
+# pass over every row; models built by Repo.hydrate are dumped as they are.
+
+from decimal import Decimal
+from typing import Optional
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+from pagination import NEXT_CURSOR_HEADER
+
+
+def _default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class ORJSONListResponse(ORJSONResponse):
+    """ORJSONResponse that also serializes Pydantic models and Decimals."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def list_response(items: list, next_cursor: Optional[str] = None, headers: Optional[dict] = None) -> ORJSONListResponse:
+    """One page of a list endpoint, with the next page's cursor in X-Next-Cursor."""
+    return ORJSONListResponse(items, headers={NEXT_CURSOR_HEADER: next_cursor or "", **(headers or {})})
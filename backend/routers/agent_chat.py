@@ -1,8 +1,12 @@
+import asyncio
 import os
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from routers.auth import get_current_user
-from agent.prompt_loader import get_prompt_by_role
+from agent.registry import agent_registry
+from constants import AGENT_MODEL
+from llm_gateway import run_llm
+from agent_cache import agent_response_cache
 from agent.tools import (
     add_student,
     fetch_student_data,
@@ -33,7 +37,7 @@ from agent.tools import (
 )
 from services.service import Service
 from repos.repo import Repo
-import uuid
+from id_gen import new_id
 
 router = APIRouter()
 
@@ -167,7 +171,7 @@ ALLOWED_TOOLS = {
     ]
 }
 
-from google.adk.agents import LlmAgent
+agent_registry.register_profile("chat", ALLOWED_TOOLS, name_template="{role}_chat_agent")
 
 @router.post("/chat")
 async def agent_chat(req: ChatRequest, current_user: dict = Depends(get_current_user())):
@@ -182,9 +186,6 @@ async def agent_chat(req: ChatRequest, current_user: dict = Depends(get_current_
     if "extract_faculty" in req.message.lower() and role != "admin":
         return {"status": "error", "message": "Tool access denied"}
 
-    # 2. Extract user role and load prompt
-    prompt = get_prompt_by_role(role)
-    
     # If the request specifically asks to "Add faculty from PDF"
     if "pdf" in req.message.lower() and role == "admin":
         # Execute ADMIN PDF AUTOMATION FLOW natively
@@ -193,11 +194,10 @@ async def agent_chat(req: ChatRequest, current_user: dict = Depends(get_current_
         repo = Repo()
         service = Service(repo)
         from models.data_models import Faculty
-        import time
         from backend.routers.mechanics import add_faculty # Wait, add_faculty is in mechanics router?!
         # Well, we can just use registry directly
         for entry in pdf_data:
-            fid = f"fac_{int(time.time()*1000)}_{uuid.uuid4().hex[:4]}"
+            fid = new_id("fac_")
             f = Faculty(
                 id=fid,
                 faculty_code=f"FAC-{entry['name'].upper()[:3]}",
@@ -216,16 +216,19 @@ async def agent_chat(req: ChatRequest, current_user: dict = Depends(get_current_
             "created": created_count
         }
 
-    # 3. Normal Agent execution 
+    # 2. Normal Agent execution on the shared role agent (prompt + ALLOWED_TOOLS, built at startup)
+    cached = await agent_response_cache.lookup(
+        "chat", role, current_user.get("id"), current_user.get("student_id"), req.message
+    )
+    if cached.response is not None:
+        return cached.response
     try:
-        from constants import AGENT_MODEL
-        agent = LlmAgent(
-            name=f"{role}_chat_agent",
-            model=AGENT_MODEL,
-            instruction=prompt,
-            tools=tools
-        )
-        response = agent.run(req.message)
-        return {"status": "success", "response": response}
+        agent = agent_registry.get("chat", role)
+        response = await run_llm(AGENT_MODEL, current_user.get("id"), lambda: asyncio.to_thread(agent.run, req.message))
+        result = {"status": "success", "response": response}
+        agent_response_cache.store(cached, result)
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         return {"status": "error", "message": str(e)}
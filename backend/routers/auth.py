@@ -1,6 +1,5 @@
 # backend/routers/auth.py
 
-import time
 from typing import Optional, Callable
 
 from fastapi import APIRouter, Depends, HTTPException, status
@@ -12,20 +11,69 @@ from auth_security import (
     create_refresh_token,
     decode_access_token,
     decode_refresh_token,
-    hash_password,
-    verify_password,
+    password_hasher,
+    PasswordHasherBusy,
 )
+from auth_cache import principal_cache
+from id_gen import new_id
 from services.service import Service
 from repos.repo import Repo
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
 repo = Repo()
 service = Service(repo)
 
 
+async def _hash_password(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+
+
+async def _verify_password(plain_password: str, hashed_password: str) -> bool:
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+
+
+async def _principal_for_token(token: str, role: Optional[str]) -> dict:
+    payload = decode_access_token(token)
+    if not payload or "user_id" not in payload:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token",
+        )
+
+    user = await service.resolve_principal(payload["user_id"])
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+        )
+
+    if role and user["role"] != role:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Access denied. Required role: {role}",
+        )
+
+    return user
+
+
 def get_current_user(role: Optional[str] = None) -> Callable:
     """
     Returns a FastAPI dependency that extracts and validates the JWT,
@@ -36,35 +84,29 @@ def get_current_user(role: Optional[str] = None) -> Callable:
     """
 
     async def _dependency(token: str = Depends(oauth2_scheme)) -> dict:
-        payload = decode_access_token(token)
-        if not payload or "user_id" not in payload:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid or expired token",
-            )
+        return await _principal_for_token(token, role)
 
-        user = await service.get_user_by_id(payload["user_id"])
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User not found",
-            )
+    return _dependency
 
-        # Dynamic HOD role override
-        if user["role"] == "faculty":
-            faculty = await repo.get_faculty_by_user_id(user["id"])
-            if faculty:
-                dept_as_hod = await repo.get_department_by_hod(faculty.id)
-                if dept_as_hod:
-                    user["role"] = "hod"
 
-        if role and user["role"] != role:
+def get_current_user_from_query(role: Optional[str] = None) -> Callable:
+    """
+    Like get_current_user, but also accepts the JWT as ?access_token=...
+    for clients that cannot set an Authorization header (browser EventSource).
+    """
+
+    async def _dependency(
+        token: Optional[str] = Depends(optional_oauth2_scheme),
+        access_token: Optional[str] = None,
+    ) -> dict:
+        token = token or access_token
+        if not token:
             raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail=f"Access denied. Required role: {role}",
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Not authenticated",
+                headers={"WWW-Authenticate": "Bearer"},
             )
-
-        return user
+        return await _principal_for_token(token, role)
 
     return _dependency
 
@@ -85,8 +127,8 @@ async def register_user(user_in: UserCreate):
             detail=f"Invalid role. Must be one of: {valid_roles}",
         )
 
-    user_id = "usr_" + str(int(time.time() * 1000))
-    pw_hash = hash_password(user_in.password)
+    user_id = new_id("usr_")
+    pw_hash = await _hash_password(user_in.password)
 
     user = await service.insert_user(
         user_id=user_id,
@@ -127,8 +169,8 @@ async def register_student_self(req: StudentRegister):
         )
     
     # STEP 3: Create user
-    user_id = "usr_" + str(int(time.time() * 1000))
-    pw_hash = hash_password(req.password)
+    user_id = new_id("usr_")
+    pw_hash = await _hash_password(req.password)
     
     # We strictly set role to student and name to USN for tracing
     user = await service.insert_user(
@@ -177,8 +219,8 @@ async def register_faculty_self(req: FacultyRegister):
         return {"status": "error", "message": "Email already registered"}
 
     # STEP 3: Create user
-    user_id = "usr_" + str(int(time.time() * 1000))
-    pw_hash = hash_password(req.password)
+    user_id = new_id("usr_")
+    pw_hash = await _hash_password(req.password)
     
     user = await service.insert_user(
         user_id=user_id,
@@ -206,19 +248,16 @@ async def register_faculty_self(req: FacultyRegister):
 @router.post("/login", response_model=Token)
 async def login(user_in: UserLogin):
     user = await service.get_user_by_email(user_in.email)
-    if not user or not verify_password(user_in.password, user["password_hash"]):
+    if not user or not await _verify_password(user_in.password, user["password_hash"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
         )
 
-    # Dynamic HOD role override on login
-    if user["role"] == "faculty":
-        faculty = await repo.get_faculty_by_user_id(user["id"])
-        if faculty:
-            dept_as_hod = await repo.get_department_by_hod(faculty.id)
-            if dept_as_hod:
-                user["role"] = "hod"
+    # Dynamic HOD role override on login (also warms the principal cache)
+    principal = await service.resolve_principal(user["id"])
+    if principal:
+        user["role"] = principal["role"]
 
     token_data = {"user_id": user["id"], "role": user["role"]}
     access_token = create_access_token(token_data)
@@ -241,21 +280,13 @@ async def refresh_token(req: RefreshRequest):
             detail="Invalid or expired refresh token",
         )
 
-    user = await service.get_user_by_id(payload["user_id"])
+    user = await service.resolve_principal(payload["user_id"])
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
         )
 
-    # Dynamic HOD role override on refresh
-    if user["role"] == "faculty":
-        faculty = await repo.get_faculty_by_user_id(user["id"])
-        if faculty:
-            dept_as_hod = await repo.get_department_by_hod(faculty.id)
-            if dept_as_hod:
-                user["role"] = "hod"
-
     new_access_token = create_access_token({"user_id": user["id"], "role": user["role"]})
     return RefreshResponse(access_token=new_access_token)
 
@@ -268,3 +299,15 @@ async def get_me(current_user: dict = Depends(get_current_user())):
         name=current_user["name"],
         role=current_user["role"],
     )
+
+
+@router.get("/principal-cache/stats")
+async def principal_cache_stats(current_user: dict = Depends(get_current_user(role="admin"))):
+    """Admin: hit/miss counters of this worker's principal cache."""
+    return principal_cache.stats()
+
+
+@router.get("/password-hasher/stats")
+async def password_hasher_stats(current_user: dict = Depends(get_current_user(role="admin"))):
+    """Admin: queue depth and rejection counters of this worker's password executor."""
+    return password_hasher.stats()
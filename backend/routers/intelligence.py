@@ -1,17 +1,26 @@
 # backend/routers/intelligence.py
 # Intelligence layer: analytics, alerts, notifications, reports, AI prediction
 
+import asyncio
+import csv
 import io
+import json
+import os
 import time
-from typing import Optional
+from typing import AsyncIterator, List, Optional
 
-import pandas as pd
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel
+from starlette.background import BackgroundTask
 
 from repos.repo import Repo
-from services.service import Service
-from routers.auth import get_current_user
+from services.service import Service, ALERTS_PAGE_SIZE, NOTIFICATION_CATCHUP_LIMIT, NOTIFICATIONS_PAGE_SIZE
+from services.report_export import excel_export_jobs
+from routers.auth import get_current_user, get_current_user_from_query
+from pagination import encode_cursor
+from notification_hub import notification_hub
+from responses import list_response
 
 router = APIRouter()
 repo   = Repo()
@@ -89,72 +98,234 @@ async def analytics_admin(
 # ALERTS  (role-routed, single endpoint)
 # ============================================================
 
+async def _alert_scope(user: dict):
+    """(role, scope id) the alert query runs with for the current user."""
+    role = user["role"]
+    if role == "student":
+        return role, await _resolve_student_id(user)
+    if role == "hod":
+        return role, await _resolve_hod_dept(user)
+    if role == "faculty":
+        return role, (await _resolve_faculty(user)).id
+    if role == "admin":
+        return role, None
+    raise HTTPException(status_code=403, detail="Access denied")
+
+
 @router.get("/alerts")
 async def get_alerts(
+    limit: int = Query(ALERTS_PAGE_SIZE, ge=1, le=500),
+    cursor: Optional[str] = None,
     current_user: dict = Depends(get_current_user()),
 ):
     """
-    Role-based alert endpoint.
+    Role-based alert endpoint, lowest attendance first, keyset-paginated.
     - student  → own low-attendance subjects
     - faculty  → students below threshold in assigned subjects
     - hod      → students below threshold across entire department
     - admin    → system-wide coverage
+    Body is one page of alerts; X-Next-Cursor carries the cursor for the next
+    page and X-Alerts-Critical / X-Alerts-Warning the totals for the scope.
     """
-    role = current_user["role"]
-
-    if role == "student":
-        student_id = await _resolve_student_id(current_user)
-        return await service.get_alerts_student(student_id)
-
-    if role in ("faculty", "hod"):
-        faculty = await _resolve_faculty(current_user)
-        if role == "hod":
-            dept_id = await _resolve_hod_dept(current_user)
-            return await service.get_alerts_hod(dept_id)
-        return await service.get_alerts_faculty(faculty.id)
+    role, scope_id = await _alert_scope(current_user)
+    page = await service.get_alerts(role, scope_id, limit=limit, cursor=cursor)
+    return list_response(page["alerts"], page["next_cursor"], headers={
+        "X-Alerts-Critical": str(page["counts"]["critical"]),
+        "X-Alerts-Warning": str(page["counts"]["warning"]),
+    })
 
-    if role == "admin":
-        return await service.get_alerts_admin()
 
-    return []
+@router.get("/alerts/summary")
+async def get_alerts_summary(
+    current_user: dict = Depends(get_current_user()),
+):
+    """Severity totals for the caller's alert scope, without fetching any alert rows."""
+    role, scope_id = await _alert_scope(current_user)
+    counts = (await service.get_alerts(role, scope_id, limit=0))["counts"]
+    return {**counts, "total": counts["critical"] + counts["warning"]}
 
 
 # ============================================================
 # NOTIFICATIONS
 # ============================================================
 
+UNREAD_COUNT_HEADER = "X-Unread-Count"
+
+
+class MarkReadRequest(BaseModel):
+    ids: Optional[List[str]] = None  # None marks every unread notification read
+
+
+def _notification_receivers(user: dict) -> list:
+    """A user's own id, plus their student id (planner reminders are addressed to the student record)."""
+    receiver_ids = [user["id"]]
+    if user.get("student_id"):
+        receiver_ids.append(user["student_id"])
+    return receiver_ids
+
+
 @router.get("/notifications")
 async def get_notifications(
+    limit: int = Query(NOTIFICATIONS_PAGE_SIZE, ge=1, le=200),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user()),
+):
+    """
+    The current user's notifications, newest first, keyset-paginated on (created_at, id).
+    X-Next-Cursor carries the cursor for the next page and X-Unread-Count the unread total.
+    """
+    page = await service.get_notifications(_notification_receivers(current_user), limit, cursor)
+    return list_response(page["notifications"], page["next_cursor"],
+                         headers={UNREAD_COUNT_HEADER: str(page["unread"])})
+
+
+@router.get("/notifications/unread-count")
+async def get_unread_count(
+    current_user: dict = Depends(get_current_user()),
+):
+    """Unread total for the badge, read from the maintained counter (no scan)."""
+    return {"unread": await service.get_unread_count(_notification_receivers(current_user))}
+
+
+@router.post("/notifications/read")
+async def mark_notifications_read(
+    payload: MarkReadRequest,
     current_user: dict = Depends(get_current_user()),
 ):
-    """Fetch all notifications addressed to the current user."""
-    return await service.get_notifications(current_user["id"])
+    """Mark the given notifications (or all, when ids is omitted) read; only the caller's own are touched."""
+    receiver_ids = _notification_receivers(current_user)
+    marked = await service.mark_notifications_read(receiver_ids, payload.ids)
+    return {"marked": marked, "unread": await service.get_unread_count(receiver_ids)}
+
+
+NOTIFICATION_STREAM_HEARTBEAT_SECONDS = float(os.getenv("NOTIFICATION_STREAM_HEARTBEAT_SECONDS", 15))
+
+
+def _notification_event(event: dict) -> str:
+    """One SSE frame; its id is the catch-up cursor the browser sends back as Last-Event-ID."""
+    created_at = event["created_at"]
+    if not isinstance(created_at, str):
+        created_at = created_at.isoformat()
+    event = {**event, "created_at": created_at}
+    cursor = encode_cursor([created_at, event["id"]])
+    return f"id: {cursor}\nevent: notification\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+async def _notification_stream(request: Request, receiver_ids: list, after: Optional[tuple]) -> AsyncIterator[str]:
+    # Subscribe before catching up so nothing committed in between is missed;
+    # live events the catch-up already sent are skipped by id
+    sub = notification_hub.subscribe(*receiver_ids)
+    try:
+        yield "retry: 3000\n\n"
+        caught_up = set()
+        while after is not None:
+            rows = await service.get_notifications_after(receiver_ids, after)
+            for row in rows:
+                caught_up.add(row["id"])
+                yield _notification_event(row)
+            if len(rows) < NOTIFICATION_CATCHUP_LIMIT:
+                break
+            after = (rows[-1]["created_at"], rows[-1]["id"])
+
+        while True:
+            try:
+                event = await asyncio.wait_for(sub.queue.get(), NOTIFICATION_STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if sub.lagged or await request.is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                return  # listener reconnected: the client reconnects and catches up
+            if event["id"] not in caught_up:
+                yield _notification_event(event)
+            if sub.lagged and sub.queue.empty():
+                return  # fell behind: end the stream so the client catches up from its last id
+    finally:
+        notification_hub.unsubscribe(sub)
+
+
+@router.get("/notifications/stream")
+async def stream_notifications(
+    request: Request,
+    after: Optional[str] = Query(None, description="Cursor of the last event seen (instead of Last-Event-ID)"),
+    current_user: dict = Depends(get_current_user_from_query()),
+):
+    """
+    Server-Sent Events stream of the current user's new notifications (including
+    planner reminders addressed to their student record). On reconnect the
+    browser sends Last-Event-ID and the stream first replays what was missed.
+    Accepts the token as ?access_token=... since EventSource cannot set headers.
+    """
+    receiver_ids = _notification_receivers(current_user)
+    cursor = service.decode_notification_cursor(request.headers.get("Last-Event-ID") or after)
+    return StreamingResponse(
+        _notification_stream(request, receiver_ids, cursor),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # ============================================================
 # REPORTS  (CSV + Excel) — admin only
 # ============================================================
 
-def _df_to_csv_response(df: pd.DataFrame, filename: str) -> StreamingResponse:
+STUDENT_REPORT_COLUMNS = ["id", "usn", "name", "department", "department_id", "semester", "avg_attendance"]
+STUDENT_REPORT_HEADER  = ["id", "usn", "name", "department", "department_id", "semester", "avg_attendance_%"]
+FACULTY_REPORT_COLUMNS = ["id", "faculty_code", "name", "department", "department_id", "email"]
+REPORT_BATCH_SIZE = 1000
+
+
+async def _csv_chunks(header: list, columns: list, batches) -> AsyncIterator[str]:
+    """Encode each cursor batch to CSV as it arrives, so memory stays at one batch."""
     buf = io.StringIO()
-    df.to_csv(buf, index=False)
-    buf.seek(0)
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(header)
+    yield buf.getvalue()
+    async for batch in batches:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows([row.get(c) for c in columns] for row in batch)
+        yield buf.getvalue()
+
+
+def _stream_csv_response(header: list, columns: list, batches, filename: str) -> StreamingResponse:
     return StreamingResponse(
-        iter([buf.getvalue()]),
+        _csv_chunks(header, columns, batches),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
 
 
-def _df_to_excel_response(df: pd.DataFrame, filename: str) -> StreamingResponse:
-    buf = io.BytesIO()
-    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Report")
-    buf.seek(0)
-    return StreamingResponse(
-        iter([buf.read()]),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={filename}"},
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def _excel_report_source(kind: str):
+    """(header, columns, batches factory, filename) for a report kind."""
+    if kind == "students":
+        return (STUDENT_REPORT_HEADER, STUDENT_REPORT_COLUMNS,
+                lambda: service.iter_all_students_report(REPORT_BATCH_SIZE), "students_report.xlsx")
+    if kind == "faculty":
+        return (FACULTY_REPORT_COLUMNS, FACULTY_REPORT_COLUMNS,
+                lambda: service.iter_all_faculty_report(REPORT_BATCH_SIZE), "faculty_report.xlsx")
+    raise HTTPException(status_code=404, detail="Unknown report")
+
+
+async def _excel_response(kind: str) -> FileResponse:
+    """Write the report to a temp file through a write-only workbook, then send it from disk."""
+    header, columns, batches, filename = _excel_report_source(kind)
+    path = excel_export_jobs.temp_path()
+    try:
+        await excel_export_jobs.export_now(path, header, columns, batches())
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return FileResponse(
+        path,
+        media_type=XLSX_MEDIA_TYPE,
+        filename=filename,
+        background=BackgroundTask(os.remove, path),
     )
 
 
@@ -162,11 +333,11 @@ def _df_to_excel_response(df: pd.DataFrame, filename: str) -> StreamingResponse:
 async def report_students_csv(
     current_user: dict = Depends(get_current_user(role="admin")),
 ):
-    """Admin: download student report as CSV."""
-    rows = await service.get_all_students_report()
-    df = pd.DataFrame(rows, columns=["id", "usn", "name", "department", "department_id", "semester", "avg_attendance"])
-    df.rename(columns={"avg_attendance": "avg_attendance_%"}, inplace=True)
-    return _df_to_csv_response(df, "students_report.csv")
+    """Admin: download student report as CSV (streamed from a server-side cursor)."""
+    return _stream_csv_response(
+        STUDENT_REPORT_HEADER, STUDENT_REPORT_COLUMNS,
+        service.iter_all_students_report(REPORT_BATCH_SIZE), "students_report.csv",
+    )
 
 
 @router.get("/reports/students/excel")
@@ -174,20 +345,18 @@ async def report_students_excel(
     current_user: dict = Depends(get_current_user(role="admin")),
 ):
     """Admin: download student report as Excel."""
-    rows = await service.get_all_students_report()
-    df = pd.DataFrame(rows, columns=["id", "usn", "name", "department", "department_id", "semester", "avg_attendance"])
-    df.rename(columns={"avg_attendance": "avg_attendance_%"}, inplace=True)
-    return _df_to_excel_response(df, "students_report.xlsx")
+    return await _excel_response("students")
 
 
 @router.get("/reports/faculty")
 async def report_faculty_csv(
     current_user: dict = Depends(get_current_user(role="admin")),
 ):
-    """Admin: download faculty report as CSV."""
-    rows = await service.get_all_faculty_report()
-    df = pd.DataFrame(rows, columns=["id", "faculty_code", "name", "department", "department_id", "email"])
-    return _df_to_csv_response(df, "faculty_report.csv")
+    """Admin: download faculty report as CSV (streamed from a server-side cursor)."""
+    return _stream_csv_response(
+        FACULTY_REPORT_COLUMNS, FACULTY_REPORT_COLUMNS,
+        service.iter_all_faculty_report(REPORT_BATCH_SIZE), "faculty_report.csv",
+    )
 
 
 @router.get("/reports/faculty/excel")
@@ -195,9 +364,45 @@ async def report_faculty_excel(
     current_user: dict = Depends(get_current_user(role="admin")),
 ):
     """Admin: download faculty report as Excel."""
-    rows = await service.get_all_faculty_report()
-    df = pd.DataFrame(rows, columns=["id", "faculty_code", "name", "department", "department_id", "email"])
-    return _df_to_excel_response(df, "faculty_report.xlsx")
+    return await _excel_response("faculty")
+
+
+@router.post("/reports/{kind}/excel/jobs", status_code=202)
+async def start_excel_report_job(
+    kind: str,
+    current_user: dict = Depends(get_current_user(role="admin")),
+):
+    """Admin: build an Excel report in the background; poll /reports/jobs/{job_id}."""
+    header, columns, batches, _ = _excel_report_source(kind)
+    job_id = excel_export_jobs.start(header, columns, batches)
+    return {"job_id": job_id, "status": "running"}
+
+
+@router.get("/reports/jobs/{job_id}")
+async def excel_report_job_status(
+    job_id: str,
+    current_user: dict = Depends(get_current_user(role="admin")),
+):
+    """Admin: status of a background Excel export (running / ready / failed)."""
+    job_status = excel_export_jobs.status(job_id)
+    if not job_status:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return {"job_id": job_id, "status": job_status, "error": excel_export_jobs.error(job_id)}
+
+
+@router.get("/reports/jobs/{job_id}/download")
+async def download_excel_report_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user(role="admin")),
+):
+    """Admin: download a finished background Excel export."""
+    if excel_export_jobs.status(job_id) != "ready":
+        raise HTTPException(status_code=404, detail="Export not ready")
+    return FileResponse(
+        excel_export_jobs.result_path(job_id),
+        media_type=XLSX_MEDIA_TYPE,
+        filename=f"report_{job_id}.xlsx",
+    )
 
 
 # ============================================================
@@ -210,7 +415,9 @@ async def predict_student(
     current_user: dict = Depends(get_current_user()),
 ):
     """
-    Heuristic risk prediction for a student.
+    Heuristic risk prediction for a student, served from the risk snapshot.
+    `computed_at` says when it was scored; `stale` is true while a newer
+    attendance/marks/results change is waiting for the next refresh.
     - student  → can only view own prediction
     - faculty/hod/admin → can view any student
     """
@@ -228,3 +435,26 @@ async def predict_student(
         raise HTTPException(status_code=404, detail="Student not found")
 
     return await service.predict_student_risk(student_id)
+
+
+@router.get("/predict/department/{department_id}")
+async def predict_department(
+    department_id: str,
+    current_user: dict = Depends(get_current_user()),
+):
+    """
+    Batch risk prediction for every student in a department, riskiest first.
+    - hod   → own department only
+    - admin → any department
+    """
+    role = current_user["role"]
+    if role == "hod":
+        if await _resolve_hod_dept(current_user) != department_id:
+            raise HTTPException(status_code=403, detail="Access denied")
+    elif role != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    if not await repo.get_department(department_id):
+        raise HTTPException(status_code=404, detail="Department not found")
+
+    return await service.predict_department_risk(department_id)
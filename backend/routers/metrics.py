@@ -0,0 +1,64 @@
+# backend/routers/metrics.py
+# Per-worker runtime metrics for operators — admin only
+
+from fastapi import APIRouter, Depends
+
+from agent.registry import agent_registry
+from agent_cache import agent_response_cache
+from db import PostgresDB
+from llm_gateway import llm_gateway
+from notification_hub import notification_hub
+from repos.repo import Repo
+from routers.auth import get_current_user
+
+router = APIRouter()
+
+
+@router.get("/db")
+async def db_metrics(
+    current_user: dict = Depends(get_current_user(role="admin")),
+):
+    """Admin: pool sizes, in-use/idle connections, acquire wait histogram and timeouts."""
+    return PostgresDB.stats()
+
+
+@router.get("/agents")
+async def agent_metrics(
+    current_user: dict = Depends(get_current_user(role="admin")),
+):
+    """Admin: which (profile, role) agents are built and how long the startup build took."""
+    return agent_registry.stats()
+
+
+@router.get("/llm")
+async def llm_metrics(
+    current_user: dict = Depends(get_current_user(role="admin")),
+):
+    """Admin: per-model LLM gateway state — active calls, queue depth, wait time, call latency."""
+    return llm_gateway.stats()
+
+
+@router.get("/agent-cache")
+async def agent_cache_metrics(
+    current_user: dict = Depends(get_current_user(role="admin")),
+):
+    """Admin: agent response cache size, hit ratio (exact and semantic) and invalidations."""
+    return agent_response_cache.stats()
+
+
+@router.get("/notifications")
+async def notification_metrics(
+    current_user: dict = Depends(get_current_user(role="admin")),
+):
+    """Admin: this worker's LISTEN connection, connected push clients and events delivered/dropped."""
+    return notification_hub.stats()
+
+
+@router.get("/jobs/{job_name}")
+async def job_metrics(
+    job_name: str,
+    limit: int = 30,
+    current_user: dict = Depends(get_current_user(role="admin")),
+):
+    """Admin: recent runs of a scheduled job (e.g. planner_reminders) — status, duration, rows affected."""
+    return await Repo().get_job_runs(job_name, min(max(limit, 1), 365))
@@ -1,18 +1,24 @@
+import asyncio
 import json
 import os
 import io
 from PyPDF2 import PdfReader
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query
 from pydantic import BaseModel
 import google.generativeai as genai
 from db import PostgresDB
 from routers.auth import get_current_user
+from llm_gateway import run_llm
+from repos.repo import Repo
+from services.service import Service
 from typing import Optional, List
 
 router = APIRouter(prefix="/api/student", tags=["Student Planner"])
+notification_service = Service(Repo())
 
 # Setup Gemini Direct API — reuse the same key as the rest of the system
 genai.configure(api_key=os.environ.get("GOOGLE_API_KEY", ""))
+PLANNER_MODEL = "gemini-2.5-flash"
 
 class PlanRequest(BaseModel):
     student_id: str
@@ -45,6 +51,11 @@ async def upload_resume(file: UploadFile = File(...)):
 
 from duckduckgo_search import DDGS
 
+# Resource lookups for the days of a plan run concurrently, a few at a time,
+# each off the event loop and cut off after SCRAPE_TIMEOUT seconds
+SCRAPE_CONCURRENCY = int(os.getenv("PLANNER_SCRAPE_CONCURRENCY", 4))
+SCRAPE_TIMEOUT = float(os.getenv("PLANNER_SCRAPE_TIMEOUT", 8))
+
 def scrape_resources(query: str, max_results: int = 3) -> list:
     """Search DuckDuckGo using duckduckgo_search API for learning resources."""
     try:
@@ -65,10 +76,28 @@ def scrape_resources(query: str, max_results: int = 3) -> list:
         return []
 
 
+async def scrape_plan_resources(week_plan: list) -> None:
+    """Attach "resources" to every day of the plan; a slow or failed lookup just yields []."""
+    semaphore = asyncio.Semaphore(SCRAPE_CONCURRENCY)
+
+    async def scrape_day(day_plan: dict) -> None:
+        query = day_plan.get("search_query") or day_plan.get("goal", "")
+        async with semaphore:
+            try:
+                day_plan["resources"] = await asyncio.wait_for(
+                    asyncio.to_thread(scrape_resources, query), SCRAPE_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                print(f"Scrape timed out for '{query}'")
+                day_plan["resources"] = []
+
+    await asyncio.gather(*(scrape_day(day_plan) for day_plan in week_plan))
+
+
 @router.post("/generate-plan")
 async def generate_plan(req: PlanRequest, current_user: dict = Depends(get_current_user())):
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash")
+        model = genai.GenerativeModel(PLANNER_MODEL)
         prompt = f"""
         Analyze this student's resume and generate a structured 7-day learning plan.
         Include:
@@ -93,7 +122,9 @@ async def generate_plan(req: PlanRequest, current_user: dict = Depends(get_curre
           ]
         }}
         """
-        response = model.generate_content(prompt)
+        response = await run_llm(
+            PLANNER_MODEL, current_user["id"], lambda: model.generate_content_async(prompt)
+        )
         text_resp = response.text.strip()
 
         # Clean JSON if wrapped in markdown
@@ -108,28 +139,37 @@ async def generate_plan(req: PlanRequest, current_user: dict = Depends(get_curre
         plan_data = json.loads(text_resp)
 
         # Scrape real resource links for each day using the search_query
-        for day_plan in plan_data.get("week_plan", []):
-            query = day_plan.get("search_query") or day_plan.get("goal", "")
-            resources = scrape_resources(query)
-            day_plan["resources"] = resources
+        await scrape_plan_resources(plan_data.get("week_plan", []))
+
+        days, tasks = [], []
+        for daily_plan in plan_data.get("week_plan", []):
+            for task in daily_plan.get("tasks", []):
+                days.append(daily_plan.get("day"))
+                tasks.append(task)
 
         async with PostgresDB.pool.acquire() as conn:
-            existing = await conn.fetchval("SELECT id FROM student_plans WHERE student_id = $1", req.student_id)
-            if existing:
-                await conn.execute("UPDATE student_plans SET plan_json = $1 WHERE student_id = $2", json.dumps(plan_data), req.student_id)
-                await conn.execute("DELETE FROM student_progress WHERE student_id = $1", req.student_id)
-            else:
-                await conn.execute("INSERT INTO student_plans (student_id, plan_json) VALUES ($1, $2)", req.student_id, json.dumps(plan_data))
-
-            for daily_plan in plan_data.get("week_plan", []):
-                day = daily_plan.get("day")
-                for task in daily_plan.get("tasks", []):
-                    await conn.execute(
-                        "INSERT INTO student_progress (student_id, day, task, completed) VALUES ($1, $2, $3, False)",
-                        req.student_id, day, task
-                    )
+            async with conn.transaction():
+                existing = await conn.fetchval("SELECT id FROM student_plans WHERE student_id = $1", req.student_id)
+                if existing:
+                    await conn.execute("UPDATE student_plans SET plan_json = $1, created_at = CURRENT_TIMESTAMP WHERE student_id = $2", json.dumps(plan_data), req.student_id)
+                    await conn.execute("DELETE FROM student_progress WHERE student_id = $1", req.student_id)
+                else:
+                    await conn.execute("INSERT INTO student_plans (student_id, plan_json) VALUES ($1, $2)", req.student_id, json.dumps(plan_data))
+
+                # One statement for every task; a task repeated within a day is kept once
+                await conn.execute(
+                    """
+                    INSERT INTO student_progress (student_id, day, task, completed)
+                    SELECT $1, t.day, t.task, FALSE
+                    FROM unnest($2::text[], $3::text[]) AS t(day, task)
+                    ON CONFLICT (student_id, day, task) DO NOTHING
+                    """,
+                    req.student_id, days, tasks
+                )
 
         return {"status": "success", "plan": plan_data}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -174,25 +214,25 @@ async def update_progress(req: ProgressUpdateRequest, current_user: dict = Depen
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/notifications/{student_id}")
-async def get_notifications(student_id: str, current_user: dict = Depends(get_current_user())):
-    try:
-        async with PostgresDB.pool.acquire() as conn:
-            rows = await conn.fetch(
-                "SELECT id, message, read_status, created_at as timestamp FROM notifications WHERE receiver_id = $1 ORDER BY created_at DESC",
-                student_id
-            )
-            return {"notifications": [dict(r) for r in rows]}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def get_notifications(student_id: str, limit: int = Query(50, ge=1, le=200), cursor: Optional[str] = None,
+                            current_user: dict = Depends(get_current_user())):
+    """Newest-first page of a student's notifications; pass next_cursor back as cursor for the next page."""
+    page = await notification_service.get_notifications([student_id], limit, cursor)
+    return {
+        "notifications": [
+            {"id": n["id"], "message": n["message"], "read_status": n["read_status"], "timestamp": n["created_at"]}
+            for n in page["notifications"]
+        ],
+        "next_cursor": page["next_cursor"],
+        "unread": page["unread"],
+    }
 
 @router.post("/notifications/read/{notification_id}")
-async def mark_notification_read(notification_id: int, current_user: dict = Depends(get_current_user())):
-    try:
-        async with PostgresDB.pool.acquire() as conn:
-            await conn.execute("UPDATE notifications SET read_status = True WHERE id = $1", str(notification_id))
-            return {"status": "success"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def mark_notification_read(notification_id: str, current_user: dict = Depends(get_current_user())):
+    # Notification ids are strings ("notif_..."); only the caller's own notifications can be marked
+    receiver_ids = [current_user["id"]] + ([current_user["student_id"]] if current_user.get("student_id") else [])
+    await notification_service.mark_notifications_read(receiver_ids, [notification_id])
+    return {"status": "success"}
 
 
 @router.post("/ai-assistant")
@@ -217,7 +257,7 @@ async def ai_assistant(req: AiAssistantRequest, current_user: dict = Depends(get
                     dp["progress"] = progress_map.get(dp["day"], {})
                 plan_context = json.dumps(plan_data, indent=2)
 
-        model = genai.GenerativeModel("gemini-2.5-flash")
+        model = genai.GenerativeModel(PLANNER_MODEL)
         prompt = f"""You are a helpful AI study assistant for a student.
 Here is their current weekly study plan and progress:
 
@@ -227,8 +267,10 @@ The student asks: "{req.message}"
 
 Give a helpful, concise, and encouraging response. If they ask what to do today, look at incomplete tasks and guide them. If they ask for motivation, be supportive. Always reference their actual plan data."""
 
-        response = model.generate_content(prompt)
+        response = await run_llm(PLANNER_MODEL, current_user["id"], lambda: model.generate_content_async(prompt))
         return {"status": "success", "response": response.text}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, status, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, status, Depends, HTTPException, UploadFile, File, Form, Query
 from typing import List, Optional
 from pydantic import BaseModel
 import json
@@ -9,6 +9,12 @@ from models.data_models import Student, Faculty, Subject, Attendance, Marks, Res
 from services.service import Service
 from repos.repo import Repo
 from routers.auth import get_current_user
+from agent.registry import agent_registry
+from constants import AGENT_MODEL
+from llm_gateway import run_llm
+from agent_cache import agent_response_cache
+from pagination import LIST_PAGE_SIZE, MAX_LIST_PAGE_SIZE, parse_fields
+from responses import list_response
 
 router = APIRouter()
 repo = Repo()
@@ -34,37 +40,20 @@ async def ask_agent(
     Run the deterministic agent based on the logged-in user's role prompt.
     """
     role = current_user.get("role")
-    
-    from agent.prompt_loader import get_prompt_by_role
-    prompt = get_prompt_by_role(role)
-    
-    from google.adk.agents import LlmAgent
-    from constants import AGENT_NAME, AGENT_MODEL, AGENT_DESCRIPTION
-    from agent.tools import (
-        add_student, fetch_student_data, list_all_students, create_faculty,
-        list_all_faculty, add_subject, list_all_subjects, update_attendance,
-        get_student_attendance, update_marks, get_student_marks,
-        calculate_sgpa_cgpa, get_student_result, list_all_results
-    )
-    
-    user_agent = LlmAgent(
-        name=f"{AGENT_NAME}_{role}",
-        model=AGENT_MODEL,
-        description=AGENT_DESCRIPTION,
-        instruction=prompt,
-        tools=[
-            add_student, fetch_student_data, list_all_students, create_faculty,
-            list_all_faculty, add_subject, list_all_subjects, update_attendance,
-            get_student_attendance, update_marks, get_student_marks,
-            calculate_sgpa_cgpa, get_student_result, list_all_results
-        ]
+    user_agent = agent_registry.get("ask", role)
+
+    cached = await agent_response_cache.lookup(
+        "ask", role, current_user.get("id"), current_user.get("student_id"), payload.query
     )
-    
-    response = await user_agent.arun(payload.query)
+    if cached.response is not None:
+        return cached.response
+
+    response = await run_llm(AGENT_MODEL, current_user.get("id"), lambda: user_agent.arun(payload.query))
     
     try:
         clean_json = response.strip().strip("```json").strip("```").strip()
         data = json.loads(clean_json)
+        agent_response_cache.store(cached, data)
         return data
     except Exception:
         return {"status": "error", "message": "Agent failed to return structured JSON", "raw": response}
@@ -82,18 +71,16 @@ async def ask_agent_with_file(
     Images are sent natively to Gemini for vision analysis.
     """
     role = current_user.get("role")
+    user_agent = agent_registry.get("ask", role)
 
-    from agent.prompt_loader import get_prompt_by_role
-    prompt = get_prompt_by_role(role)
-
-    from google.adk.agents import LlmAgent
-    from constants import AGENT_NAME, AGENT_MODEL, AGENT_DESCRIPTION
-    from agent.tools import (
-        add_student, fetch_student_data, list_all_students, create_faculty,
-        list_all_faculty, add_subject, list_all_subjects, update_attendance,
-        get_student_attendance, update_marks, get_student_marks,
-        calculate_sgpa_cgpa, get_student_result, list_all_results
-    )
+    # Only plain questions are cached; an attachment makes every request unique
+    cached = None
+    if not file:
+        cached = await agent_response_cache.lookup(
+            "ask-file", role, current_user.get("id"), current_user.get("student_id"), query
+        )
+        if cached.response is not None:
+            return cached.response
 
     # --- Process file if provided ---
     file_context = ""
@@ -145,19 +132,6 @@ async def ask_agent_with_file(
     # --- Build agent query ---
     full_query = query + file_context
 
-    user_agent = LlmAgent(
-        name=f"{AGENT_NAME}_{role}",
-        model=AGENT_MODEL,
-        description=AGENT_DESCRIPTION,
-        instruction=prompt,
-        tools=[
-            add_student, fetch_student_data, list_all_students, create_faculty,
-            list_all_faculty, add_subject, list_all_subjects, update_attendance,
-            get_student_attendance, update_marks, get_student_marks,
-            calculate_sgpa_cgpa, get_student_result, list_all_results
-        ]
-    )
-
     # If image parts exist, try to pass them via Gemini's multimodal content format
     if image_parts:
         try:
@@ -171,19 +145,23 @@ async def ask_agent_with_file(
                 ))
             content_parts.append(genai_types.Part.from_text(text=full_query))
 
-            response = await user_agent.arun(content_parts)
+            response = await run_llm(AGENT_MODEL, current_user.get("id"), lambda: user_agent.arun(content_parts))
+        except HTTPException:
+            raise
         except Exception:
             # Fallback: send as text-only with image description
-            response = await user_agent.arun(full_query)
+            response = await run_llm(AGENT_MODEL, current_user.get("id"), lambda: user_agent.arun(full_query))
     else:
-        response = await user_agent.arun(full_query)
+        response = await run_llm(AGENT_MODEL, current_user.get("id"), lambda: user_agent.arun(full_query))
 
     try:
         clean_json = response.strip().strip("```json").strip("```").strip()
         data = json.loads(clean_json)
-        return data
     except Exception:
-        return {"status": "success", "response": response}
+        data = {"status": "success", "response": response}
+    if cached:
+        agent_response_cache.store(cached, data)
+    return data
 
 
 # ==========================================
@@ -303,8 +281,8 @@ async def get_department_report(
     current_user: dict = Depends(get_current_user(role="hod")),
 ):
     """Get summarized statistics for a department."""
-    stds = await service.list_students(dept)
-    facs = await service.list_faculty(dept)
+    stds = (await service.list_students_page(department=dept, limit=None, fields=["id"]))["items"]
+    facs = (await service.list_faculty_page(dept, limit=None, fields=["id"]))["items"]
     return {
         "department": dept,
         "total_students": len(stds),
@@ -417,8 +395,8 @@ async def update_session_attendance(
     if not faculty or session["faculty_id"] != faculty.id:
         raise HTTPException(status_code=403, detail="You can only edit your own sessions")
         
-    await service.update_marked_attendance(session_id, req.absent_student_ids)
-    return {"message": "Attendance updated successfully"}
+    changed = await service.update_marked_attendance(session_id, req.absent_student_ids)
+    return {"message": "Attendance updated successfully", "changed": changed}
 
 @router.get("/attendance/session/{session_id}/records")
 async def get_session_records(
@@ -672,26 +650,49 @@ async def get_department(
 ):
     return await service.get_department(dept_id)
 
-@router.get("/faculty", response_model=List[Faculty])
+# Directory lists are keyset-paginated on id: the body is one page (a plain list),
+# X-Next-Cursor carries the cursor for the next one. fields=a,b selects only those
+# columns in SQL, so those responses are partial objects rather than full models.
+
+@router.get("/faculty")
 async def list_faculty(
     department_id: Optional[str] = None,
+    limit: int = Query(LIST_PAGE_SIZE, ge=1, le=MAX_LIST_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated Faculty fields, e.g. id,name"),
     current_user: dict = Depends(get_current_user()),
 ):
-    return await service.list_faculty(department_id)
+    page = await service.list_faculty_page(department_id, limit, cursor, parse_fields(fields, Faculty.model_fields))
+    return list_response(page["items"], page["next_cursor"])
 
-@router.get("/students", response_model=List[Student])
+@router.get("/students")
 async def list_students(
     department: Optional[str] = None,
+    department_id: Optional[str] = None,
+    semester: Optional[int] = None,
+    limit: int = Query(LIST_PAGE_SIZE, ge=1, le=MAX_LIST_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated Student fields, e.g. id,usn,semester"),
     current_user: dict = Depends(get_current_user()),
 ):
-    return await service.list_students(department)
+    page = await service.list_students_page(
+        department, department_id, semester, limit, cursor, parse_fields(fields, Student.model_fields)
+    )
+    return list_response(page["items"], page["next_cursor"])
 
-@router.get("/subjects", response_model=List[Subject])
+@router.get("/subjects")
 async def list_subjects(
     department_id: Optional[str] = None,
+    semester: Optional[int] = None,
+    limit: int = Query(LIST_PAGE_SIZE, ge=1, le=MAX_LIST_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated Subject fields, e.g. id,subject_name"),
     current_user: dict = Depends(get_current_user()),
 ):
-    return await service.list_subjects(department_id)
+    page = await service.list_subjects_page(
+        department_id, semester, limit, cursor, parse_fields(fields, Subject.model_fields)
+    )
+    return list_response(page["items"], page["next_cursor"])
 
     return await service.list_subjects(department_id)
 
@@ -713,11 +714,20 @@ async def get_result(
         raise HTTPException(status_code=404, detail="Result not found")
     return result
 
-@router.get("/results", response_model=List[Result])
+@router.get("/results")
 async def list_all_results(
+    department: Optional[str] = None,
+    department_id: Optional[str] = None,
+    semester: Optional[int] = None,
+    limit: int = Query(LIST_PAGE_SIZE, ge=1, le=MAX_LIST_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated Result fields, e.g. student_id,cgpa"),
     current_user: dict = Depends(get_current_user()),
 ):
-    return await service.list_results()
+    page = await service.list_results_page(
+        department, department_id, semester, limit, cursor, parse_fields(fields, Result.model_fields)
+    )
+    return list_response(page["items"], page["next_cursor"])
 
 
 # ==========================================
@@ -755,26 +765,16 @@ async def upload_ia_marks(
     if not subject:
         raise HTTPException(status_code=404, detail="Subject not found")
 
-    # Validate marks
-    errors = []
-    for entry in payload.marks:
-        if entry.marks_obtained < 0 or entry.marks_obtained > payload.max_marks:
-            errors.append(f"Student {entry.student_id}: marks must be 0-{payload.max_marks}")
-
-        # Verify student exists and belongs to correct department + semester
-        student = await service.get_student(entry.student_id)
-        if not student:
-            errors.append(f"Student {entry.student_id}: not found")
-        elif subject.department_id and student.department_id != subject.department_id:
-            errors.append(f"Student {entry.student_id}: department mismatch")
-        elif subject.semester and student.semester != subject.semester:
-            errors.append(f"Student {entry.student_id}: semester mismatch")
-
-    if errors:
-        raise HTTPException(status_code=400, detail={"errors": errors})
+    # Validate the whole upload (ranges, duplicates, dept/semester membership) up front
+    marks_data = [{"student_id": e.student_id, "marks_obtained": e.marks_obtained} for e in payload.marks]
+    row_errors = await service.validate_ia_marks(subject, marks_data, payload.max_marks)
+    if row_errors:
+        raise HTTPException(status_code=400, detail={
+            "errors": [f"Student {e['student_id']}: {e['error']}" for e in row_errors],
+            "rows": row_errors,
+        })
 
     # Upload marks
-    marks_data = [{"student_id": e.student_id, "marks_obtained": e.marks_obtained} for e in payload.marks]
     results = await service.upload_ia_marks(faculty.id, payload.subject_id, marks_data, payload.max_marks)
 
     return {"message": f"IA marks saved for {len(results)} students", "results": results}
@@ -0,0 +1,144 @@
+# backend/services/report_export.py
+# Constant-memory Excel export for admin reports.
+#
+# Rows are pulled from a DB cursor in batches and appended to a write-only
+# openpyxl worksheet, which spills rows to disk instead of keeping the
+# workbook in memory. Background jobs write to EXPORT_DIR, and their state is
+# read from the files there, so any worker on the host can answer a poll:
+#   <job_id>.xlsx.part  running
+#   <job_id>.xlsx       ready
+#   <job_id>.err        failed (contains the error message)
+# A running job touches its .part file as batches arrive, so cleanup() on any
+# worker only removes .part files whose job has stopped making progress.
+
+import asyncio
+import os
+import re
+import tempfile
+import time
+import uuid
+from typing import AsyncGenerator, Callable, List, Optional
+
+from openpyxl import Workbook
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "carpulse_exports"))
+EXPORT_MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", 2))
+EXPORT_JOB_TTL_SECONDS = int(os.getenv("EXPORT_JOB_TTL_SECONDS", 3600))
+
+_JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+async def write_excel(path: str, header: List[str], columns: List[str],
+                      batches: AsyncGenerator[List[dict], None], sheet_name: str = "Report",
+                      on_batch: Optional[Callable[[], None]] = None) -> int:
+    """Stream batches of row dicts into an .xlsx at `path`. Returns the number of data rows."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_name)
+    ws.append(header)
+    count = 0
+    try:
+        async for batch in batches:
+            for row in batch:
+                ws.append([row.get(c) for c in columns])
+            count += len(batch)
+            if on_batch is not None:
+                on_batch()
+    except BaseException:
+        # Hand the cursor's pooled connection back now, not when the generator is collected
+        await batches.aclose()
+        raise
+    # Zipping the sheet is CPU-bound; keep it off the event loop
+    await asyncio.to_thread(wb.save, path)
+    return count
+
+
+class ExcelExportJobs:
+    def __init__(self, export_dir: str = EXPORT_DIR, max_concurrent: int = EXPORT_MAX_CONCURRENT):
+        self.export_dir = export_dir
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._tasks: set = set()
+        self._live: set = set()  # job ids running in this process
+
+    def _path(self, job_id: str, suffix: str) -> str:
+        return os.path.join(self.export_dir, f"{job_id}{suffix}")
+
+    def temp_path(self) -> str:
+        """A fresh path for a one-off synchronous export."""
+        os.makedirs(self.export_dir, exist_ok=True)
+        return self._path(uuid.uuid4().hex, ".sync.xlsx")
+
+    async def export_now(self, path: str, header: List[str], columns: List[str],
+                         batches: AsyncGenerator[List[dict], None]) -> int:
+        async with self._slots:
+            return await write_excel(path, header, columns, batches)
+
+    def start(self, header: List[str], columns: List[str],
+              batches_factory: Callable[[], AsyncGenerator[List[dict], None]]) -> str:
+        os.makedirs(self.export_dir, exist_ok=True)
+        self.cleanup()
+        job_id = uuid.uuid4().hex
+        part = self._path(job_id, ".xlsx.part")
+        open(part, "wb").close()  # marks the job as running for every worker
+        self._live.add(job_id)
+        task = asyncio.create_task(self._run(job_id, header, columns, batches_factory))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job_id
+
+    async def _run(self, job_id: str, header, columns, batches_factory) -> None:
+        part = self._path(job_id, ".xlsx.part")
+        try:
+            async with self._slots:
+                os.utime(part)  # restart the cleanup clock after waiting for a slot
+                await write_excel(part, header, columns, batches_factory(), on_batch=lambda: os.utime(part))
+            os.replace(part, self._path(job_id, ".xlsx"))
+        except BaseException as e:
+            # Cancellation (e.g. shutdown) must not leave the job "running" until the TTL
+            with open(self._path(job_id, ".err"), "w") as f:
+                f.write(str(e) if isinstance(e, Exception) else "Export cancelled")
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            self._live.discard(job_id)
+            if os.path.exists(part):
+                os.remove(part)
+
+    def status(self, job_id: str) -> Optional[str]:
+        if not _JOB_ID_RE.match(job_id):
+            return None
+        if os.path.exists(self._path(job_id, ".xlsx")):
+            return "ready"
+        if os.path.exists(self._path(job_id, ".xlsx.part")):
+            return "running"
+        if os.path.exists(self._path(job_id, ".err")):
+            return "failed"
+        return None
+
+    def error(self, job_id: str) -> Optional[str]:
+        path = self._path(job_id, ".err")
+        if not _JOB_ID_RE.match(job_id) or not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return f.read()
+
+    def result_path(self, job_id: str) -> str:
+        return self._path(job_id, ".xlsx")
+
+    def cleanup(self) -> None:
+        """Delete exports untouched for EXPORT_JOB_TTL_SECONDS, except this process's running jobs."""
+        if not os.path.isdir(self.export_dir):
+            return
+        cutoff = time.time() - EXPORT_JOB_TTL_SECONDS
+        for name in os.listdir(self.export_dir):
+            if name.split(".", 1)[0] in self._live:
+                continue
+            path = os.path.join(self.export_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+# Single shared instance
+excel_export_jobs = ExcelExportJobs()
@@ -1,7 +1,84 @@
+import asyncio
+import os
+from datetime import date as date_type, datetime, timedelta
+from decimal import Decimal, InvalidOperation
 from typing import List, Optional
+
+import numpy as np
 from fastapi import HTTPException
 from models.data_models import Student, Faculty, Subject, Attendance, Marks, Result, Department
 from repos.repo import Repo
+from auth_cache import principal_cache
+from pagination import LIST_PAGE_SIZE, decode_cursor, encode_cursor
+
+
+ANALYTICS_REFRESH_DEBOUNCE_SECONDS = float(os.getenv("ANALYTICS_REFRESH_DEBOUNCE_SECONDS", 30))
+ALERTS_PAGE_SIZE = int(os.getenv("ALERTS_PAGE_SIZE", 100))
+RISK_REFRESH_BATCH_SIZE = int(os.getenv("RISK_REFRESH_BATCH_SIZE", 500))
+NOTIFICATION_CATCHUP_LIMIT = int(os.getenv("NOTIFICATION_CATCHUP_LIMIT", 200))
+NOTIFICATIONS_PAGE_SIZE = int(os.getenv("NOTIFICATIONS_PAGE_SIZE", 50))
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", 90))
+NOTIFICATION_ARCHIVE_BATCH_SIZE = int(os.getenv("NOTIFICATION_ARCHIVE_BATCH_SIZE", 5000))
+
+# Pending debounced analytics refresh for this worker
+_analytics_refresh_task: Optional[asyncio.Task] = None
+
+def _after_id(cursor: Optional[str]) -> Optional[str]:
+    """The last id of the previous page of a directory list."""
+    after = decode_cursor(cursor, 1)
+    return str(after[0]) if after else None
+
+
+def _list_page_response(page: dict) -> dict:
+    return {
+        "items": page["rows"],
+        "next_cursor": encode_cursor([page["next_after"]]) if page["next_after"] else None,
+    }
+
+
+RISK_RECOMMENDATIONS = {
+    "high": "Immediate intervention required. Attendance is critically low. Attend all remaining classes.",
+    "medium": "Performance needs improvement. Focus on attendance and internal assessments.",
+    "low": "Keep up the good work. Maintain attendance above 85% and prepare for externals.",
+}
+
+
+def score_risk(features: List[dict]) -> List[dict]:
+    """Heuristic weighted score and risk band for a batch of feature rows, vectorised with NumPy."""
+    if not features:
+        return []
+    att      = np.round(np.array([f["avg_attendance"] for f in features], dtype=float), 1)
+    marks    = np.round(np.array([f["avg_marks_pct"] for f in features], dtype=float), 1)
+    cgpa     = np.array([f["cgpa"] for f in features], dtype=float)
+    sessions = np.array([f["sessions_attended"] for f in features], dtype=float)
+
+    # Higher = better
+    score = (att * 0.4) + (marks * 0.35) \
+        + (np.minimum(cgpa / 10 * 100, 100) * 0.15) \
+        + (np.minimum(sessions / 20 * 100, 100) * 0.10)
+
+    high = (score < 45) | (att < 60)
+    medium = ~high & ((score < 65) | (att < 75))
+    risk = np.where(high, "high", np.where(medium, "medium", "low"))
+
+    return [
+        {
+            "student_id": f["student_id"],
+            "usn": f.get("usn"),
+            "name": f.get("name"),
+            "semester": f.get("semester"),
+            "risk": str(risk[i]),
+            "predicted_score": round(float(score[i]), 1),
+            "recommendation": RISK_RECOMMENDATIONS[str(risk[i])],
+            "details": {
+                "avg_attendance": float(att[i]),
+                "avg_marks_pct": float(marks[i]),
+                "cgpa": float(cgpa[i]),
+                "sessions_attended": int(sessions[i]),
+            },
+        }
+        for i, f in enumerate(features)
+    ]
 
 class Service:
     def __init__(self, repo: Repo):
@@ -39,6 +116,13 @@ class Service:
     async def list_students(self, department: Optional[str] = None) -> List[Student]:
         return await self.repo.list_students(department)
 
+    async def list_students_page(self, department: Optional[str] = None, department_id: Optional[str] = None,
+                                 semester: Optional[int] = None, limit: Optional[int] = LIST_PAGE_SIZE,
+                                 cursor: Optional[str] = None, fields: Optional[List[str]] = None) -> dict:
+        page = await self.repo.list_students_page(department, department_id, semester,
+                                                  limit, _after_id(cursor), fields)
+        return _list_page_response(page)
+
     async def delete_student(self, student_id: str) -> dict:
         deleted = await self.repo.delete_student(student_id)
         if deleted == 0:
@@ -67,6 +151,11 @@ class Service:
     async def list_faculty(self, department_id: Optional[str] = None) -> List[Faculty]:
         return await self.repo.list_faculty(department_id)
 
+    async def list_faculty_page(self, department_id: Optional[str] = None, limit: Optional[int] = LIST_PAGE_SIZE,
+                                cursor: Optional[str] = None, fields: Optional[List[str]] = None) -> dict:
+        page = await self.repo.list_faculty_page(department_id, limit, _after_id(cursor), fields)
+        return _list_page_response(page)
+
     async def delete_faculty_by_email(self, email: str) -> dict:
         # Step 1: Find the user by email
         user = await self.repo.get_user_by_email(email)
@@ -111,6 +200,12 @@ class Service:
     async def list_subjects(self, department_id: Optional[str] = None) -> List[Subject]:
         return await self.repo.list_subjects(department_id)
 
+    async def list_subjects_page(self, department_id: Optional[str] = None, semester: Optional[int] = None,
+                                 limit: Optional[int] = LIST_PAGE_SIZE, cursor: Optional[str] = None,
+                                 fields: Optional[List[str]] = None) -> dict:
+        page = await self.repo.list_subjects_page(department_id, semester, limit, _after_id(cursor), fields)
+        return _list_page_response(page)
+
     async def assign_faculty_to_subject(self, faculty_id: str, subject_id: str) -> str:
         # Check faculty
         f = await self.repo.get_faculty(faculty_id)
@@ -182,17 +277,17 @@ class Service:
         if not subject.semester:
             raise HTTPException(status_code=400, detail="Subject has no semester set")
             
-        target_students = await self.repo.list_students_by_dept_id(subject.department_id, subject.semester)
-        
-        student_ids = [st.id for st in target_students]
-        statuses = ["absent" if st.id in absent_student_ids else "present" for st in target_students]
-                
+        student_ids = await self.repo.list_student_ids_by_dept_id(subject.department_id, subject.semester)
         if not student_ids:
             return  # no students to mark
-            
+
+        absent = set(absent_student_ids)
+        statuses = ["absent" if sid in absent else "present" for sid in student_ids]
+
         await self.repo.insert_attendance_records(session_id, student_ids, statuses)
+        self.request_analytics_refresh()
 
-    async def update_marked_attendance(self, session_id: str, absent_student_ids: List[str]):
+    async def update_marked_attendance(self, session_id: str, absent_student_ids: List[str]) -> int:
         session = await self.repo.get_attendance_session(session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
@@ -201,15 +296,17 @@ class Service:
         if not subject or not subject.semester:
             raise HTTPException(status_code=400, detail="Subject/semester not found")
         
-        target_students = await self.repo.list_students_by_dept_id(subject.department_id, subject.semester)
-        
-        student_ids = [st.id for st in target_students]
-        statuses = ["absent" if st.id in absent_student_ids else "present" for st in target_students]
-                
+        student_ids = await self.repo.list_student_ids_by_dept_id(subject.department_id, subject.semester)
         if not student_ids:
-            return
-            
-        await self.repo.update_attendance_records(session_id, student_ids, statuses)
+            return 0
+
+        absent = set(absent_student_ids)
+        statuses = ["absent" if sid in absent else "present" for sid in student_ids]
+
+        changed = await self.repo.update_attendance_records(session_id, student_ids, statuses)
+        if changed:
+            self.request_analytics_refresh()
+        return changed
 
     async def get_students_for_session(self, session_id: str) -> List[dict]:
         """Return students with names suitable for an attendance marking UI."""
@@ -362,6 +459,13 @@ class Service:
     async def list_results(self) -> List[Result]:
         return await self.repo.list_results()
 
+    async def list_results_page(self, department: Optional[str] = None, department_id: Optional[str] = None,
+                                semester: Optional[int] = None, limit: Optional[int] = LIST_PAGE_SIZE,
+                                cursor: Optional[str] = None, fields: Optional[List[str]] = None) -> dict:
+        page = await self.repo.list_results_page(department, department_id, semester,
+                                                 limit, _after_id(cursor), fields)
+        return _list_page_response(page)
+
     # -------------------- USERS (auth) -------------------- #
 
     async def get_user_by_email(self, email: str) -> Optional[dict]:
@@ -370,28 +474,63 @@ class Service:
     async def get_user_by_id(self, user_id: str) -> Optional[dict]:
         return await self.repo.get_user_by_id(user_id)
 
+    async def resolve_principal(self, user_id: str) -> Optional[dict]:
+        """User with effective role (dynamic HOD override applied), served from the principal cache."""
+        principal = principal_cache.get(user_id)
+        if principal is not None:
+            return principal
+
+        principal = await self.repo.get_principal(user_id)
+        if not principal:
+            return None
+
+        # Dynamic HOD role override
+        if principal["role"] == "faculty" and principal["hod_department_id"]:
+            principal["role"] = "hod"
+
+        principal_cache.put(user_id, principal)
+        return principal
+
     async def insert_user(self, user_id: str, name: str, email: str, password_hash: str, role: str) -> dict:
         return await self.repo.insert_user(user_id, name, email, password_hash, role)
 
     # -------------------- IA MARKS -------------------- #
 
+    async def validate_ia_marks(self, subject: Subject, marks_list: list, max_marks: int = 40) -> list:
+        """Per-row errors for an IA upload; class membership is checked for the whole list in one query."""
+        membership = await self.repo.get_students_class_membership(
+            list({e["student_id"] for e in marks_list})
+        )
+        errors = []
+        seen = set()
+        for index, entry in enumerate(marks_list):
+            sid = entry["student_id"]
+            if entry["marks_obtained"] < 0 or entry["marks_obtained"] > max_marks:
+                error = f"marks must be 0-{max_marks}"
+            elif sid in seen:
+                error = "duplicate entry"
+            elif sid not in membership:
+                error = "not found"
+            elif subject.department_id and membership[sid][0] != subject.department_id:
+                error = "department mismatch"
+            elif subject.semester and membership[sid][1] != subject.semester:
+                error = "semester mismatch"
+            else:
+                error = None
+            seen.add(sid)
+            if error:
+                errors.append({"index": index, "student_id": sid, "error": error})
+        return errors
+
     async def upload_ia_marks(self, faculty_id: str, subject_id: str,
                                marks_list: list, max_marks: int = 40):
-        """Batch upsert IA marks for a subject."""
-        import time
-        results = []
-        for entry in marks_list:
-            mark_id = "ia_" + str(int(time.time() * 10000))
-            await self.repo.upsert_ia_mark(
-                mark_id=mark_id,
-                student_id=entry["student_id"],
-                subject_id=subject_id,
-                faculty_id=faculty_id,
-                marks_obtained=entry["marks_obtained"],
-                max_marks=max_marks,
-            )
-            results.append({"student_id": entry["student_id"], "status": "saved"})
-        return results
+        """Batch upsert IA marks for a subject (one statement, one transaction)."""
+        student_ids = [e["student_id"] for e in marks_list]
+        await self.repo.upsert_ia_marks(
+            subject_id, faculty_id, student_ids,
+            [e["marks_obtained"] for e in marks_list], max_marks,
+        )
+        return [{"student_id": sid, "status": "saved"} for sid in student_ids]
 
     async def get_ia_marks_for_subject(self, subject_id: str) -> list:
         return await self.repo.get_ia_marks_by_subject(subject_id)
@@ -422,27 +561,135 @@ class Service:
     async def get_analytics_admin(self) -> dict:
         return await self.repo.get_analytics_admin()
 
+    async def refresh_analytics_views(self) -> bool:
+        return await self.repo.refresh_analytics_views()
+
+    def request_analytics_refresh(self) -> None:
+        """Debounced refresh after attendance writes: one per burst per worker."""
+        global _analytics_refresh_task
+        if _analytics_refresh_task is None or _analytics_refresh_task.done():
+            _analytics_refresh_task = asyncio.create_task(self._refresh_analytics_later())
+
+    async def _refresh_analytics_later(self) -> None:
+        await asyncio.sleep(ANALYTICS_REFRESH_DEBOUNCE_SECONDS)
+        try:
+            await self.repo.refresh_analytics_views()
+        except Exception as e:
+            print(f"Analytics view refresh failed: {e}")
+
     # -------------------- ALERTS -------------------- #
 
-    async def get_alerts_student(self, student_id: str):
-        return await self.repo.get_attendance_alerts_student(student_id)
+    def decode_alert_cursor(self, cursor: Optional[str]) -> Optional[list]:
+        """[pct, subject_id, student_id] from an alerts cursor; malformed cursors are a 400."""
+        after = decode_cursor(cursor, 3)
+        if after is None:
+            return None
+        try:
+            pct = Decimal(str(after[0]))
+        except (InvalidOperation, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if not pct.is_finite() or not isinstance(after[1], str) or not isinstance(after[2], str):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        return [pct, after[1], after[2]]
+
+    async def get_alerts(self, role: str, scope_id: Optional[str] = None,
+                         limit: int = ALERTS_PAGE_SIZE, cursor: Optional[str] = None) -> dict:
+        """
+        One page of attendance alerts for a role's scope (student id, faculty id, department
+        id, or None for admin) with institution-wide severity counts for that scope.
+        """
+        scope = {
+            "student": {"student_id": scope_id},
+            "faculty": {"faculty_id": scope_id},
+            "hod": {"department_id": scope_id},
+            "admin": {},
+        }[role]
+        page = await self.repo.get_attendance_alerts(
+            **scope, limit=limit, after=self.decode_alert_cursor(cursor)
+        )
+        alerts = []
+        for r in page["rows"]:
+            pct = float(r["pct"])
+            subject = r["subject_name"]
+            name = r["student_name"] or r["student_id"]
+            if role == "student":
+                message = (f"Attendance critically low ({pct:.1f}%) in {subject}" if r["severity"] == "critical"
+                           else f"Attendance below 85% ({pct:.1f}%) in {subject}")
+            else:
+                verb = "is " if role == "faculty" else ""
+                message = (f"{name} {verb}critically low ({pct:.1f}%) in {subject}" if r["severity"] == "critical"
+                           else f"{name} {verb}below 85% ({pct:.1f}%) in {subject}")
+            alerts.append({
+                "type": r["severity"],
+                "message": message,
+                "student_id": r["student_id"],
+                "subject_id": r["subject_id"],
+                "percentage": round(pct, 1),
+            })
+        return {
+            "alerts": alerts,
+            "counts": page["counts"],
+            "next_cursor": encode_cursor(page["next_after"]) if page["next_after"] else None,
+        }
+
+    async def get_alerts_student(self, student_id: str, cursor: Optional[str] = None) -> dict:
+        return await self.get_alerts("student", student_id, cursor=cursor)
 
-    async def get_alerts_faculty(self, faculty_id: str):
-        return await self.repo.get_attendance_alerts_faculty(faculty_id)
+    async def get_alerts_faculty(self, faculty_id: str, cursor: Optional[str] = None) -> dict:
+        return await self.get_alerts("faculty", faculty_id, cursor=cursor)
 
-    async def get_alerts_hod(self, dept_id: str):
-        return await self.repo.get_attendance_alerts_hod(dept_id)
+    async def get_alerts_hod(self, dept_id: str, cursor: Optional[str] = None) -> dict:
+        return await self.get_alerts("hod", dept_id, cursor=cursor)
 
-    async def get_alerts_admin(self):
-        return await self.repo.get_attendance_alerts_admin()
+    async def get_alerts_admin(self, cursor: Optional[str] = None) -> dict:
+        return await self.get_alerts("admin", cursor=cursor)
 
     # -------------------- NOTIFICATIONS -------------------- #
 
     async def insert_notification(self, sender_id: str, receiver_id: str, message: str, notif_type: str = "query") -> str:
         return await self.repo.insert_notification(sender_id, receiver_id, message, notif_type)
 
-    async def get_notifications(self, receiver_id: str):
-        return await self.repo.get_notifications(receiver_id)
+    async def get_notifications(self, receiver_ids: List[str], limit: int = NOTIFICATIONS_PAGE_SIZE,
+                                cursor: Optional[str] = None) -> dict:
+        """Newest-first page of notifications with the cursor for the next page and the unread count."""
+        page = await self.repo.get_notifications(
+            receiver_ids, limit, self.decode_notification_cursor(cursor)
+        )
+        next_after = page["next_after"]
+        return {
+            "notifications": page["rows"],
+            "next_cursor": encode_cursor([next_after[0].isoformat(), next_after[1]]) if next_after else None,
+            "unread": await self.repo.get_unread_count(receiver_ids),
+        }
+
+    async def get_unread_count(self, receiver_ids: List[str]) -> int:
+        return await self.repo.get_unread_count(receiver_ids)
+
+    async def mark_notifications_read(self, receiver_ids: List[str], ids: Optional[List[str]] = None) -> int:
+        return await self.repo.mark_notifications_read(receiver_ids, ids)
+
+    async def archive_old_notifications(self, retention_days: int = NOTIFICATION_RETENTION_DAYS) -> Optional[int]:
+        """Daily retention: archive notifications older than retention_days, in batches."""
+        older_than = datetime.now() - timedelta(days=retention_days)
+        return await self.repo.archive_notifications(date_type.today(), older_than, NOTIFICATION_ARCHIVE_BATCH_SIZE)
+
+    async def send_planner_reminders(self) -> Optional[int]:
+        """Daily planner reminders; None if another worker ran (or is running) today's batch."""
+        return await self.repo.send_planner_reminders(date_type.today())
+
+    def decode_notification_cursor(self, cursor: Optional[str]) -> Optional[tuple]:
+        """(created_at, id) from a page cursor or push-stream event id; malformed cursors are a 400."""
+        after = decode_cursor(cursor, 2)
+        if after is None:
+            return None
+        try:
+            return datetime.fromisoformat(after[0]), str(after[1])
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    async def get_notifications_after(self, receiver_ids: List[str], after: Optional[tuple],
+                                      limit: int = NOTIFICATION_CATCHUP_LIMIT) -> List[dict]:
+        return await self.repo.get_notifications_after(receiver_ids, after, limit)
 
     async def get_faculty_for_subject(self, subject_id: str):
         return await self.repo.get_faculty_for_subject(subject_id)
@@ -455,37 +702,66 @@ class Service:
     async def get_all_faculty_report(self):
         return await self.repo.get_all_faculty_report()
 
+    def iter_all_students_report(self, batch_size: int = 1000):
+        return self.repo.iter_all_students_report(batch_size)
+
+    def iter_all_faculty_report(self, batch_size: int = 1000):
+        return self.repo.iter_all_faculty_report(batch_size)
+
     # -------------------- PREDICTION -------------------- #
 
     async def predict_student_risk(self, student_id: str) -> dict:
-        data = await self.repo.get_student_prediction_data(student_id)
-        att      = data["avg_attendance"]
-        marks    = data["avg_marks_pct"]
-        cgpa     = data["cgpa"]
-        sessions = data["sessions_attended"]
-
-        # Heuristic weighted score (higher = better)
-        score = (att * 0.4) + (marks * 0.35) + (min(cgpa / 10 * 100, 100) * 0.15) + (min(sessions / 20 * 100, 100) * 0.10)
-
-        if score < 45 or att < 60:
-            risk = "high"
-            recommendation = "Immediate intervention required. Attendance is critically low. Attend all remaining classes."
-        elif score < 65 or att < 75:
-            risk = "medium"
-            recommendation = "Performance needs improvement. Focus on attendance and internal assessments."
-        else:
-            risk = "low"
-            recommendation = "Keep up the good work. Maintain attendance above 85% and prepare for externals."
+        """Served from student_risk_snapshot; computed live (and stored) when no snapshot exists yet."""
+        snapshot = await self.repo.get_risk_snapshot(student_id)
+        if snapshot:
+            return {
+                "risk": snapshot["risk"],
+                "predicted_score": round(snapshot["predicted_score"], 1),
+                "recommendation": snapshot["recommendation"],
+                "details": snapshot["details"],
+                "computed_at": snapshot["computed_at"].isoformat(),
+                "stale": snapshot["stale"],
+            }
 
-        predicted_score = round(score, 1)
+        features = await self.repo.get_prediction_features(student_ids=[student_id])
+        if not features:
+            raise HTTPException(status_code=404, detail="Student not found")
+        prediction = score_risk(features)[0]
+        computed = await self.repo.save_risk_snapshot([prediction], [])
+        result = {k: prediction[k] for k in ("risk", "predicted_score", "recommendation", "details")}
+        result["computed_at"] = computed[student_id].isoformat()
+        result["stale"] = False
+        return result
+
+    async def refresh_risk_snapshot(self, batch_size: int = RISK_REFRESH_BATCH_SIZE) -> int:
+        """Rescore only students queued in student_risk_dirty. Returns how many were rescored."""
+        refreshed = 0
+        async with self.repo.risk_refresh_lock() as acquired:
+            if not acquired:
+                return 0  # another worker is already refreshing
+            while True:
+                claimed = await self.repo.claim_risk_dirty(batch_size)
+                if not claimed:
+                    break
+                features = await self.repo.get_prediction_features(
+                    student_ids=[c["student_id"] for c in claimed]
+                )
+                await self.repo.save_risk_snapshot(score_risk(features), claimed)
+                refreshed += len(features)
+                if len(claimed) < batch_size:
+                    break
+        return refreshed
+
+    async def predict_department_risk(self, department_id: str) -> dict:
+        """Risk for every student in a department, riskiest (lowest score) first."""
+        predictions = score_risk(await self.repo.get_prediction_features(department_id=department_id))
+        predictions.sort(key=lambda p: p["predicted_score"])
+        counts = {"high": 0, "medium": 0, "low": 0}
+        for p in predictions:
+            counts[p["risk"]] += 1
         return {
-            "risk": risk,
-            "predicted_score": predicted_score,
-            "recommendation": recommendation,
-            "details": {
-                "avg_attendance": att,
-                "avg_marks_pct": marks,
-                "cgpa": cgpa,
-                "sessions_attended": sessions,
-            }
+            "department_id": department_id,
+            "total_students": len(predictions),
+            "risk_counts": counts,
+            "students": predictions,
         }
@@ -10,10 +10,7 @@ class QdrantService:
     def __init__(self):
         self.client = QdrantClient(host="localhost", port=6333)
 
-        if QdrantService._encoder is None:
-            QdrantService._encoder = SentenceTransformer("all-MiniLM-L6-v2")
-
-        self.encoder = QdrantService._encoder
+        self.encoder = QdrantService.get_encoder()
 
         collections = [c.name for c in self.client.get_collections().collections]
         if COLLECTION not in collections:
@@ -22,6 +19,13 @@ class QdrantService:
                 vectors_config=VectorParams(size=384, distance=Distance.COSINE),
             )
 
+    @classmethod
+    def get_encoder(cls):
+        """The shared sentence encoder, loaded on first use (no Qdrant connection needed)."""
+        if cls._encoder is None:
+            cls._encoder = SentenceTransformer("all-MiniLM-L6-v2")
+        return cls._encoder
+
     def embed(self, text: str):
         return self.encoder.encode(text).tolist()
 
@@ -9,6 +9,7 @@ export default function Header() {
   const navigate = useNavigate();
   const { isAuthenticated, logout, user, role } = useAuth();
   const [notifications, setNotifications] = useState([]);
+  const [unread, setUnread] = useState(0);
   const [showDropdown, setShowDropdown] = useState(false);
 
   useEffect(() => {
@@ -18,6 +19,7 @@ export default function Header() {
            api.get(`/api/student/notifications/${res.data.id}`)
               .then(nres => {
                  setNotifications(nres.data.notifications || []);
+                 setUnread(nres.data.unread || 0);
               }).catch(() => {});
          }
       }).catch(() => {});
@@ -83,9 +85,9 @@ export default function Header() {
                       onClick={() => setShowDropdown(!showDropdown)}
                       style={{ fontSize: "1.2rem", cursor: "pointer", color: "#64748b" }}
                     ></i>
-                    {notifications.filter(n => !n.read_status).length > 0 && (
+                    {unread > 0 && (
                         <span style={{ position: "absolute", top: "-5px", right: "-5px", background: "#ef4444", color: "white", borderRadius: "50%", padding: "2px 5px", fontSize: "0.6rem" }}>
-                            {notifications.filter(n => !n.read_status).length}
+                            {unread}
                         </span>
                     )}
 
@@ -9,6 +9,7 @@ export default function AdminStudents() {
   // Student List
   const [students, setStudents] = useState([]);
   const [studentsLoading, setStudentsLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState("");
 
   // Enroll Student
   const [stuUsn, setStuUsn] = useState("");
@@ -21,11 +22,15 @@ export default function AdminStudents() {
     fetchStudents();
   }, []);
 
-  const fetchStudents = async () => {
-    setStudentsLoading(true);
+  // Pages are keyset-paginated; the next page's cursor comes back in X-Next-Cursor
+  const fetchStudents = async (cursor = "") => {
+    setStudentsLoading(!cursor);
     try {
-      const res = await api.get("/academic/students");
-      setStudents(res.data);
+      const res = await api.get("/academic/students", {
+        params: { fields: "id,usn,department,department_id,semester,user_id", ...(cursor ? { cursor } : {}) },
+      });
+      setStudents(prev => (cursor ? [...prev, ...res.data] : res.data));
+      setNextCursor(res.headers["x-next-cursor"] || "");
     } catch (err) {
       console.error("Failed to fetch students. Ensure the endpoint exists on the backend.", err);
       // We don't want to crash the UI if this is a newly requested feature without backend support yet.
@@ -137,6 +142,11 @@ export default function AdminStudents() {
                     ))}
                   </tbody>
                 </table>
+                {nextCursor && (
+                  <button type="button" className="admin-btn" style={{ marginTop: "1rem" }} onClick={() => fetchStudents(nextCursor)}>
+                    Load more
+                  </button>
+                )}
               </div>
             ) : (
               <div style={{ textAlign: "center", padding: "3rem 1rem", color: "#64748b" }}>